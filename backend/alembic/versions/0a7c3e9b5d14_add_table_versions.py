@@ -0,0 +1,38 @@
+"""add table versions
+
+Revision ID: 0a7c3e9b5d14
+Revises: f08c6d2e4a73
+Create Date: 2026-10-18 16:02:11.518340
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0a7c3e9b5d14'
+down_revision: Union[str, None] = 'f08c6d2e4a73'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    table_versions = op.create_table('table_versions',
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('name')
+    )
+    # Seed the counters so the first write is a plain update
+    op.bulk_insert(table_versions, [
+        {'name': name, 'version': 1, 'updated_at': None}
+        for name in ('properties', 'site_settings', 'team_members')
+    ])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('table_versions')
@@ -0,0 +1,57 @@
+"""add property click rollups
+
+Revision ID: 1b8d4f2a6e90
+Revises: 0a7c3e9b5d14
+Create Date: 2026-10-18 18:41:07.224913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1b8d4f2a6e90'
+down_revision: Union[str, None] = '0a7c3e9b5d14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('property_click_hourly',
+    sa.Column('property_id', sa.Integer(), nullable=False),
+    sa.Column('hour', sa.DateTime(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['property_id'], ['properties.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('property_id', 'hour')
+    )
+    op.create_index(op.f('ix_property_click_hourly_hour'), 'property_click_hourly', ['hour'], unique=False)
+    op.create_table('property_click_daily',
+    sa.Column('property_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.Column('unique_ips', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['property_id'], ['properties.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('property_id', 'day')
+    )
+    op.create_index(op.f('ix_property_click_daily_day'), 'property_click_daily', ['day'], unique=False)
+    op.create_table('rollup_state',
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('last_id', sa.BigInteger(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('name')
+    )
+    # Per-day distinct IP recounts scan one property's clicks by time
+    op.create_index('ix_property_clicks_property_id_clicked_at', 'property_clicks', ['property_id', 'clicked_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_property_clicks_property_id_clicked_at', table_name='property_clicks')
+    op.drop_table('rollup_state')
+    op.drop_index(op.f('ix_property_click_daily_day'), table_name='property_click_daily')
+    op.drop_table('property_click_daily')
+    op.drop_index(op.f('ix_property_click_hourly_hour'), table_name='property_click_hourly')
+    op.drop_table('property_click_hourly')
@@ -0,0 +1,28 @@
+"""add property keyset index
+
+Revision ID: 3f1c9a7d2b84
+Revises: 76bac7b851b5
+Create Date: 2026-10-18 09:12:40.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f1c9a7d2b84'
+down_revision: Union[str, None] = '76bac7b851b5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_properties_price_id', 'properties', ['price', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_properties_price_id', table_name='properties')
@@ -0,0 +1,37 @@
+"""add property visitor sketches
+
+Revision ID: 7c4a1e8b3d52
+Revises: 5d2e9c7a1f36
+Create Date: 2026-10-18 21:37:19.460288
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c4a1e8b3d52'
+down_revision: Union[str, None] = '5d2e9c7a1f36'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('property_visitor_sketches',
+    sa.Column('property_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('sketch', sa.LargeBinary(), nullable=False),
+    sa.ForeignKeyConstraint(['property_id'], ['properties.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('property_id', 'day')
+    )
+    op.create_index(op.f('ix_property_visitor_sketches_day'), 'property_visitor_sketches', ['day'], unique=False)
+    # Existing clicks are backfilled with `python maintenance.py rebuild-visitor-sketches`
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_property_visitor_sketches_day'), table_name='property_visitor_sketches')
+    op.drop_table('property_visitor_sketches')
@@ -0,0 +1,147 @@
+"""compact property click storage
+
+Revision ID: 9e6b2f4d8a17
+Revises: 7c4a1e8b3d52
+Create Date: 2026-10-18 22:58:03.117602
+
+"""
+import hashlib
+import ipaddress
+from typing import Optional, Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9e6b2f4d8a17'
+down_revision: Union[str, None] = '7c4a1e8b3d52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 5000
+
+clicks = sa.table(
+    'property_clicks',
+    sa.column('id', sa.Integer()),
+    sa.column('ip_address', sa.String()),
+    sa.column('user_agent', sa.String()),
+    sa.column('ip', sa.LargeBinary()),
+    sa.column('user_agent_id', sa.Integer()),
+)
+user_agents = sa.table(
+    'user_agents',
+    sa.column('id', sa.Integer()),
+    sa.column('digest', sa.LargeBinary()),
+    sa.column('user_agent', sa.Text()),
+)
+
+
+# Frozen copies of utils/ip.py and crud/user_agents.digest, so later changes there cannot alter this migration
+def _pack_ip(address: Optional[str]) -> Optional[bytes]:
+    if not address:
+        return None
+    try:
+        ip = ipaddress.ip_address(address.split('%', 1)[0])
+    except ValueError:
+        return None
+    if ip.version == 6 and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return ip.packed
+
+
+def _unpack_ip(packed: Optional[bytes]) -> Optional[str]:
+    return str(ipaddress.ip_address(bytes(packed))) if packed else None
+
+
+def _digest(user_agent: str) -> bytes:
+    return hashlib.blake2b(user_agent.encode('utf-8'), digest_size=16).digest()
+
+
+def _batches(conn, *columns):
+    """Yield property_clicks rows in id order, BATCH_SIZE at a time."""
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.select(clicks.c.id, *columns).where(clicks.c.id > last_id).order_by(clicks.c.id).limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1].id
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('user_agents',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('digest', sa.LargeBinary(length=16), nullable=False),
+    sa.Column('user_agent', sa.Text(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('digest')
+    )
+    with op.batch_alter_table('property_clicks') as batch_op:
+        batch_op.add_column(sa.Column('ip', sa.LargeBinary(length=16), nullable=True))
+        batch_op.add_column(sa.Column('user_agent_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_property_clicks_user_agent_id', 'user_agents', ['user_agent_id'], ['id'])
+
+    # Convert existing rows in id order, one batch in memory at a time
+    conn = op.get_bind()
+    agent_ids = {}
+    for rows in _batches(conn, clicks.c.ip_address, clicks.c.user_agent):
+        new_agents = {}
+        for row in rows:
+            if row.user_agent and _digest(row.user_agent) not in agent_ids:
+                new_agents[_digest(row.user_agent)] = row.user_agent
+        if new_agents:
+            conn.execute(user_agents.insert(), [{'digest': d, 'user_agent': ua} for d, ua in new_agents.items()])
+            agent_ids.update(conn.execute(
+                sa.select(user_agents.c.digest, user_agents.c.id).where(user_agents.c.digest.in_(list(new_agents)))
+            ).all())
+        conn.execute(
+            clicks.update()
+            .where(clicks.c.id == sa.bindparam('b_id'))
+            .values(ip=sa.bindparam('b_ip'), user_agent_id=sa.bindparam('b_agent')),
+            [
+                {
+                    'b_id': row.id,
+                    'b_ip': _pack_ip(row.ip_address),
+                    'b_agent': agent_ids[_digest(row.user_agent)] if row.user_agent else None,
+                }
+                for row in rows
+            ],
+        )
+
+    # PostgreSQL reuses the freed space for new rows; VACUUM FULL (or pg_repack) returns it to the OS
+    with op.batch_alter_table('property_clicks') as batch_op:
+        batch_op.drop_column('user_agent')
+        batch_op.drop_column('ip_address')
+        # ix_property_clicks_property_id_clicked_at already serves lookups by property_id
+        batch_op.drop_index(batch_op.f('ix_property_clicks_property_id'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('property_clicks') as batch_op:
+        batch_op.create_index(batch_op.f('ix_property_clicks_property_id'), ['property_id'], unique=False)
+        batch_op.add_column(sa.Column('ip_address', sa.String(), nullable=True))
+        batch_op.add_column(sa.Column('user_agent', sa.String(), nullable=True))
+
+    conn = op.get_bind()
+    agents = dict(conn.execute(sa.select(user_agents.c.id, user_agents.c.user_agent)).all())
+    for rows in _batches(conn, clicks.c.ip, clicks.c.user_agent_id):
+        conn.execute(
+            clicks.update()
+            .where(clicks.c.id == sa.bindparam('b_id'))
+            .values(ip_address=sa.bindparam('b_ip'), user_agent=sa.bindparam('b_agent')),
+            [
+                {'b_id': row.id, 'b_ip': _unpack_ip(row.ip), 'b_agent': agents.get(row.user_agent_id)}
+                for row in rows
+            ],
+        )
+
+    with op.batch_alter_table('property_clicks') as batch_op:
+        batch_op.drop_constraint('fk_property_clicks_user_agent_id', type_='foreignkey')
+        batch_op.drop_column('user_agent_id')
+        batch_op.drop_column('ip')
+    op.drop_table('user_agents')
@@ -0,0 +1,91 @@
+"""add image variants
+
+Revision ID: b3f7a9c1d2e4
+Revises: 9e6b2f4d8a17
+Create Date: 2026-10-19 00:41:52.730114
+
+"""
+from typing import Optional, Sequence, Union
+from urllib.parse import urlsplit
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3f7a9c1d2e4'
+down_revision: Union[str, None] = '9e6b2f4d8a17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+property_images = sa.table(
+    'property_images',
+    sa.column('id', sa.Integer()),
+    sa.column('image_url', sa.String()),
+    sa.column('upload_path', sa.String()),
+)
+properties = sa.table(
+    'properties',
+    sa.column('id', sa.Integer()),
+    sa.column('image_url', sa.String()),
+    sa.column('image_upload_path', sa.String()),
+)
+
+
+# Frozen copy of utils/media.upload_path
+def _upload_path(url: Optional[str]) -> Optional[str]:
+    if not url:
+        return None
+    path = urlsplit(url).path
+    if not path.startswith('/static/uploads/'):
+        return None
+    relative = path[len('/static/uploads/'):]
+    if not relative or '..' in relative.split('/'):
+        return None
+    return relative
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('image_variants',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('source', sa.String(), nullable=False),
+    sa.Column('path', sa.String(), nullable=False),
+    sa.Column('content_type', sa.String(), nullable=False),
+    sa.Column('width', sa.Integer(), nullable=False),
+    sa.Column('height', sa.Integer(), nullable=False),
+    sa.Column('size', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('path')
+    )
+    op.create_index(op.f('ix_image_variants_source'), 'image_variants', ['source'], unique=False)
+    with op.batch_alter_table('property_images') as batch_op:
+        batch_op.add_column(sa.Column('upload_path', sa.String(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_property_images_upload_path'), ['upload_path'], unique=False)
+    with op.batch_alter_table('properties') as batch_op:
+        batch_op.add_column(sa.Column('image_upload_path', sa.String(), nullable=True))
+
+    conn = op.get_bind()
+    for table, path_column in ((property_images, 'upload_path'), (properties, 'image_upload_path')):
+        rows = conn.execute(sa.select(table.c.id, table.c.image_url)).all()
+        updates = [{'b_id': row.id, 'b_path': _upload_path(row.image_url)} for row in rows]
+        updates = [update for update in updates if update['b_path']]
+        if updates:
+            conn.execute(
+                table.update()
+                .where(table.c.id == sa.bindparam('b_id'))
+                .values({path_column: sa.bindparam('b_path')}),
+                updates,
+            )
+    # Derivatives of existing uploads are rendered with `python maintenance.py build-image-variants`
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('properties') as batch_op:
+        batch_op.drop_column('image_upload_path')
+    with op.batch_alter_table('property_images') as batch_op:
+        batch_op.drop_index(batch_op.f('ix_property_images_upload_path'))
+        batch_op.drop_column('upload_path')
+    op.drop_index(op.f('ix_image_variants_source'), table_name='image_variants')
+    op.drop_table('image_variants')
@@ -0,0 +1,61 @@
+"""add property full-text index
+
+Revision ID: b7e2d4c91a05
+Revises: 3f1c9a7d2b84
+Create Date: 2026-10-18 10:02:11.530417
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e2d4c91a05'
+down_revision: Union[str, None] = '3f1c9a7d2b84'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Must match SEARCH_TEXT_CONFIG used by backend/core/search.py at runtime
+TEXT_CONFIG = 'simple'
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS property_search USING fts5("
+            "title, description, location, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        op.execute("DELETE FROM property_search")
+        op.execute(
+            "INSERT INTO property_search (rowid, title, description, location) "
+            "SELECT id, coalesce(title, ''), coalesce(description, ''), coalesce(location, '') FROM properties"
+        )
+    elif dialect == 'postgresql':
+        op.create_table(
+            'property_search',
+            sa.Column('property_id', sa.Integer(), sa.ForeignKey('properties.id', ondelete='CASCADE'), primary_key=True),
+            sa.Column('document', postgresql.TSVECTOR(), nullable=False),
+        )
+        op.create_index('ix_property_search_document', 'property_search', ['document'], postgresql_using='gin')
+        op.execute(
+            "INSERT INTO property_search (property_id, document) SELECT id, "
+            f"setweight(to_tsvector('{TEXT_CONFIG}', coalesce(title, '')), 'A') || "
+            f"setweight(to_tsvector('{TEXT_CONFIG}', coalesce(location, '')), 'B') || "
+            f"setweight(to_tsvector('{TEXT_CONFIG}', coalesce(description, '')), 'C') "
+            "FROM properties"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute("DROP TABLE IF EXISTS property_search")
+    elif dialect == 'postgresql':
+        op.drop_index('ix_property_search_document', table_name='property_search')
+        op.drop_table('property_search')
@@ -0,0 +1,63 @@
+"""add property geo_cell
+
+Revision ID: c41a8e3f6d27
+Revises: b7e2d4c91a05
+Create Date: 2026-10-18 11:26:53.904112
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41a8e3f6d27'
+down_revision: Union[str, None] = 'b7e2d4c91a05'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Frozen copy of the encoding in backend/utils/geo.py at the time of this migration
+CELL_BITS = 26
+BATCH_SIZE = 1000
+
+
+def _encode_cell(lat, lng):
+    def quantise(value, lower, span):
+        return min(max(int((value - lower) / span * (1 << CELL_BITS)), 0), (1 << CELL_BITS) - 1)
+    x, y = quantise(lng, -180.0, 360.0), quantise(lat, -90.0, 180.0)
+    cell = 0
+    for bit in range(CELL_BITS):
+        cell |= ((x >> bit) & 1) << (2 * bit)
+        cell |= ((y >> bit) & 1) << (2 * bit + 1)
+    return cell
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('properties', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('geo_cell', sa.BigInteger(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_properties_geo_cell'), ['geo_cell'], unique=False)
+
+    conn = op.get_bind()
+    last_id = 0
+    while True:
+        rows = conn.execute(sa.text(
+            "SELECT id, latitude, longitude FROM properties "
+            "WHERE id > :last_id AND latitude IS NOT NULL AND longitude IS NOT NULL "
+            "ORDER BY id LIMIT :batch"
+        ), {"last_id": last_id, "batch": BATCH_SIZE}).fetchall()
+        if not rows:
+            break
+        conn.execute(
+            sa.text("UPDATE properties SET geo_cell = :cell WHERE id = :id"),
+            [{"id": row.id, "cell": _encode_cell(row.latitude, row.longitude)} for row in rows],
+        )
+        last_id = rows[-1].id
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('properties', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_properties_geo_cell'))
+        batch_op.drop_column('geo_cell')
@@ -0,0 +1,45 @@
+"""add stored files
+
+Revision ID: d6e2c8f4a1b7
+Revises: b3f7a9c1d2e4
+Create Date: 2026-10-19 02:16:08.552391
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd6e2c8f4a1b7'
+down_revision: Union[str, None] = 'b3f7a9c1d2e4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('stored_files',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('digest', sa.String(length=64), nullable=False),
+    sa.Column('path', sa.String(), nullable=False),
+    sa.Column('content_type', sa.String(), nullable=False),
+    sa.Column('size', sa.BigInteger(), nullable=False),
+    sa.Column('width', sa.Integer(), nullable=True),
+    sa.Column('height', sa.Integer(), nullable=True),
+    sa.Column('ref_count', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.Column('unreferenced_since', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('digest'),
+    sa.UniqueConstraint('path')
+    )
+    op.create_index(op.f('ix_stored_files_unreferenced_since'), 'stored_files', ['unreferenced_since'], unique=False)
+    # Existing uploads keep their <type>/<name>_<uuid> paths and are not tracked here
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_stored_files_unreferenced_since'), table_name='stored_files')
+    op.drop_table('stored_files')
@@ -0,0 +1,49 @@
+"""add property clusters
+
+Revision ID: d92f0b6a1c58
+Revises: c41a8e3f6d27
+Create Date: 2026-10-18 12:41:07.226381
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd92f0b6a1c58'
+down_revision: Union[str, None] = 'c41a8e3f6d27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Must match backend/crud/property_clusters.py and backend/utils/geo.py
+CELL_BITS = 26
+MIN_LEVEL = 2
+MAX_LEVEL = 20
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('property_clusters',
+    sa.Column('level', sa.Integer(), nullable=False),
+    sa.Column('cell', sa.BigInteger(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.Column('lat_sum', sa.Float(), nullable=False),
+    sa.Column('lng_sum', sa.Float(), nullable=False),
+    sa.Column('min_price', sa.Float(), nullable=True),
+    sa.Column('max_price', sa.Float(), nullable=True),
+    sa.PrimaryKeyConstraint('level', 'cell')
+    )
+    for level in range(MIN_LEVEL, MAX_LEVEL + 1):
+        shift = 2 * (CELL_BITS - level)
+        op.execute(
+            "INSERT INTO property_clusters (level, cell, count, lat_sum, lng_sum, min_price, max_price) "
+            f"SELECT {level}, geo_cell >> {shift}, count(*), sum(latitude), sum(longitude), min(price), max(price) "
+            f"FROM properties WHERE geo_cell IS NOT NULL GROUP BY geo_cell >> {shift}"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('property_clusters')
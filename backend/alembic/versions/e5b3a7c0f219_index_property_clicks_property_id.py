@@ -0,0 +1,28 @@
+"""index property_clicks.property_id
+
+Revision ID: e5b3a7c0f219
+Revises: d92f0b6a1c58
+Create Date: 2026-10-18 13:58:32.671904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5b3a7c0f219'
+down_revision: Union[str, None] = 'd92f0b6a1c58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(op.f('ix_property_clicks_property_id'), 'property_clicks', ['property_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_property_clicks_property_id'), table_name='property_clicks')
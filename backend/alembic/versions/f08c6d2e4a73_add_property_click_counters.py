@@ -0,0 +1,40 @@
+"""add property click counters
+
+Revision ID: f08c6d2e4a73
+Revises: e5b3a7c0f219
+Create Date: 2026-10-18 15:07:44.384195
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f08c6d2e4a73'
+down_revision: Union[str, None] = 'e5b3a7c0f219'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('properties', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('click_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('last_clicked_at', sa.DateTime(timezone=True), nullable=True))
+        batch_op.create_index('ix_properties_click_count_id', ['click_count', 'id'], unique=False)
+
+    op.execute(
+        "UPDATE properties SET "
+        "click_count = (SELECT count(*) FROM property_clicks WHERE property_clicks.property_id = properties.id), "
+        "last_clicked_at = (SELECT max(clicked_at) FROM property_clicks WHERE property_clicks.property_id = properties.id)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('properties', schema=None) as batch_op:
+        batch_op.drop_index('ix_properties_click_count_id')
+        batch_op.drop_column('last_clicked_at')
+        batch_op.drop_column('click_count')
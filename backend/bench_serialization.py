@@ -0,0 +1,116 @@
+"""
+Microbenchmark: response_model validation vs. the prebuilt orjson serializers (FAST_JSON).
+
+Builds in-memory ORM rows (no database needed) and times, per schema:
+  validate+stdlib  - from_attributes validation, then the stdlib json encoder (FastAPI < 0.120)
+  validate+pydantic - from_attributes validation, then pydantic's dump_json (current FastAPI)
+  prebuilt+orjson  - core.serialization.PrebuiltSerializer, no validation
+
+Usage: python bench_serialization.py [--rows 1000] [--repeat 20]
+"""
+import argparse
+import json
+import timeit
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+from pydantic import TypeAdapter
+
+import models
+import schemas
+from core import serialization
+
+
+def make_users() -> List[models.User]:
+    return [
+        models.User(id=1, username="manager_user", email="manager@example.com", role=models.Role.manager),
+        models.User(id=2, username="admin_user", email="admin@example.com", role=models.Role.admin),
+    ]
+
+
+def make_properties(rows: int) -> List[models.Property]:
+    manager, admin = make_users()
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    properties = []
+    for i in range(1, rows + 1):
+        prop = models.Property(
+            id=i, title=f"Casa {i} en venta", description="Amplia casa con jardín y cochera. " * 4,
+            price=150000.0 + i, location="Guadalajara, Jalisco", property_type="Casa",
+            listing_type="Venta de propiedad", bedrooms=3, bathrooms=2, square_feet=180,
+            image_url=f"https://example.com/images/{i}.jpg", latitude=20.67 + i / 1e4, longitude=-103.35,
+            is_featured=i % 10 == 0, assigned_to_id=manager.id, created_by_user_id=admin.id,
+            created_at=start + timedelta(hours=i), updated_at=start + timedelta(hours=i, minutes=5),
+            click_count=i % 37, last_clicked_at=start + timedelta(days=1, hours=i),
+        )
+        prop.assigned_to = manager
+        prop.created_by = admin
+        prop.images = [
+            models.PropertyImage(id=i * 10 + n, property_id=i, image_url=f"https://example.com/images/{i}-{n}.jpg", order=n)
+            for n in range(4)
+        ]
+        prop.clicks = []
+        properties.append(prop)
+    return properties
+
+
+def make_contacts(rows: int) -> List[models.Contact]:
+    manager, _ = make_users()
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    contacts = []
+    for i in range(1, rows + 1):
+        contact = models.Contact(
+            id=i, name=f"Cliente {i}", email=f"cliente{i}@example.com", phone="+52 33 1234 5678",
+            subject="Informes", message="Me interesa la propiedad, ¿sigue disponible?", property_id=i,
+            assigned_to_id=manager.id, submitted_at=start + timedelta(minutes=i), is_read=i % 2 == 0,
+        )
+        contact.assigned_to = manager
+        contacts.append(contact)
+    return contacts
+
+
+def make_team(rows: int) -> List[models.TeamMember]:
+    return [
+        models.TeamMember(id=i, name=f"Asesor {i}", position="Agente inmobiliario", image_url=f"/static/uploads/{i}.jpg", order=i)
+        for i in range(1, rows + 1)
+    ]
+
+
+def bench(label: str, schema, serializer: serialization.PrebuiltSerializer, objs, repeat: int):
+    adapter = TypeAdapter(List[schema])
+
+    def validate_stdlib():
+        return json.dumps(adapter.dump_python(adapter.validate_python(objs, from_attributes=True), mode="json")).encode()
+
+    def validate_pydantic():
+        return adapter.dump_json(adapter.validate_python(objs, from_attributes=True))
+
+    def prebuilt_orjson():
+        return serializer.dumps_many(objs)
+
+    reference = json.loads(validate_pydantic())
+    if json.loads(prebuilt_orjson()) != reference:
+        raise SystemExit(f"{label}: prebuilt output differs from the validated response")
+
+    print(f"{label} ({len(objs)} rows, best of {repeat})")
+    baseline = None
+    for name, fn in (("validate+stdlib", validate_stdlib), ("validate+pydantic", validate_pydantic), ("prebuilt+orjson", prebuilt_orjson)):
+        best = min(timeit.repeat(fn, number=1, repeat=repeat))
+        baseline = baseline or best
+        print(f"  {name:<18} {best * 1000:8.2f} ms  {baseline / best:5.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    properties = make_properties(args.rows)
+    bench("PropertySummary", schemas.PropertySummary, serialization.property_summary_serializer, properties, args.repeat)
+    bench("Property", schemas.Property, serialization.property_serializer, properties, args.repeat)
+    bench("Contact", schemas.Contact, serialization.contact_serializer, make_contacts(args.rows), args.repeat)
+    bench("TeamMember", schemas.TeamMember, serialization.team_member_serializer, make_team(args.rows), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
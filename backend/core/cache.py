@@ -0,0 +1,67 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+# Small in-process caches for read-heavy public queries.
+#
+# Each cache is a size-bounded LRU with a per-entry TTL. Writers invalidate by bumping the
+# cache's version rather than clearing it: entries stored under an older version are treated
+# as misses and evicted lazily. Caches are per worker process, so the TTL also bounds how
+# long another worker can serve data that predates a write it did not see.
+
+
+class QueryCache:
+    def __init__(self, name: str, max_entries: int = 512, ttl_seconds: float = 60.0):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, Tuple[int, float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Tuple[bool, Optional[Any]]:
+        """Return (found, value); stale, expired and missing entries count as misses."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                version, expires_at, value = entry
+                if version == self.version and expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def set(self, key: Hashable, value: Any, version: Optional[int] = None):
+        """
+        Store a value. Pass the version read before computing it so that a result computed
+        across a concurrent invalidation is dropped instead of cached as current.
+        """
+        with self._lock:
+            if version is not None and version != self.version:
+                return
+            self._entries[key] = (self.version, time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self):
+        with self._lock:
+            self.version += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "name": self.name,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "version": self.version,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
@@ -0,0 +1,242 @@
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Callable, Iterable, List, NamedTuple, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Buffered click ingestion (CLICK_INGEST_MODE=buffered).
+#
+# track-click hands each click to ClickBuffer.submit() and returns 202 straight away. A
+# background thread takes clicks off a bounded in-memory queue and hands them to `writer`
+# in batches of up to batch_size, or whatever has arrived after flush_interval seconds,
+# so the database sees one multi-row insert and one commit per batch instead of one per click.
+#
+# When the queue is full the policy decides what happens to a new click:
+#   drop  - discard it (counted in stats)
+#   block - wait up to block_timeout seconds for room, then drop
+#   spill - append it to a JSON-lines file in spill_dir; the flusher replays spill files
+#           once the queue has drained, and also spills batches the writer failed on
+#
+# Property ids are checked against a cached id set at submit time, so unknown ids can still
+# be rejected with 404 without a query per click. stop() drains the queue before returning.
+
+POLICIES = ("drop", "block", "spill")
+MIN_ID_RELOAD_SECONDS = 5.0  # Misses reload the id set at most this often
+ORPHAN_SPILL_AGE_SECONDS = 300.0  # Spill files of other (likely dead) workers are replayed after this
+
+
+class ClickEvent(NamedTuple):
+    property_id: int
+    clicked_at: datetime
+    ip_address: Optional[str]
+    user_agent: Optional[str]
+
+
+class ClickBuffer:
+    def __init__(
+        self,
+        writer: Callable[[List[ClickEvent]], int],
+        id_loader: Callable[[], Set[int]],
+        max_size: int = 10000,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        policy: str = "drop",
+        block_timeout: float = 0.5,
+        spill_dir: Optional[str] = None,
+        id_refresh_seconds: float = 60.0,
+    ):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown click buffer policy '{policy}'. Valid policies are {', '.join(POLICIES)}.")
+        if policy == "spill" and not spill_dir:
+            raise ValueError("The spill policy needs a spill directory.")
+        self.writer = writer
+        self.id_loader = id_loader
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.spill_dir = spill_dir
+        self.id_refresh_seconds = id_refresh_seconds
+
+        self._queue: "deque[ClickEvent]" = deque()
+        self._cond = threading.Condition()
+        self._spill_lock = threading.Lock()
+        self._ids_lock = threading.Lock()
+        self._known_ids: Set[int] = set()
+        self._ids_loaded_at = float("-inf")
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self.counters = {
+            "accepted": 0, "dropped": 0, "spilled": 0, "replayed": 0,
+            "written": 0, "invalid": 0, "batches": 0, "flush_errors": 0, "lost": 0,
+        }
+
+    # --- producer side -------------------------------------------------------------
+
+    def is_known_property(self, property_id: int) -> bool:
+        """Check an id against the cached id set, reloading it when stale or (rate-limited) on a miss."""
+        with self._ids_lock:
+            age = time.monotonic() - self._ids_loaded_at
+            if age > self.id_refresh_seconds or (property_id not in self._known_ids and age > MIN_ID_RELOAD_SECONDS):
+                self._known_ids = set(self.id_loader())
+                self._ids_loaded_at = time.monotonic()
+            return property_id in self._known_ids
+
+    def forget_ids(self):
+        """Force the next is_known_property() call to reload (e.g. after properties change)."""
+        with self._ids_lock:
+            self._ids_loaded_at = float("-inf")
+
+    def submit(self, event: ClickEvent) -> bool:
+        """Queue a click. Returns False if the backpressure policy dropped it."""
+        with self._cond:
+            if len(self._queue) >= self.max_size and self.policy == "block":
+                deadline = time.monotonic() + self.block_timeout
+                while len(self._queue) >= self.max_size and not self._stopping:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+            if len(self._queue) < self.max_size:
+                self._queue.append(event)
+                self.counters["accepted"] += 1
+                if len(self._queue) >= self.batch_size:
+                    self._cond.notify_all()
+                return True
+            if self.policy != "spill":
+                self.counters["dropped"] += 1
+                return False
+        self._spill([event])
+        with self._cond:
+            self.counters["accepted"] += 1
+            self.counters["spilled"] += 1
+        return True
+
+    # --- flusher -------------------------------------------------------------------
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="click-flusher", daemon=True)
+        self._thread.start()
+        logger.info(f"Click buffer started (policy={self.policy}, batch_size={self.batch_size}, max_size={self.max_size}).")
+
+    def stop(self, timeout: float = 30.0):
+        """Stop accepting waits, flush everything still queued and join the flusher."""
+        if self._thread is None:
+            return
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.error(f"Click flusher did not finish within {timeout}s; {len(self._queue)} clicks still queued.")
+        self._thread = None
+        logger.info(f"Click buffer stopped. Stats: {self.stats()}")
+
+    def flush(self):
+        """Write everything queued right now on the calling thread."""
+        while True:
+            batch = self._take(wait=False)
+            if not batch:
+                return
+            self._write(batch)
+
+    def _take(self, wait: bool = True) -> List[ClickEvent]:
+        with self._cond:
+            if wait and len(self._queue) < self.batch_size and not self._stopping:
+                self._cond.wait(self.flush_interval)
+            count = min(len(self._queue), self.batch_size)
+            batch = [self._queue.popleft() for _ in range(count)]
+            if batch:
+                self._cond.notify_all()  # Wake producers blocked on a full queue
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take()
+            if batch:
+                self._write(batch)
+            elif self._stopping:
+                break
+            elif self.spill_dir:
+                try:
+                    self._replay_spills()
+                except Exception as e:
+                    logger.error(f"Failed to replay spilled clicks: {e}", exc_info=True)
+        self.flush()
+
+    def _write(self, batch: List[ClickEvent]):
+        try:
+            written = self.writer(batch)
+        except Exception as e:
+            logger.error(f"Failed to write a batch of {len(batch)} clicks: {e}", exc_info=True)
+            with self._cond:
+                self.counters["flush_errors"] += 1
+            if self.spill_dir:
+                self._spill(batch)
+                with self._cond:
+                    self.counters["spilled"] += len(batch)
+            else:
+                with self._cond:
+                    self.counters["lost"] += len(batch)
+            return
+        with self._cond:
+            self.counters["batches"] += 1
+            self.counters["written"] += written
+            self.counters["invalid"] += len(batch) - written
+
+    # --- spill files ---------------------------------------------------------------
+
+    def _spill_path(self, pid: Optional[int] = None) -> str:
+        return os.path.join(self.spill_dir, f"clicks-{pid or os.getpid()}.jsonl")
+
+    def _spill(self, events: Iterable[ClickEvent]):
+        lines = "".join(
+            json.dumps([e.property_id, e.clicked_at.isoformat(), e.ip_address, e.user_agent]) + "\n" for e in events
+        )
+        with self._spill_lock:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            with open(self._spill_path(), "a", encoding="utf-8") as f:
+                f.write(lines)
+
+    def _replay_spills(self):
+        own = self._spill_path()
+        for path in glob.glob(os.path.join(self.spill_dir, "clicks-*.jsonl")):
+            try:
+                if path != own and time.time() - os.path.getmtime(path) < ORPHAN_SPILL_AGE_SECONDS:
+                    continue  # Another live worker's file
+                claimed = f"{path}.replay-{os.getpid()}"
+                with self._spill_lock:
+                    os.rename(path, claimed)  # Atomic claim; a concurrent claimer gets FileNotFoundError
+            except FileNotFoundError:
+                continue
+            with open(claimed, encoding="utf-8") as f:
+                events = []
+                for line in f:
+                    property_id, clicked_at, ip_address, user_agent = json.loads(line)
+                    events.append(ClickEvent(property_id, datetime.fromisoformat(clicked_at), ip_address, user_agent))
+            os.remove(claimed)
+            logger.info(f"Replaying {len(events)} spilled clicks from {path}.")
+            with self._cond:
+                self.counters["replayed"] += len(events)
+            for start in range(0, len(events), self.batch_size):
+                self._write(events[start:start + self.batch_size])
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                **self.counters,
+                "queued": len(self._queue),
+                "max_size": self.max_size,
+                "policy": self.policy,
+                "running": self._thread is not None,
+            }
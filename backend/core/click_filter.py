@@ -0,0 +1,76 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+# Click deduplication and bot filtering, applied by track-click before a click is written.
+#
+# Bots are recognised by a single compiled user-agent regex (requests without a user agent
+# count as bots too). Repeat clicks are recognised by a time-windowed LRU: the first click
+# for a (ip_address, user_agent, property_id) key opens a window of window_seconds and
+# later clicks inside it are duplicates. Only a 64-bit hash of the key is kept, entries
+# are ordered by when their window opened, so expired ones are evicted from the front and
+# the table never grows past max_entries. Filtered clicks are counted but never written.
+
+BOT_USER_AGENT_PATTERN = re.compile(
+    r"bot\b|bot/|crawl|spider|slurp|archiver|fetcher|scrapy|preview|headless|phantomjs|"
+    r"lighthouse|pingdom|uptime|monitor|facebookexternalhit|embedly|whatsapp|"
+    r"python-requests|python-urllib|aiohttp|httpx|curl/|wget/|go-http-client|okhttp|java/|libwww|"
+    r"node-fetch|axios/",
+    re.IGNORECASE,
+)
+
+
+def is_bot(user_agent: Optional[str]) -> bool:
+    return not user_agent or BOT_USER_AGENT_PATTERN.search(user_agent) is not None
+
+
+class ClickFilter:
+    def __init__(self, window_seconds: float = 1800.0, max_entries: int = 100000, filter_bots: bool = True):
+        self.window_seconds = window_seconds
+        self.max_entries = max_entries
+        self.filter_bots = filter_bots
+        self._seen: "OrderedDict[int, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {"passed": 0, "duplicate": 0, "bot": 0, "prefetch": 0}
+
+    def check(self, ip_address: Optional[str], user_agent: Optional[str], property_id: int, prefetch: bool = False) -> Optional[str]:
+        """Return why the click should be skipped ("prefetch", "bot" or "duplicate"), or None to record it."""
+        if prefetch:
+            reason = "prefetch"
+        elif self.filter_bots and is_bot(user_agent):
+            reason = "bot"
+        elif self._is_duplicate(hash((ip_address, user_agent, property_id))):
+            reason = "duplicate"
+        else:
+            reason = None
+        with self._lock:
+            self.counters[reason or "passed"] += 1
+        return reason
+
+    def _is_duplicate(self, key: int) -> bool:
+        if self.window_seconds <= 0:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            while self._seen:
+                oldest_key, opened_at = next(iter(self._seen.items()))
+                if now - opened_at < self.window_seconds:
+                    break
+                del self._seen[oldest_key]
+            if key in self._seen:
+                return True
+            self._seen[key] = now
+            while len(self._seen) > self.max_entries:
+                self._seen.popitem(last=False)
+            return False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self.counters,
+                "tracked_keys": len(self._seen),
+                "max_entries": self.max_entries,
+                "window_seconds": self.window_seconds,
+            }
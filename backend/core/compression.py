@@ -0,0 +1,176 @@
+import gzip
+import logging
+import threading
+from typing import Dict, Optional
+
+from anyio import to_thread
+from fastapi import Request, Response
+from starlette.datastructures import Headers, MutableHeaders
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+try:
+    import brotli
+except ImportError:  # Optional: without it only gzip is offered
+    brotli = None
+    logger.info("brotli not installed; responses will only be gzip-compressed.")
+
+# HTTP response compression.
+#
+# CompressionMiddleware negotiates br or gzip from Accept-Encoding and compresses complete
+# (non-streaming) responses of compressible types once they reach COMPRESSION_MINIMUM_SIZE.
+# Bodies above COMPRESSION_OFFLOAD_SIZE are compressed in a worker thread so a large listing
+# does not stall the event loop. Cached bodies are wrapped in CompressedVariants, which keeps
+# each encoding next to the raw bytes; variant_response() serves them already encoded and
+# the middleware passes anything with a Content-Encoding or Content-Range, and files the
+# server sends itself (http.response.pathsend), through untouched.
+#
+# Compressed representations carry a weak ETag (W/"..."), as nginx does, because their bytes
+# differ from the identity encoding; If-None-Match uses weak comparison so 304s still work.
+
+COMPRESSIBLE_TYPES = (
+    "application/json", "application/javascript", "application/xml", "image/svg+xml", "text/",
+)
+
+
+def supported_encodings():
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick the best supported encoding the client accepts, preferring br on ties; None for identity."""
+    if not accept_encoding:
+        return None
+    weights: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        weights[coding.strip().lower()] = quality
+    best, best_quality = None, 0.0
+    for encoding in supported_encodings():
+        quality = weights.get(encoding, weights.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=settings.COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=settings.COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+def is_compressible(content_type: Optional[str]) -> bool:
+    return bool(content_type) and content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def _mark_encoded(headers: MutableHeaders, encoding: str, length: int):
+    headers["Content-Encoding"] = encoding
+    headers["Content-Length"] = str(length)
+    etag = headers.get("etag")
+    if etag and not etag.startswith("W/"):
+        headers["ETag"] = "W/" + etag
+    headers.add_vary_header("Accept-Encoding")
+
+
+class CompressedVariants:
+    """A response body plus its compressed encodings, computed on first use and then kept."""
+
+    def __init__(self, raw: bytes):
+        self.raw = raw
+        self._encoded: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def get(self, encoding: Optional[str]) -> bytes:
+        if encoding is None:
+            return self.raw
+        encoded = self._encoded.get(encoding)
+        if encoded is None:
+            encoded = compress(self.raw, encoding)
+            with self._lock:
+                encoded = self._encoded.setdefault(encoding, encoded)
+        return encoded
+
+
+def variant_response(variants: CompressedVariants, request: Request, media_type: str = "application/json") -> Response:
+    """Serve cached bytes in the client's preferred encoding without compressing them again."""
+    encoding = None
+    if len(variants.raw) >= settings.COMPRESSION_MINIMUM_SIZE:
+        encoding = negotiate(request.headers.get("accept-encoding"))
+    response = Response(content=variants.get(encoding), media_type=media_type)
+    if encoding is not None:
+        _mark_encoded(response.headers, encoding, len(response.body))
+    else:
+        response.headers.add_vary_header("Accept-Encoding")
+    return response
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing complete responses in the negotiated encoding."""
+
+    def __init__(self, app, minimum_size: int = 1024, offload_size: int = 65536):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.offload_size = offload_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start_message, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or start_message is None:
+                # E.g. http.response.pathsend: the server sends the file itself, uncompressed
+                passthrough = True
+                if start_message is not None:
+                    await send(start_message)
+                await send(message)
+                return
+
+            headers = MutableHeaders(scope=start_message)
+            body = message.get("body", b"")
+            compressible = (
+                is_compressible(headers.get("content-type"))
+                and "content-encoding" not in headers
+                and "content-range" not in headers  # A partial body must stay byte-for-byte the range asked for
+            )
+            if message.get("more_body", False) or not compressible or len(body) < self.minimum_size:
+                # Streaming, already encoded, partial, binary or too small to be worth it: send as is
+                if compressible:
+                    headers.add_vary_header("Accept-Encoding")
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            if len(body) > self.offload_size:
+                body = await to_thread.run_sync(compress, body, encoding)
+            else:
+                body = compress(body, encoding)
+            _mark_encoded(headers, encoding, len(body))
+            await send(start_message)
+            await send({"type": "http.response.body", "body": body, "more_body": False})
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,73 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+
+from fastapi import Request, Response
+
+# HTTP conditional GET helpers.
+#
+# Endpoints build a strong ETag from a crud.table_versions counter plus whatever else shapes
+# the response (query parameters, the caller's role), check the request's validators before
+# doing any real work, and answer 304 Not Modified when the client's copy is still current.
+
+
+def make_etag(version: int, *parts) -> str:
+    digest = hashlib.sha1(repr((version,) + parts).encode()).hexdigest()[:16]
+    return f'"{version}-{digest}"'
+
+
+def http_date(value: Optional[datetime]) -> Optional[str]:
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)  # SQLite drops the offset; versions are stamped in UTC
+    return format_datetime(value.astimezone(timezone.utc).replace(microsecond=0), usegmt=True)
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    # If-None-Match uses the weak comparison function (RFC 9110 13.1.2)
+    candidates = [tag.strip() for tag in header.split(",")]
+    return "*" in candidates or any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime] = None) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # When present, If-None-Match takes precedence over If-Modified-Since
+        return _etag_matches(if_none_match, etag)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None or last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if last_modified.tzinfo is None:
+        last_modified = last_modified.replace(tzinfo=timezone.utc)
+    return last_modified.replace(microsecond=0) <= since
+
+
+def set_validators(
+    response: Response,
+    etag: str,
+    last_modified: Optional[datetime] = None,
+    private: bool = False,
+    vary: Optional[str] = None,
+):
+    """Attach ETag/Last-Modified and ask caches to revalidate before reusing the response."""
+    if "content-encoding" in response.headers:
+        etag = "W/" + etag  # Already compressed; see core/compression.py
+    response.headers["ETag"] = etag
+    modified = http_date(last_modified)
+    if modified:
+        response.headers["Last-Modified"] = modified
+    response.headers["Cache-Control"] = "private, no-cache" if private else "no-cache"
+    if vary:
+        response.headers.add_vary_header(vary)
+
+
+def not_modified(etag: str, last_modified: Optional[datetime] = None, private: bool = False, vary: Optional[str] = None) -> Response:
+    response = Response(status_code=304)
+    set_validators(response, etag, last_modified, private=private, vary=vary)
+    return response
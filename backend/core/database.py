@@ -3,6 +3,7 @@ from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 import models
 from .config import settings
+from .search import ensure_search_index
 
 # Import settings
 # from .config import settings
@@ -28,6 +29,8 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 # Create all tables (development convenience; use Alembic for prod)
 models.Base.metadata.create_all(bind=engine)
+# The full-text index is raw DDL (FTS5 / tsvector), so create_all does not know about it
+ensure_search_index(engine)
 
 # Dependency to get DB session
 def get_db():
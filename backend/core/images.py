@@ -0,0 +1,193 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional, Sequence, TypedDict
+
+from PIL import Image, ImageOps, features
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# Image derivatives.
+#
+# Every uploaded image gets resized copies for responsive srcsets: one per configured width
+# smaller than the original (plus the original width itself when it is below the largest
+# configured one), in each configured format. The copies are re-encoded from decoded pixels
+# with the EXIF orientation applied, so camera metadata (GPS position included) is not carried
+# over. Decoding and encoding are CPU bound and hold the GIL, so they run in a small process
+# pool; the event loop awaits the result without blocking other requests.
+#
+# Derivatives are written next to the original as <original stem>-<width>w.<ext>.
+
+OUTPUT_FORMATS = {
+    # name: (Pillow format, content type, extension, save options)
+    "webp": ("WEBP", "image/webp", ".webp", {"method": 4}),
+    "avif": ("AVIF", "image/avif", ".avif", {"speed": 8}),
+    "jpeg": ("JPEG", "image/jpeg", ".jpg", {"optimize": True, "progressive": True}),
+    "png": ("PNG", "image/png", ".png", {"optimize": True}),
+}
+LOSSY_FORMATS = ("WEBP", "AVIF", "JPEG")
+ORIENTATION_TAG = 0x0112
+
+
+class RenderedVariant(TypedDict):
+    width: int
+    height: int
+    content_type: str
+    filename: str
+    size: int
+
+
+class RenderedImage(TypedDict):
+    width: int
+    height: int
+    variants: List[RenderedVariant]
+
+
+def variant_widths() -> List[int]:
+    return sorted({int(w) for w in settings.IMAGE_VARIANT_WIDTHS.split(",") if w.strip()})
+
+
+def variant_formats() -> List[str]:
+    """The configured output formats this Pillow build can encode."""
+    formats = []
+    for name in (f.strip().lower() for f in settings.IMAGE_VARIANT_FORMATS.split(",")):
+        if name not in OUTPUT_FORMATS:
+            continue
+        if name in ("webp", "avif") and not features.check(name):
+            continue
+        formats.append(name)
+    return formats
+
+
+def _target_widths(original_width: int, widths: Sequence[int]) -> List[int]:
+    targets = [w for w in widths if w < original_width]
+    if widths and original_width <= max(widths):
+        targets.append(original_width)
+    return targets
+
+
+def _save(image: Image.Image, path: str, fmt: str, quality: int, icc_profile: Optional[bytes]):
+    pillow_format, _, _, options = OUTPUT_FORMATS[fmt]
+    options = dict(options)
+    if pillow_format in LOSSY_FORMATS:
+        options["quality"] = quality
+    if icc_profile:
+        options["icc_profile"] = icc_profile
+    if pillow_format == "JPEG" and image.mode == "RGBA":
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        image = background
+    temp_path = f"{path}.part"
+    try:
+        image.save(temp_path, pillow_format, **options)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def render_variants(source_path: str, widths: Sequence[int], formats: Sequence[str], quality: int) -> RenderedImage:
+    """
+    Write the derivatives of the image at source_path and describe them. Runs in a pool
+    process, so it only takes and returns plain values.
+    """
+    directory, filename = os.path.split(source_path)
+    stem = os.path.splitext(filename)[0]
+    with Image.open(source_path) as source:
+        width, height = source.size
+        rotated = source.getexif().get(ORIENTATION_TAG, 1) in (5, 6, 7, 8)  # Stored a quarter turn off
+        if rotated:
+            width, height = height, width
+        targets = _target_widths(width, widths)
+        if targets and source.format == "JPEG":
+            # Let the JPEG decoder downscale by up to 8x while decoding, never below the largest target
+            largest = max(targets)
+            request = (largest, round(largest * height / width))
+            source.draft("RGB", request[::-1] if rotated else request)
+        # Keep the colour profile (not metadata) unless conversion to RGB makes it wrong
+        icc_profile = source.info.get("icc_profile") if source.mode != "CMYK" else None
+        image = ImageOps.exif_transpose(source)
+        image.load()
+
+    has_alpha = image.mode in ("RGBA", "LA", "PA") or (image.mode == "P" and "transparency" in image.info)
+    image = image.convert("RGBA" if has_alpha else "RGB")
+    image.info.clear()  # Drop EXIF/XMP so no encoder copies them over
+    variants: List[RenderedVariant] = []
+    for target in sorted(targets, reverse=True):
+        target_height = max(1, round(target * height / width))
+        resized = image if image.size == (target, target_height) else image.resize(
+            (target, target_height), Image.LANCZOS, reducing_gap=3.0
+        )
+        for fmt in formats:
+            _, content_type, extension, _ = OUTPUT_FORMATS[fmt]
+            variant_name = f"{stem}-{target}w{extension}"
+            variant_path = os.path.join(directory, variant_name)
+            _save(resized, variant_path, fmt, quality, icc_profile)
+            variants.append(RenderedVariant(
+                width=target,
+                height=target_height,
+                content_type=content_type,
+                filename=variant_name,
+                size=os.path.getsize(variant_path),
+            ))
+    return RenderedImage(width=width, height=height, variants=variants)
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn rather than fork: the API process runs threads (background jobs, click buffer)
+            _pool = ProcessPoolExecutor(settings.IMAGE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True, cancel_futures=True)
+            _pool = None
+
+
+def _discard_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+async def build_variants(source_path: str) -> Optional[RenderedImage]:
+    """
+    Render the derivatives of source_path in the process pool. Returns None when derivatives
+    are disabled or the image cannot be decoded (e.g. HEIC without a decoder plugin): the
+    original upload is still usable, only without a srcset.
+    """
+    if settings.IMAGE_WORKERS <= 0:
+        return None
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(
+            _get_pool(), render_variants, source_path, variant_widths(), variant_formats(), settings.IMAGE_VARIANT_QUALITY
+        )
+    except BrokenProcessPool as e:
+        # A worker died (e.g. killed for memory); start a fresh pool for the next upload
+        logger.error(f"Image worker failed while rendering {source_path}: {e}")
+        _discard_pool()
+        return None
+    except Exception as e:
+        logger.warning(f"Could not render derivatives of {source_path}: {e}")
+        return None
+
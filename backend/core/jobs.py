@@ -0,0 +1,48 @@
+import logging
+import threading
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Background jobs that run on a fixed interval inside each API worker process (started and
+# stopped by main.py's lifespan). Jobs must be safe to run concurrently from several workers.
+
+
+class PeriodicJob:
+    def __init__(self, name: str, interval_seconds: float, fn: Callable[[], object]):
+        self.name = name
+        self.interval_seconds = interval_seconds
+        self.fn = fn
+        self.runs = 0
+        self.failures = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def run_once(self):
+        try:
+            result = self.fn()
+            self.runs += 1
+            logger.debug(f"Job {self.name} finished: {result}")
+        except Exception as e:
+            self.failures += 1
+            logger.error(f"Job {self.name} failed: {e}", exc_info=True)
+
+    def _loop(self):
+        while not self._stop.wait(self.interval_seconds):
+            self.run_once()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name=f"job-{self.name}", daemon=True)
+        self._thread.start()
+        logger.info(f"Started job {self.name} (every {self.interval_seconds}s).")
+
+    def stop(self, timeout: float = 30.0):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self._thread = None
+        logger.info(f"Stopped job {self.name}.")
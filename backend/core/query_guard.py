@@ -0,0 +1,101 @@
+import logging
+from contextvars import ContextVar
+from typing import List, Optional
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Guards against N+1 query regressions.
+#
+# count_queries() is a context manager for tests:
+#
+#     with count_queries(engine, max_queries=3) as counter:
+#         client.get("/api/properties/")
+#
+# It raises TooManyQueries on exit when more statements ran than allowed. QueryBudgetMiddleware
+# applies the same count per request at runtime and logs offenders (enabled via SQL_QUERY_BUDGET).
+
+
+class TooManyQueries(AssertionError):
+    pass
+
+
+class QueryCounter:
+    def __init__(self, max_queries: Optional[int] = None):
+        self.max_queries = max_queries
+        self.statements: List[str] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def record(self, statement: str):
+        self.statements.append(statement)
+
+    def over_budget(self) -> bool:
+        return self.max_queries is not None and self.count > self.max_queries
+
+    def report(self) -> str:
+        listing = "\n".join(f"  {idx + 1}. {stmt}" for idx, stmt in enumerate(self.statements))
+        return f"{self.count} SQL statements executed (budget {self.max_queries}):\n{listing}"
+
+
+class count_queries:
+    """Count statements executed on `engine` inside the block; raise TooManyQueries if over max_queries."""
+
+    def __init__(self, engine, max_queries: Optional[int] = None):
+        self.engine = engine
+        self.counter = QueryCounter(max_queries)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.counter.record(statement)
+
+    def __enter__(self) -> QueryCounter:
+        event.listen(self.engine, "before_cursor_execute", self._on_execute)
+        return self.counter
+
+    def __exit__(self, exc_type, exc, tb):
+        event.remove(self.engine, "before_cursor_execute", self._on_execute)
+        if exc_type is None and self.counter.over_budget():
+            raise TooManyQueries(self.counter.report())
+        return False
+
+
+# Per-request counting: the middleware installs a counter in this context variable and a
+# single engine-wide listener records into whichever counter is active. Sync endpoints run in
+# a threadpool with a copy of the request context, so they share the same counter object.
+_request_counter: ContextVar[Optional[QueryCounter]] = ContextVar("request_query_counter", default=None)
+
+
+def _record_request_statement(conn, cursor, statement, parameters, context, executemany):
+    counter = _request_counter.get()
+    if counter is not None:
+        counter.record(statement)
+
+
+def install_request_counting(engine):
+    if not event.contains(engine, "before_cursor_execute", _record_request_statement):
+        event.listen(engine, "before_cursor_execute", _record_request_statement)
+
+
+class QueryBudgetMiddleware:
+    """ASGI middleware that logs requests issuing more SQL statements than max_queries."""
+
+    def __init__(self, app, engine, max_queries: int):
+        self.app = app
+        self.max_queries = max_queries
+        install_request_counting(engine)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        counter = QueryCounter(self.max_queries)
+        token = _request_counter.set(counter)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_counter.reset(token)
+            if counter.over_budget():
+                logger.warning(f"{scope['method']} {scope['path']} exceeded its SQL budget. {counter.report()}")
@@ -0,0 +1,137 @@
+import re
+import logging
+from typing import List
+
+from sqlalchemy import Float, Integer, text
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# Full-text index over properties.title/description/location.
+# SQLite: an FTS5 virtual table whose rowid is the property id.
+# PostgreSQL: a side table of weighted tsvectors with a GIN index.
+# Other dialects have no index and fall back to ILIKE in CRUDProperty.filter_properties.
+SEARCH_TABLE = "property_search"
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _dialect(bind) -> str:
+    return bind.dialect.name
+
+
+def is_supported(bind) -> bool:
+    return _dialect(bind) in ("sqlite", "postgresql")
+
+
+def tokenize(search: str) -> List[str]:
+    """Split free text into the word tokens used to build a prefix query."""
+    return _TOKEN_RE.findall(search.lower())
+
+
+def ensure_search_index(engine) -> None:
+    """Create the search index if it is missing and backfill it (development convenience; use Alembic for prod)."""
+    if not is_supported(engine):
+        logger.info(f"Full-text search not available for dialect '{_dialect(engine)}'; using ILIKE fallback.")
+        return
+    with engine.begin() as conn:
+        if _dialect(engine) == "sqlite":
+            exists = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": SEARCH_TABLE}
+            ).first()
+            if exists:
+                return
+            conn.execute(text(
+                f"CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5("
+                "title, description, location, tokenize = 'unicode61 remove_diacritics 2')"
+            ))
+            conn.execute(text(
+                f"INSERT INTO {SEARCH_TABLE} (rowid, title, description, location) "
+                "SELECT id, coalesce(title, ''), coalesce(description, ''), coalesce(location, '') FROM properties"
+            ))
+        else:
+            exists = conn.execute(text("SELECT to_regclass(:name)"), {"name": SEARCH_TABLE}).scalar()
+            if exists:
+                return
+            conn.execute(text(
+                f"CREATE TABLE {SEARCH_TABLE} ("
+                "property_id INTEGER PRIMARY KEY REFERENCES properties (id) ON DELETE CASCADE, "
+                "document TSVECTOR NOT NULL)"
+            ))
+            conn.execute(text(f"CREATE INDEX ix_{SEARCH_TABLE}_document ON {SEARCH_TABLE} USING GIN (document)"))
+            conn.execute(text(
+                f"INSERT INTO {SEARCH_TABLE} (property_id, document) "
+                f"SELECT id, {_pg_document_sql('title', 'description', 'location')} FROM properties"
+            ), {"cfg": settings.SEARCH_TEXT_CONFIG})
+    logger.info(f"Created and backfilled full-text index '{SEARCH_TABLE}'.")
+
+
+def _pg_document_sql(title: str, description: str, location: str) -> str:
+    # Title outranks location, which outranks the free-form description
+    return (
+        f"setweight(to_tsvector(CAST(:cfg AS regconfig), coalesce({title}, '')), 'A') || "
+        f"setweight(to_tsvector(CAST(:cfg AS regconfig), coalesce({location}, '')), 'B') || "
+        f"setweight(to_tsvector(CAST(:cfg AS regconfig), coalesce({description}, '')), 'C')"
+    )
+
+
+def index_property(db, prop) -> None:
+    """Insert or refresh the search document for a property inside the caller's transaction."""
+    bind = db.get_bind()
+    if not is_supported(bind):
+        return
+    params = {
+        "id": prop.id,
+        "title": prop.title or "",
+        "description": prop.description or "",
+        "location": prop.location or "",
+    }
+    if _dialect(bind) == "sqlite":
+        # FTS5 has no upsert; replace the row wholesale
+        db.execute(text(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = :id"), {"id": prop.id})
+        db.execute(text(
+            f"INSERT INTO {SEARCH_TABLE} (rowid, title, description, location) "
+            "VALUES (:id, :title, :description, :location)"
+        ), params)
+    else:
+        params["cfg"] = settings.SEARCH_TEXT_CONFIG
+        db.execute(text(
+            f"INSERT INTO {SEARCH_TABLE} (property_id, document) "
+            f"VALUES (:id, {_pg_document_sql(':title', ':description', ':location')}) "
+            "ON CONFLICT (property_id) DO UPDATE SET document = EXCLUDED.document"
+        ), params)
+
+
+def unindex_property(db, property_id: int) -> None:
+    """Remove a property's search document inside the caller's transaction."""
+    bind = db.get_bind()
+    if not is_supported(bind):
+        return
+    key = "rowid" if _dialect(bind) == "sqlite" else "property_id"
+    db.execute(text(f"DELETE FROM {SEARCH_TABLE} WHERE {key} = :id"), {"id": property_id})
+
+
+def match_subquery(bind, search: str):
+    """
+    Return a subquery of (property_id, rank) for properties matching every search term
+    as a prefix, with higher rank meaning a better match. Returns None when the dialect
+    has no index or the search has no word tokens, in which case callers fall back to ILIKE.
+    """
+    tokens = tokenize(search)
+    if not tokens or not is_supported(bind):
+        return None
+    if _dialect(bind) == "sqlite":
+        # Quoted prefix terms, implicitly ANDed; bm25 is lower-is-better so negate it
+        fts_query = " ".join(f'"{token}"*' for token in tokens)
+        stmt = text(
+            f"SELECT rowid AS property_id, -bm25({SEARCH_TABLE}, 10.0, 1.0, 5.0) AS rank "
+            f"FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH :fts_query"
+        ).bindparams(fts_query=fts_query)
+    else:
+        ts_query = " & ".join(f"{token}:*" for token in tokens)
+        stmt = text(
+            "SELECT property_id, ts_rank_cd(document, to_tsquery(CAST(:cfg AS regconfig), :ts_query)) AS rank "
+            f"FROM {SEARCH_TABLE} WHERE document @@ to_tsquery(CAST(:cfg AS regconfig), :ts_query)"
+        ).bindparams(cfg=settings.SEARCH_TEXT_CONFIG, ts_query=ts_query)
+    return stmt.columns(property_id=Integer, rank=Float).subquery("search_match")
@@ -0,0 +1,89 @@
+import types
+from typing import Any, Callable, List, Mapping, Optional, Tuple, Union, get_args, get_origin
+
+import orjson
+from fastapi.responses import JSONResponse
+from fastapi import Response
+from pydantic import BaseModel
+
+import schemas
+
+# Fast JSON path, enabled with FAST_JSON=true.
+#
+# By default FastAPI validates every ORM object an endpoint returns into its response_model
+# (from_attributes) and only then serialises it. For rows we loaded ourselves that validation
+# is pure overhead, so PrebuiltSerializer walks a schema's fields once up front and afterwards
+# copies the matching attributes straight off the ORM objects into dicts for orjson.
+# The output matches the validated response because stored values already went through the
+# same schemas on the way in. bench_serialization.py compares both paths.
+
+_ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z  # OPT_UTC_Z: "Z" suffix like pydantic
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, option=_ORJSON_OPTIONS)
+
+
+class ORJSONResponse(JSONResponse):
+    """JSON response rendered with orjson; used as the app's default response class in fast mode."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+Converter = Optional[Callable[[Any], Any]]
+
+
+def _converter(annotation) -> Converter:
+    """Return a function turning an attribute value into JSON-ready data, or None if it passes through."""
+    origin = get_origin(annotation)
+    if origin in (Union, types.UnionType):
+        inner = [arg for arg in get_args(annotation) if arg is not type(None)]
+        return _converter(inner[0]) if len(inner) == 1 else None
+    if origin in (list, List):
+        (item,) = get_args(annotation) or (Any,)
+        convert = _converter(item)
+        if convert is None:
+            return list
+        return lambda values: [None if v is None else convert(v) for v in values]
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return PrebuiltSerializer(annotation).to_python
+    return None
+
+
+class PrebuiltSerializer:
+    """Serialise ORM objects the way `schema` would, without validating them first."""
+
+    def __init__(self, schema: type):
+        self.schema = schema
+        self._fields: List[Tuple[str, Any, Converter]] = []
+        for name, field in schema.model_fields.items():
+            default = None if field.is_required() else field.get_default(call_default_factory=True)
+            self._fields.append((name, default, _converter(field.annotation)))
+
+    def to_python(self, obj: Any) -> dict:
+        data = {}
+        for name, default, convert in self._fields:
+            value = getattr(obj, name, default)
+            data[name] = value if convert is None or value is None else convert(value)
+        return data
+
+    def to_python_many(self, objs: List[Any]) -> List[dict]:
+        to_python = self.to_python
+        return [to_python(obj) for obj in objs]
+
+    def dumps(self, obj: Any) -> bytes:
+        return dumps(self.to_python(obj))
+
+    def dumps_many(self, objs: List[Any]) -> bytes:
+        return dumps(self.to_python_many(objs))
+
+    def response(self, content: Any, many: bool = False, status_code: int = 200, headers: Optional[Mapping[str, str]] = None) -> Response:
+        body = self.dumps_many(content) if many else self.dumps(content)
+        return Response(content=body, status_code=status_code, media_type="application/json", headers=headers)
+
+
+property_serializer = PrebuiltSerializer(schemas.Property)
+property_summary_serializer = PrebuiltSerializer(schemas.PropertySummary)
+contact_serializer = PrebuiltSerializer(schemas.Contact)
+team_member_serializer = PrebuiltSerializer(schemas.TeamMember)
@@ -0,0 +1,89 @@
+import mimetypes
+import os
+import re
+from typing import Optional
+from urllib.parse import quote
+
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+from .compression import is_compressible
+from .config import settings
+
+# Static delivery for /static (uploads).
+#
+# StaticFiles already answers conditional requests (ETag/Last-Modified), serves byte ranges
+# and hands the file to the server for zero-copy transfer when it offers the
+# http.response.pathsend extension. On top of that, UploadStaticFiles:
+#   - marks files whose names can never be reused (content-addressed <sha256> names, legacy
+#     <name>_<uuid> names, and their -<width>w derivatives) immutable for a year, with a
+#     strong ETag derived from the name, identical on every server; other files are cached
+#     for STATIC_MAX_AGE_SECONDS
+#   - serves a precompressed <file>.br / <file>.gz next to a compressible file when the
+#     client accepts it
+#   - never serves dot-files, which includes in-progress uploads (.<token>.part)
+#   - with STATIC_ACCEL_REDIRECT_PREFIX set, answers with an empty X-Accel-Redirect response
+#     so nginx sends the bytes (and handles ranges and revalidation) from the shared volume
+
+IMMUTABLE_NAME = re.compile(r"(?:^[0-9a-f]{64}|_[0-9a-f]{32})(?:-\d+w)?\.[A-Za-z0-9]+$")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+PRECOMPRESSED = (("br", ".br"), ("gzip", ".gz"))
+
+
+def accepts_encoding(accept_encoding: Optional[str], coding: str) -> bool:
+    for item in (accept_encoding or "").split(","):
+        name, _, params = item.strip().partition(";")
+        if name.strip().lower() in (coding, "*"):
+            params = params.strip()
+            try:
+                return not params.startswith("q=") or float(params[2:]) > 0
+            except ValueError:
+                return False
+    return False
+
+
+class UploadStaticFiles(StaticFiles):
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        if any(part.startswith(".") for part in path.replace("\\", "/").split("/") if part):
+            raise HTTPException(status_code=404)
+        return await super().get_response(path, scope)
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope: Scope, status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+        name = os.path.basename(full_path)
+        immutable = IMMUTABLE_NAME.search(name) is not None
+        cache_control = IMMUTABLE_CACHE_CONTROL if immutable else f"public, max-age={settings.STATIC_MAX_AGE_SECONDS}"
+        media_type = mimetypes.guess_type(name)[0] or "text/plain"
+
+        if settings.STATIC_ACCEL_REDIRECT_PREFIX:
+            relative = os.path.relpath(full_path, self.directory).replace(os.sep, "/")
+            return Response(status_code=status_code, media_type=media_type, headers={
+                "X-Accel-Redirect": settings.STATIC_ACCEL_REDIRECT_PREFIX.rstrip("/") + "/" + quote(relative),
+                "Cache-Control": cache_control,
+            })
+
+        encoding = None
+        if is_compressible(media_type):
+            for coding, suffix in PRECOMPRESSED:
+                if accepts_encoding(request_headers.get("accept-encoding"), coding):
+                    try:
+                        sidecar_stat = os.stat(f"{full_path}{suffix}")
+                    except OSError:
+                        continue
+                    full_path, stat_result, encoding = f"{full_path}{suffix}", sidecar_stat, coding
+                    break
+
+        response = FileResponse(full_path, status_code=status_code, stat_result=stat_result, media_type=media_type)
+        response.headers["Cache-Control"] = cache_control
+        if immutable and encoding is None:
+            response.headers["ETag"] = f'"{name}"'
+        if encoding is not None:
+            response.headers["Content-Encoding"] = encoding
+        if is_compressible(media_type):
+            response.headers["Vary"] = "Accept-Encoding"
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
@@ -0,0 +1,146 @@
+import heapq
+import math
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+# Trending scores: an exponentially time-decayed click count per property.
+#
+# A click at time t adds 2 ** (-(now - t) / half_life) to its property's score. Scores are kept
+# in "forward decay" form, relative to a reference time t0: a click adds exp((t - t0) / tau)
+# and the score at any time is the stored value times exp(-(now - t0) / tau). Every score decays
+# by the same factor, so their order never changes with time; a click only ever raises one
+# value, so the top K can be maintained incrementally with a min-heap and read without
+# touching the other scores. Values are rescaled onto a newer t0 before they can overflow.
+#
+# Each worker process holds its own TrendingScores. Clicks it records are also kept in
+# `pending` until take_pending() hands them to the persistence job (crud/trending.py), which
+# merges them into the shared table and load()s the merged scores back.
+
+RESCALE_AT = 50.0  # Rescale once (now - t0) / tau exceeds this; exp(50) is far from overflow
+
+
+class TrendingScores:
+    def __init__(self, half_life_seconds: float = 6 * 3600.0, top_k: int = 100):
+        self.tau = half_life_seconds / math.log(2)
+        self.top_k = top_k
+        self._t0 = time.time()
+        self._scores: Dict[int, float] = {}
+        self._pending: Dict[int, float] = {}
+        self._top: Dict[int, float] = {}  # The current top K, property_id -> stored value
+        self._heap: List[Tuple[float, int]] = []  # Min-heap over _top, with stale entries skipped lazily
+        self._ranked: Optional[List[Tuple[int, float]]] = None  # _top sorted by score, until the next change
+        self._lock = threading.Lock()
+
+    # --- updates -------------------------------------------------------------------
+
+    def record(self, property_id: int, at: Optional[float] = None, weight: float = 1.0):
+        """Add one click (or `weight` clicks) at time `at` (epoch seconds, default now)."""
+        at = time.time() if at is None else at
+        with self._lock:
+            if (at - self._t0) / self.tau > RESCALE_AT:
+                self._rescale(at)
+            increment = weight * math.exp((at - self._t0) / self.tau)
+            self._pending[property_id] = self._pending.get(property_id, 0.0) + increment
+            self._raise(property_id, self._scores.get(property_id, 0.0) + increment)
+
+    def discard(self, property_id: int):
+        """Forget a property (e.g. after it was deleted)."""
+        with self._lock:
+            self._scores.pop(property_id, None)
+            self._pending.pop(property_id, None)
+            if self._top.pop(property_id, None) is not None:
+                self._rebuild_top()
+
+    def take_pending(self) -> Dict[int, float]:
+        """Remove and return the clicks recorded since the last call, as scores decayed to now."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            factor = self._decay_factor(time.time())
+        return {pid: value * factor for pid, value in pending.items()}
+
+    def restore_pending(self, pending: Dict[int, float]):
+        """Put back what take_pending() returned when it could not be persisted."""
+        with self._lock:
+            factor = self._decay_factor(time.time())
+            for pid, score in pending.items():
+                self._pending[pid] = self._pending.get(pid, 0.0) + score / factor
+
+    def load(self, scores: Dict[int, float]):
+        """
+        Replace all scores with `scores` (decayed to now, e.g. read back from the table) plus
+        the clicks recorded since the last take_pending(), which the table does not have yet.
+        """
+        now = time.time()
+        with self._lock:
+            self._rescale(now)
+            merged = {pid: score for pid, score in scores.items() if score > 0}
+            for pid, value in self._pending.items():
+                merged[pid] = merged.get(pid, 0.0) + value
+            self._scores = merged
+            self._rebuild_top()
+
+    # --- reads ---------------------------------------------------------------------
+
+    def top(self, limit: int) -> List[Tuple[int, float]]:
+        """The `limit` (at most top_k) highest-scoring properties as (property_id, score now)."""
+        with self._lock:
+            if self._ranked is None:
+                self._ranked = sorted(self._top.items(), key=lambda item: (-item[1], item[0]))
+            ranked = self._ranked[:limit]
+            factor = self._decay_factor(time.time())
+        return [(pid, value * factor) for pid, value in ranked]
+
+    def snapshot(self) -> Dict[int, float]:
+        """Every score, decayed to now."""
+        with self._lock:
+            factor = self._decay_factor(time.time())
+            return {pid: value * factor for pid, value in self._scores.items()}
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "tracked": len(self._scores),
+                "pending": len(self._pending),
+                "top_k": self.top_k,
+                "half_life_seconds": self.tau * math.log(2),
+            }
+
+    # --- internals (caller holds the lock) ---------------------------------------------
+
+    def _decay_factor(self, now: float) -> float:
+        return math.exp(-(now - self._t0) / self.tau)
+
+    def _raise(self, property_id: int, value: float):
+        self._scores[property_id] = value
+        if property_id not in self._top and len(self._top) >= self.top_k:
+            if value <= self._min_top()[0]:
+                return
+            _, evicted = heapq.heappop(self._heap)
+            del self._top[evicted]
+        self._top[property_id] = value
+        heapq.heappush(self._heap, (value, property_id))
+        self._ranked = None
+        if len(self._heap) > 4 * self.top_k:
+            self._heap = [(score, pid) for pid, score in self._top.items()]
+            heapq.heapify(self._heap)
+
+    def _min_top(self) -> Tuple[float, int]:
+        """Drop stale heap entries until the head is the lowest current top-K score."""
+        while self._top.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        return self._heap[0]
+
+    def _rebuild_top(self):
+        self._top = dict(heapq.nlargest(self.top_k, self._scores.items(), key=lambda item: item[1]))
+        self._heap = [(score, pid) for pid, score in self._top.items()]
+        heapq.heapify(self._heap)
+        self._ranked = None
+
+    def _rescale(self, now: float):
+        """Move t0 to `now`, multiplying every stored value by the decay since the old t0."""
+        factor = self._decay_factor(now)
+        self._t0 = now
+        self._scores = {pid: value * factor for pid, value in self._scores.items()}
+        self._pending = {pid: value * factor for pid, value in self._pending.items()}
+        self._rebuild_top()
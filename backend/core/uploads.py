@@ -0,0 +1,467 @@
+import hashlib
+import itertools
+import os
+import uuid
+from typing import AsyncIterator, BinaryIO, List, NamedTuple, Optional, Tuple, Union
+
+from anyio import to_thread
+from fastapi import Request
+
+from .config import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows: chunks of one upload session are not serialised across processes
+    fcntl = None
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+
+# Streaming uploads.
+#
+# receive_upload() parses the multipart request body as it arrives from request.stream()
+# instead of letting Starlette spool the whole form first. Each network chunk is parsed, the
+# file part's bytes are checked (magic bytes once the first few have arrived, the running
+# size against UPLOAD_MAX_BYTES) and hashed and written to a temporary file in a worker
+# thread, so the event loop never blocks on disk and at most one chunk is held in memory. A
+# bad type or an oversized body aborts the request as soon as it is detected.
+# receive_uploads() does the same for a batch of files in one body: each file is written in
+# turn and handed to the caller as soon as its last byte has arrived, and a file that fails
+# is reported and skipped without aborting the rest.
+#
+# Content-addressed storage: once the whole body has been received the file is named after
+# its SHA-256, UPLOAD_DIR/objects/<2 hex>/<sha256><ext>, so each distinct image is on disk
+# (and gets derivatives rendered) once; crud/stored_files.py counts the references to it.
+# Bytes that are already stored keep their temporary file until the stored_files row has
+# been recorded: only then does settle() decide between dropping it and putting it in place
+# of a stored copy that was garbage-collected meanwhile. Files uploaded before this layout
+# keep their <upload type>/<name>_<uuid> paths.
+
+STORE_DIR = "objects"  # Under UPLOAD_DIR
+MAGIC_BYTES_NEEDED = 12
+
+
+class UploadRejected(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class SavedUpload(NamedTuple):
+    filename: str  # <sha256><extension>
+    path: str  # Relative to UPLOAD_DIR
+    size: int
+    content_type: str
+    digest: str  # SHA-256, hex
+    existed: bool  # The same bytes were already stored
+    pending: Optional[str] = None  # Temporary copy of bytes that were already stored, until settle()
+
+
+def sniff_image_type(head: bytes) -> Optional[str]:
+    """Identify an image from its first bytes; None if it is not a supported format."""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head.startswith((b"GIF87a", b"GIF89a")):
+        return "image/gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[4:8] == b"ftyp" and head[8:12] in (b"avif", b"avis"):
+        return "image/avif"
+    if head[4:8] == b"ftyp" and head[8:12] in (b"heic", b"heix", b"mif1", b"msf1"):
+        return "image/heic"
+    return None
+
+
+EXTENSIONS = {
+    "image/jpeg": ".jpg", "image/png": ".png", "image/gif": ".gif",
+    "image/webp": ".webp", "image/avif": ".avif", "image/heic": ".heic",
+}
+
+
+def store_path(digest: str, content_type: str) -> str:
+    """Path, relative to UPLOAD_DIR, of the stored file with this SHA-256 and type."""
+    return f"{STORE_DIR}/{digest[:2]}/{digest}{EXTENSIONS[content_type]}"
+
+
+def temp_path(name: Optional[str] = None) -> str:
+    """A temporary file path on the store's filesystem, so finished uploads move into place atomically."""
+    directory = os.path.join(settings.UPLOAD_DIR, STORE_DIR)
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f".{name or uuid.uuid4().hex}.part")
+
+
+def commit_to_store(temp_file: str, digest: str, content_type: str) -> Tuple[str, Optional[str]]:
+    """
+    Move a completely written temporary file to its content address. When those bytes are
+    already stored, the temporary file is kept under a fresh name for settle() instead.
+    Returns (path relative to UPLOAD_DIR, the kept temporary file or None).
+    """
+    relative = store_path(digest, content_type)
+    path = os.path.join(settings.UPLOAD_DIR, relative)
+    if os.path.exists(path):
+        pending = temp_path()
+        os.replace(temp_file, pending)  # Owned by the SavedUpload now, not by e.g. an upload session
+        return relative, pending
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.replace(temp_file, path)  # A concurrent identical upload may win the race; the bytes are the same
+    return relative, None
+
+
+def _saved(relative: str, size: int, content_type: str, digest: str, pending: Optional[str]) -> SavedUpload:
+    return SavedUpload(os.path.basename(relative), relative, size, content_type, digest, pending is not None, pending)
+
+
+def settle(saved: SavedUpload) -> SavedUpload:
+    """
+    Resolve the temporary copy of an upload whose bytes were already stored; call it once the
+    upload's stored_files row is committed. The copy is dropped if the stored file is still
+    there, or moved into its place if the file was collected in the meantime.
+    """
+    if saved.pending is None:
+        return saved
+    path = os.path.join(settings.UPLOAD_DIR, saved.path)
+    if os.path.exists(path):
+        os.remove(saved.pending)
+        return saved._replace(pending=None)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.replace(saved.pending, path)
+    return saved._replace(existed=False, pending=None)
+
+
+def discard_pending(saved: SavedUpload):
+    """Drop the temporary copy of an upload that will not be recorded."""
+    if saved.pending is not None and os.path.exists(saved.pending):
+        os.remove(saved.pending)
+
+
+class _FilePart:
+    """Receives the bytes of the uploaded file part, validating and hashing them as they arrive."""
+
+    def __init__(self, max_bytes: int, filename: str = ""):
+        self.max_bytes = max_bytes
+        self.filename = filename  # As sent by the client
+        self.error: Optional[UploadRejected] = None  # Set when a batch upload skips this part
+        self.done = False  # Stored or discarded
+        self.size = 0
+        self.content_type: Optional[str] = None
+        self.temp_path: Optional[str] = None
+        self._head = b""  # Bytes received before the type could be checked
+        self._file: Optional[BinaryIO] = None
+        self._hash = hashlib.sha256()
+
+    async def write(self, chunks: List[bytes]):
+        data = b"".join(chunks)
+        if not data:
+            return
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            raise UploadRejected(413, f"File exceeds the {self.max_bytes} byte upload limit.")
+        if self._file is None:
+            self._head += data
+            if len(self._head) < MAGIC_BYTES_NEEDED:
+                return
+            data, self._head = self._head, b""
+            await self._open(data)
+        await to_thread.run_sync(self._write, data)
+
+    def _write(self, data: bytes):
+        self._hash.update(data)  # Releases the GIL for large buffers, like the write
+        self._file.write(data)
+
+    async def _open(self, head: bytes):
+        self.content_type = sniff_image_type(head[:MAGIC_BYTES_NEEDED])
+        if self.content_type is None:
+            raise UploadRejected(415, "Unsupported file type. Upload a JPEG, PNG, GIF, WebP, AVIF or HEIC image.")
+        self.temp_path = await to_thread.run_sync(temp_path)
+        self._file = await to_thread.run_sync(open, self.temp_path, "wb")
+
+    async def finish(self) -> SavedUpload:
+        if self.size == 0:
+            raise UploadRejected(400, "The uploaded file is empty.")
+        if self._file is None:
+            # Shorter than the magic-bytes window: identify what there is
+            await self._open(self._head)
+            await to_thread.run_sync(self._write, self._head)
+        await to_thread.run_sync(self._file.close)
+        digest = self._hash.hexdigest()
+        path, pending = await to_thread.run_sync(commit_to_store, self.temp_path, digest, self.content_type)
+        self.done = True
+        return _saved(path, self.size, self.content_type, digest, pending)
+
+    async def result(self) -> Union[SavedUpload, UploadRejected]:
+        """The stored upload, or why it was rejected (its bytes then already discarded)."""
+        if self.error is None:
+            try:
+                return await self.finish()
+            except UploadRejected as e:
+                self.error = e
+        await self.discard()
+        return self.error
+
+    async def discard(self):
+        self.done = True
+        if self._file is not None and not self._file.closed:
+            await to_thread.run_sync(self._file.close)
+        if self.temp_path is not None and os.path.exists(self.temp_path):
+            await to_thread.run_sync(os.remove, self.temp_path)
+
+
+class _MultipartFiles:
+    """
+    Incremental multipart/form-data parser that collects the file parts named `field_name`
+    (the first one only, unless max_files is given). Bytes parsed out of a network chunk wait
+    in `pending` until flush() writes them, so parser callbacks never block.
+    """
+
+    def __init__(self, request: Request, field_name: str, max_bytes: int, max_files: Optional[int] = None):
+        content_type, params = parse_options_header(request.headers.get("content-type"))
+        if content_type != b"multipart/form-data" or b"boundary" not in params:
+            raise UploadRejected(400, "Expected a multipart/form-data request.")
+        self.field_name = field_name.encode()
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.files: List[_FilePart] = []  # In the order they appear in the body
+        self.pending: List[Tuple[_FilePart, bytes]] = []
+        self.ended: List[_FilePart] = []  # Parts whose last byte has been parsed, not yet taken
+        self._headers = {}
+        self._header_field = b""
+        self._header_value = b""
+        self._current: Optional[_FilePart] = None  # Set while inside a collected file part
+        self.parser = MultipartParser(params[b"boundary"], {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        })
+
+    def _on_part_begin(self):
+        self._headers.clear()
+
+    def _on_header_field(self, data, start, end):
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data, start, end):
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = self._header_value = b""
+
+    def _on_headers_finished(self):
+        _, disposition = parse_options_header(self._headers.get(b"content-disposition", b""))
+        if disposition.get(b"name") != self.field_name:
+            return
+        if self.max_files is None and self.files:
+            return  # Single-file uploads ignore any further parts
+        if self.max_files is not None and len(self.files) >= self.max_files:
+            raise UploadRejected(413, f"At most {self.max_files} files can be uploaded at once.")
+        filename = disposition.get(b"filename", b"").decode("utf-8", "replace")
+        if self.max_files is None and not os.path.basename(filename):
+            raise UploadRejected(400, "Filename cannot be empty.")
+        self._current = _FilePart(self.max_bytes, os.path.basename(filename))
+        self.files.append(self._current)
+
+    def _on_part_data(self, data, start, end):
+        if self._current is not None:
+            self.pending.append((self._current, bytes(data[start:end])))
+
+    def _on_part_end(self):
+        if self._current is not None:
+            self.ended.append(self._current)
+            self._current = None
+
+    async def flush(self, keep_going: bool = False):
+        """
+        Write the pending bytes to their parts. A part that turns out to be invalid raises
+        UploadRejected, or with keep_going is marked failed and the rest of its bytes dropped.
+        """
+        pending, self.pending = self.pending, []
+        for part, group in itertools.groupby(pending, key=lambda item: item[0]):
+            if part.error is not None:
+                continue
+            try:
+                await part.write([data for _, data in group])
+            except UploadRejected as e:
+                if not keep_going:
+                    raise
+                part.error = e
+                await part.discard()
+
+    def take_ended(self) -> List[_FilePart]:
+        ended, self.ended = self.ended, []
+        return ended
+
+    async def discard(self):
+        for part in self.files:
+            if not part.done:
+                await part.discard()
+
+
+async def receive_upload(request: Request, field_name: str = "file", max_bytes: Optional[int] = None) -> SavedUpload:
+    """
+    Stream the `field_name` file of a multipart/form-data request into the content-addressed
+    store. Raises UploadRejected for malformed, oversized or non-image uploads.
+    """
+    max_bytes = max_bytes or settings.UPLOAD_MAX_BYTES
+    form = _MultipartFiles(request, field_name, max_bytes)
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > max_bytes + 64 * 1024:  # Leave room for the form framing
+        raise UploadRejected(413, f"File exceeds the {max_bytes} byte upload limit.")
+
+    try:
+        async for chunk in request.stream():
+            form.parser.write(chunk)
+            await form.flush()
+        form.parser.finalize()
+        if not form.files:
+            raise UploadRejected(400, f"No '{field_name}' file in the upload.")
+        return await form.files[0].finish()
+    except Exception:
+        await form.discard()
+        raise
+
+
+async def receive_uploads(
+    request: Request, field_name: str = "files", max_bytes: Optional[int] = None,
+    max_files: Optional[int] = None, max_total_bytes: Optional[int] = None,
+) -> AsyncIterator[Tuple[str, Union[SavedUpload, UploadRejected]]]:
+    """
+    Stream every `field_name` file of a multipart/form-data request into the content-addressed
+    store, yielding (client filename, SavedUpload or the UploadRejected for that file) in body
+    order as soon as each file has been received. A file that fails does not stop the others.
+    The request as a whole raises UploadRejected when it is malformed, holds no files, more
+    than max_files or more than max_total_bytes. The body is not read while the caller is busy
+    with a yielded file, so a slow consumer holds back the client rather than the disk filling up.
+    """
+    max_bytes = max_bytes or settings.UPLOAD_MAX_BYTES
+    max_files = max_files or settings.UPLOAD_BATCH_MAX_FILES
+    max_total_bytes = max_total_bytes or settings.UPLOAD_BATCH_MAX_BYTES
+    form = _MultipartFiles(request, field_name, max_bytes, max_files)
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > max_total_bytes:
+        raise UploadRejected(413, f"Upload exceeds the {max_total_bytes} byte batch limit.")
+
+    received = 0
+    try:
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > max_total_bytes:
+                raise UploadRejected(413, f"Upload exceeds the {max_total_bytes} byte batch limit.")
+            form.parser.write(chunk)
+            await form.flush(keep_going=True)
+            for part in form.take_ended():
+                yield part.filename, await part.result()
+        form.parser.finalize()
+        if not form.files:
+            raise UploadRejected(400, f"No '{field_name}' files in the upload.")
+    finally:
+        await form.discard()
+
+
+# Resumable uploads.
+#
+# A resumable upload is written to its own temporary file in the store directory, one PUT per
+# chunk (see crud/upload_sessions.py for the sessions themselves). The file is the state:
+# its size is the offset the next chunk must start at, so a chunk cut off by a dropped
+# connection keeps the bytes that arrived and the client resumes from there, whichever API
+# worker serves it. An exclusive lock on the file keeps two chunks of one session from being
+# written at once. finish_file() then checks, hashes and stores the file exactly as a
+# streamed upload is stored.
+
+
+def received_bytes(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except FileNotFoundError:
+        return 0
+
+
+def _open_locked(path: str) -> BinaryIO:
+    f = open(path, "ab")
+    if fcntl is not None:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            f.close()
+            raise UploadRejected(409, "Another chunk of this upload is being written.")
+    return f
+
+
+async def receive_chunk(request: Request, path: str, offset: int, total_size: int) -> int:
+    """
+    Append the request body to the file at path, which must currently hold exactly `offset`
+    bytes, without letting it grow past total_size. Returns the new size. Bytes received
+    before a disconnect are kept.
+    """
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and offset + int(declared) > total_size:
+        raise UploadRejected(413, f"Chunk runs past the declared upload size of {total_size} bytes.")
+    f = await to_thread.run_sync(_open_locked, path)
+    try:
+        size = (await to_thread.run_sync(os.fstat, f.fileno())).st_size
+        if offset != size:
+            raise UploadRejected(409, f"Upload offset mismatch: {size} bytes received so far.")
+        head = b""  # A first chunk's bytes are held until the type can be checked
+        async for data in request.stream():
+            if not data:
+                continue
+            if size + len(head) + len(data) > total_size:
+                raise UploadRejected(413, f"Chunk runs past the declared upload size of {total_size} bytes.")
+            if size == 0:
+                head += data
+                if len(head) < min(MAGIC_BYTES_NEEDED, total_size):
+                    continue
+                if sniff_image_type(head[:MAGIC_BYTES_NEEDED]) is None:
+                    raise UploadRejected(415, "Unsupported file type. Upload a JPEG, PNG, GIF, WebP, AVIF or HEIC image.")
+                data, head = head, b""
+            await to_thread.run_sync(f.write, data)
+            size += len(data)
+        if head:
+            await to_thread.run_sync(f.write, head)  # Ended before the type could be checked; finish_file checks it
+            size += len(head)
+        return size
+    finally:
+        await to_thread.run_sync(f.close)
+
+
+def finish_file(path: str, expected_size: Optional[int] = None) -> SavedUpload:
+    """
+    Check, hash and store a fully received temporary file, holding its lock so no chunk or
+    concurrent completion can touch it meanwhile. Raises UploadRejected: 404 when the file is
+    gone (completed already), 409 when it is busy or not expected_size bytes long, 415 when it
+    is not a supported image.
+    """
+    digest = hashlib.sha256()
+    try:
+        f = open(path, "rb")  # Not _open_locked: "ab" would recreate a file that was just completed
+    except FileNotFoundError:
+        raise UploadRejected(404, "Upload not found; it may have been completed already.")
+    with f:
+        if fcntl is not None:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise UploadRejected(409, "This upload is being written or completed by another request.")
+            if not os.path.exists(path):
+                raise UploadRejected(404, "Upload not found; it may have been completed already.")
+        if expected_size is not None and os.fstat(f.fileno()).st_size != expected_size:
+            raise UploadRejected(409, f"Upload incomplete: {os.fstat(f.fileno()).st_size} of {expected_size} bytes received.")
+        content_type = sniff_image_type(f.read(MAGIC_BYTES_NEEDED))
+        if content_type is None:
+            raise UploadRejected(415, "Unsupported file type. Upload a JPEG, PNG, GIF, WebP, AVIF or HEIC image.")
+        f.seek(0)
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+        size = f.tell()
+        relative, pending = commit_to_store(path, digest.hexdigest(), content_type)
+    return _saved(relative, size, content_type, digest.hexdigest(), pending)
+
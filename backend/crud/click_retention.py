@@ -0,0 +1,202 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import delete, insert, select
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+import gzip
+import json
+import logging
+import os
+import models
+from core.config import settings
+from core.database import SessionLocal
+from crud import user_agents
+from crud.click_rollups import get_high_water_mark, roll_up_clicks
+from utils.ip import pack_ip, unpack_ip
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, run one archiver at a time
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Raw click retention.
+#
+# archive_clicks() moves property_clicks rows older than CLICK_RETENTION_DAYS whole UTC days
+# into gzipped JSON-lines files, one per day: <archive_dir>/YYYY/MM/clicks-YYYY-MM-DD.jsonl.gz.
+# It works in chunks of CLICK_PRUNE_BATCH_SIZE rows: each chunk is appended to its day files
+# (a new gzip member per append, fsynced) and only then deleted by primary key in its own
+# short transaction, so no long lock is held and a crash at worst archives a chunk twice.
+#
+# Only clicks already folded into the rollups (id at or below the rollup high-water mark) are
+# pruned, so analytics and reconcile_click_counters() keep counting them. import_click_archive()
+# restores a day range with the original ids, skipping rows that are already present; the ids
+# stay below the high-water mark, so the rollups do not count them again. Re-imported rows are
+# archived again by the next pass unless retention is paused (CLICK_RETENTION_DAYS=0); reading
+# an archive skips repeated ids, so that is harmless.
+
+
+def partition_path(archive_dir: str, day: date) -> str:
+    return os.path.join(archive_dir, f"{day:%Y}", f"{day:%m}", f"clicks-{day:%Y-%m-%d}.jsonl.gz")
+
+
+@contextmanager
+def _archive_lock(archive_dir: str) -> Iterator[bool]:
+    """Non-blocking lock on the archive directory; yields False if another process holds it."""
+    os.makedirs(archive_dir, exist_ok=True)
+    if fcntl is None:
+        yield True
+        return
+    with open(os.path.join(archive_dir, ".lock"), "w") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _append_partitions(archive_dir: str, rows) -> None:
+    by_day: Dict[date, List[str]] = defaultdict(list)
+    for row in rows:
+        clicked_at = row.clicked_at
+        if clicked_at.tzinfo is not None:
+            clicked_at = clicked_at.astimezone(timezone.utc).replace(tzinfo=None)
+        by_day[clicked_at.date()].append(json.dumps({
+            "id": row.id,
+            "property_id": row.property_id,
+            "clicked_at": clicked_at.isoformat(),
+            "ip_address": unpack_ip(row.ip),
+            "user_agent": row.user_agent,
+        }) + "\n")
+    for day, lines in by_day.items():
+        path = partition_path(archive_dir, day)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "ab") as f:
+            with gzip.GzipFile(fileobj=f, mode="ab") as gz:
+                gz.write("".join(lines).encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())  # The rows are deleted right after; they must be on disk first
+
+
+def archive_clicks(
+    db: Session,
+    retention_days: Optional[int] = None,
+    archive_dir: Optional[str] = None,
+    batch_size: Optional[int] = None,
+) -> int:
+    """Archive and delete raw clicks older than the retention period. Returns the number of clicks moved."""
+    retention_days = settings.CLICK_RETENTION_DAYS if retention_days is None else retention_days
+    archive_dir = archive_dir or settings.CLICK_ARCHIVE_DIR
+    batch_size = batch_size or settings.CLICK_PRUNE_BATCH_SIZE
+    if retention_days <= 0:
+        return 0
+    cutoff = datetime.combine(datetime.utcnow().date() - timedelta(days=retention_days), time.min)
+    roll_up_clicks(db)  # Clicks only leave the table once the rollups have them
+
+    clicks = models.PropertyClick
+    archived = 0
+    with _archive_lock(archive_dir) as locked:
+        if not locked:
+            logger.info("Click archive is locked by another process; skipping this pass.")
+            return 0
+        while True:
+            rows = db.execute(
+                select(clicks.id, clicks.property_id, clicks.clicked_at, clicks.ip, models.UserAgent.user_agent)
+                .outerjoin(models.UserAgent, models.UserAgent.id == clicks.user_agent_id)
+                .where(clicks.clicked_at < cutoff, clicks.id <= get_high_water_mark(db))
+                .order_by(clicks.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                db.rollback()
+                break
+            _append_partitions(archive_dir, rows)
+            db.execute(delete(clicks).where(clicks.id.in_([row.id for row in rows])))
+            db.commit()
+            archived += len(rows)
+    if archived:
+        logger.info(f"Archived {archived} clicks older than {cutoff:%Y-%m-%d} to {archive_dir}.")
+    return archived
+
+
+def archive_clicks_job() -> int:
+    """Entry point for the periodic job: one session per run."""
+    db = SessionLocal()
+    try:
+        return archive_clicks(db)
+    finally:
+        db.close()
+
+
+def _read_partition(path: str) -> Iterator[dict]:
+    seen = set()
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            if record["id"] not in seen:
+                seen.add(record["id"])
+                yield record
+
+
+def _import_batch(db: Session, records: List[dict]) -> int:
+    clicks = models.PropertyClick
+    ids = [record["id"] for record in records]
+    existing = set(db.execute(select(clicks.id).where(clicks.id.in_(ids))).scalars())
+    property_ids = {record["property_id"] for record in records}
+    live_properties = set(db.execute(select(models.Property.id).where(models.Property.id.in_(property_ids))).scalars())
+    records = [r for r in records if r["id"] not in existing and r["property_id"] in live_properties]
+    agent_ids = user_agents.get_ids(db, (r["user_agent"] for r in records))
+    rows = [
+        {
+            "id": r["id"],
+            "property_id": r["property_id"],
+            "clicked_at": datetime.fromisoformat(r["clicked_at"]),
+            "ip": pack_ip(r["ip_address"]),
+            "user_agent_id": agent_ids.get(r["user_agent"]),
+        }
+        for r in records
+    ]
+    if rows:
+        db.execute(insert(clicks), rows)
+    db.commit()
+    return len(rows)
+
+
+def import_click_archive(
+    db: Session,
+    start: date,
+    end: date,
+    archive_dir: Optional[str] = None,
+    batch_size: Optional[int] = None,
+) -> Tuple[int, int]:
+    """
+    Re-insert archived clicks for the UTC days start..end (inclusive) with their original ids.
+    Rows already in property_clicks or belonging to deleted properties are skipped.
+    Returns (imported, skipped).
+    """
+    archive_dir = archive_dir or settings.CLICK_ARCHIVE_DIR
+    batch_size = batch_size or settings.CLICK_PRUNE_BATCH_SIZE
+    imported = read = 0
+    day = start
+    while day <= end:
+        path = partition_path(archive_dir, day)
+        day += timedelta(days=1)
+        if not os.path.exists(path):
+            continue
+        batch: List[dict] = []
+        for record in _read_partition(path):
+            batch.append(record)
+            if len(batch) >= batch_size:
+                imported += _import_batch(db, batch)
+                read += len(batch)
+                batch = []
+        if batch:
+            imported += _import_batch(db, batch)
+            read += len(batch)
+    return imported, read - imported
@@ -0,0 +1,219 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from collections import Counter
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+import models, schemas
+from core.database import SessionLocal
+from core.hll import HyperLogLog
+from crud import visitor_sketches
+
+# Click rollups.
+#
+# property_click_hourly holds clicks per (property, UTC hour) and property_click_daily clicks
+# and distinct IPs per (property, UTC day). roll_up_clicks() folds in every property_clicks
+# row above the high-water mark kept in rollup_state and advances the mark in the same
+# transaction, so each click is counted exactly once. Analytics queries read only these
+# tables and the visitor sketches (crud/visitor_sketches.py), never the raw clicks.
+#
+# Ids are handed out when a row is inserted but only become visible when its transaction
+# commits, so a click with a lower id can appear after one with a higher id (buffered and
+# replayed batches, concurrent writers), whatever its clicked_at says. The mark therefore only
+# advances over consecutive ids. A gap is waited for until the mark has not moved for
+# GAP_TIMEOUT; by then it is a rolled-back insert or a deleted row, and it is skipped.
+
+ROLLUP_NAME = "property_clicks"
+GAP_TIMEOUT = timedelta(seconds=60)  # Longest a click transaction is expected to stay open
+
+_hourly = models.PropertyClickHourly.__table__
+_daily = models.PropertyClickDaily.__table__
+_state = models.RollupState.__table__
+
+
+def _utc(value: datetime) -> datetime:
+    """Naive UTC for aware or naive (already UTC) timestamps."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _upsert_counts(db: Session, table, key_columns: Tuple[str, ...], rows: List[dict]):
+    """Add rows' counts onto existing rollup rows, inserting the missing ones."""
+    if not rows:
+        return
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        insert = (sqlite if dialect == "sqlite" else postgresql).insert
+        stmt = insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c[name] for name in key_columns],
+            set_={"count": table.c.count + stmt.excluded.count},
+        )
+        db.execute(stmt, rows)
+        return
+    # Portable fallback
+    for row in rows:
+        key = [table.c[name] == row[name] for name in key_columns]
+        updated = db.execute(table.update().where(*key).values(count=table.c.count + row["count"]))
+        if updated.rowcount == 0:
+            db.execute(table.insert().values(**row))
+
+
+def get_high_water_mark(db: Session) -> int:
+    return db.execute(select(_state.c.last_id).where(_state.c.name == ROLLUP_NAME)).scalar() or 0
+
+
+def _gap_timed_out(db: Session) -> bool:
+    """Whether the mark has been stuck at a gap in the ids for GAP_TIMEOUT; starts the clock on a first run."""
+    state = db.execute(select(_state.c.updated_at).where(_state.c.name == ROLLUP_NAME)).first()
+    if state is None:
+        _advance_high_water_mark(db, 0, 0)
+        db.commit()
+        return False
+    return state.updated_at is None or _utc(state.updated_at) <= datetime.utcnow() - GAP_TIMEOUT
+
+
+def _advance_high_water_mark(db: Session, old: int, new: int) -> bool:
+    """Move the mark from old to new; False if another worker moved it first."""
+    now = datetime.now(timezone.utc)
+    if old == 0 and db.execute(select(_state.c.name).where(_state.c.name == ROLLUP_NAME)).first() is None:
+        db.execute(_state.insert().values(name=ROLLUP_NAME, last_id=new, updated_at=now))
+        return True
+    updated = db.execute(
+        _state.update()
+        .where(_state.c.name == ROLLUP_NAME, _state.c.last_id == old)
+        .values(last_id=new, updated_at=now)
+    )
+    return updated.rowcount == 1
+
+
+def _roll_up_batch(db: Session, batch_size: int) -> int:
+    clicks = models.PropertyClick
+    last_id = get_high_water_mark(db)
+    rows = db.execute(
+        select(clicks.id, clicks.property_id, clicks.clicked_at)
+        .where(clicks.id > last_id)
+        .order_by(clicks.id)
+        .limit(batch_size)
+    ).all()
+    if not rows or (rows[0].id != last_id + 1 and not _gap_timed_out(db)):
+        return 0
+    hourly: Counter = Counter()
+    daily: Counter = Counter()
+    new_last_id = last_id
+    for row in rows:
+        if new_last_id != last_id and row.id != new_last_id + 1:
+            break  # Wait for the missing ids; their transactions may still be committing
+        clicked_at = _utc(row.clicked_at) if row.clicked_at else datetime.utcnow()
+        hourly[(row.property_id, clicked_at.replace(minute=0, second=0, microsecond=0))] += 1
+        daily[(row.property_id, clicked_at.date())] += 1
+        new_last_id = row.id
+
+    # Claim the range first: on PostgreSQL this row lock also serialises concurrent workers
+    if not _advance_high_water_mark(db, last_id, new_last_id):
+        db.rollback()
+        return 0
+    _upsert_counts(db, _hourly, ("property_id", "hour"), [
+        {"property_id": pid, "hour": hour, "count": count} for (pid, hour), count in hourly.items()
+    ])
+    _upsert_counts(db, _daily, ("property_id", "day"), [
+        {"property_id": pid, "day": day, "count": count, "unique_ips": 0} for (pid, day), count in daily.items()
+    ])
+    # Distinct IPs are not additive across batches, so recount each touched (property, day)
+    # from the raw clicks; ix_property_clicks_property_id_clicked_at keeps this to one range scan
+    for pid, day in daily:
+        start = datetime.combine(day, time.min)
+        unique_ips = db.execute(
+            select(func.count(func.distinct(clicks.ip))).where(
+                clicks.property_id == pid, clicks.clicked_at >= start, clicks.clicked_at < start + timedelta(days=1)
+            )
+        ).scalar()
+        # A day's distinct IPs only grow; a lower recount means its raw clicks were archived
+        db.execute(
+            _daily.update()
+            .where(_daily.c.property_id == pid, _daily.c.day == day, _daily.c.unique_ips < unique_ips)
+            .values(unique_ips=unique_ips)
+        )
+    db.commit()
+    return sum(daily.values())
+
+
+def roll_up_clicks(db: Session, batch_size: int = 5000) -> int:
+    """Fold all new property_clicks rows into the rollups. Returns the number of clicks processed."""
+    processed = 0
+    while True:
+        count = _roll_up_batch(db, batch_size)
+        if count == 0:
+            return processed
+        processed += count
+
+
+def roll_up_clicks_job() -> int:
+    """Entry point for the periodic job: one session per run."""
+    db = SessionLocal()
+    try:
+        return roll_up_clicks(db)
+    finally:
+        db.close()
+
+
+def get_click_analytics(
+    db: Session,
+    start: date,
+    end: date,
+    granularity: str = "day",
+    property_id: Optional[int] = None,
+    top: int = 10,
+) -> schemas.ClickAnalytics:
+    """
+    Click time series between start and end (inclusive UTC days), either for one property
+    or for the `top` properties with the most clicks in the range. Reads rollups and visitor sketches only.
+    """
+    if granularity == "hour":
+        table, bucket = _hourly, _hourly.c.hour
+        lower, upper = datetime.combine(start, time.min), datetime.combine(end + timedelta(days=1), time.min)
+    else:
+        table, bucket = _daily, _daily.c.day
+        lower, upper = start, end + timedelta(days=1)
+    in_range = [bucket >= lower, bucket < upper]
+
+    if property_id is not None:
+        property_ids = [property_id]
+    else:
+        ranked = db.execute(
+            select(table.c.property_id, func.sum(table.c.count).label("total"))
+            .where(*in_range)
+            .group_by(table.c.property_id)
+            .order_by(func.sum(table.c.count).desc(), table.c.property_id)
+            .limit(top)
+        ).all()
+        property_ids = [row.property_id for row in ranked]
+
+    columns = [table.c.property_id, bucket.label("bucket"), table.c.count]
+    if table is _daily:
+        columns.append(table.c.unique_ips)
+    points: Dict[int, List[schemas.ClickSeriesPoint]] = {pid: [] for pid in property_ids}
+    sketches = visitor_sketches.get_daily_sketches(db, property_ids, start, end)
+    if property_ids:
+        for row in db.execute(
+            select(*columns).where(table.c.property_id.in_(property_ids), *in_range).order_by(bucket)
+        ):
+            sketch = sketches[row.property_id].get(row.bucket) if table is _daily else None
+            points[row.property_id].append(schemas.ClickSeriesPoint(
+                bucket=row.bucket,
+                clicks=row.count,
+                unique_ips=getattr(row, "unique_ips", None),
+                unique_visitors=sketch.count() if sketch is not None else None,
+            ))
+
+    series = [
+        schemas.PropertyClickSeries(
+            property_id=pid,
+            total_clicks=sum(p.clicks for p in points[pid]),
+            unique_visitors=HyperLogLog.union(sketches[pid].values()).count(),
+            points=points[pid],
+        )
+        for pid in property_ids
+    ]
+    return schemas.ClickAnalytics(start=start, end=end, granularity=granularity, series=series)
@@ -0,0 +1,107 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import select
+from typing import Dict, Iterable, List, Optional
+import logging
+import os
+import re
+import models
+from core import images
+from core.config import settings
+from crud import table_versions
+
+logger = logging.getLogger(__name__)
+
+# Derivative records: one image_variants row per file written by core/images.py, keyed by the
+# original's path under UPLOAD_DIR. PropertyImage.variants joins on that path, so the rows do
+# not depend on which property (or team member) ends up using the upload, and an upload that
+# is already in the content-addressed store reuses them instead of rendering again.
+
+VARIANT_NAME = re.compile(r"-\d+w\.(webp|avif|jpg|png)$")
+ORIGINAL_EXTENSIONS = (".jpg", ".jpeg", ".png", ".gif", ".webp", ".avif", ".heic")
+
+
+def save_variants(db: Session, source: str, rendered: images.RenderedImage) -> List[models.ImageVariant]:
+    """Replace the recorded variants of `source` with the rendered ones and commit."""
+    directory = os.path.dirname(source)
+    db.query(models.ImageVariant).filter(models.ImageVariant.source == source).delete(synchronize_session=False)
+    rows = [
+        models.ImageVariant(
+            source=source,
+            path=f"{directory}/{variant['filename']}" if directory else variant["filename"],
+            content_type=variant["content_type"],
+            width=variant["width"],
+            height=variant["height"],
+            size=variant["size"],
+        )
+        for variant in rendered["variants"]
+    ]
+    db.add_all(rows)
+    db.query(models.StoredFile).filter(models.StoredFile.path == source).update(
+        {"width": rendered["width"], "height": rendered["height"]}, synchronize_session=False
+    )
+    db.commit()
+    return rows
+
+
+def load_rendered(db: Session, source: str) -> Optional[images.RenderedImage]:
+    """The recorded derivatives of a stored upload, in the form build_variants returns; None if there are none."""
+    stored = db.query(models.StoredFile).filter(models.StoredFile.path == source).first()
+    variants = get_variants(db, [source])[source]
+    if stored is None or stored.width is None or not variants:
+        return None
+    return images.RenderedImage(
+        width=stored.width,
+        height=stored.height,
+        variants=[
+            images.RenderedVariant(
+                width=v.width, height=v.height, content_type=v.content_type, filename=os.path.basename(v.path), size=v.size
+            )
+            for v in variants
+        ],
+    )
+
+
+def get_variants(db: Session, sources: Iterable[str]) -> Dict[str, List[models.ImageVariant]]:
+    sources = set(sources)
+    result: Dict[str, List[models.ImageVariant]] = {source: [] for source in sources}
+    if sources:
+        for row in db.execute(
+            select(models.ImageVariant).where(models.ImageVariant.source.in_(sources)).order_by(models.ImageVariant.width)
+        ).scalars():
+            result[row.source].append(row)
+    return result
+
+
+def build_missing_variants(db: Session, subdir: Optional[str] = None) -> int:
+    """
+    Render derivatives, in this process, for every uploaded original under UPLOAD_DIR (or its
+    `subdir`) that has none recorded; use it to backfill uploads made before derivatives
+    existed. New derivatives change the srcsets in property responses, so their cached
+    representations are invalidated. Returns the number of images processed.
+    """
+    root = os.path.join(settings.UPLOAD_DIR, subdir) if subdir else settings.UPLOAD_DIR
+    widths, formats = images.variant_widths(), images.variant_formats()
+    processed = 0
+    for directory, _, filenames in os.walk(root):
+        candidates = {}
+        for filename in filenames:
+            if filename.startswith(".") or VARIANT_NAME.search(filename):
+                continue
+            if filename.lower().endswith(ORIGINAL_EXTENSIONS):
+                path = os.path.join(directory, filename)
+                candidates[os.path.relpath(path, settings.UPLOAD_DIR).replace(os.sep, "/")] = path
+        recorded = get_variants(db, candidates)
+        for source, path in sorted(candidates.items()):
+            if recorded[source]:
+                continue
+            try:
+                rendered = images.render_variants(path, widths, formats, settings.IMAGE_VARIANT_QUALITY)
+            except Exception as e:
+                logger.warning(f"Skipping {source}: {e}")
+                continue
+            save_variants(db, source, rendered)
+            processed += 1
+    if processed:
+        table_versions.bump(db, table_versions.PROPERTIES)
+        db.commit()
+    return processed
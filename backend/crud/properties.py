@@ -1,17 +1,45 @@
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from sqlalchemy.orm import Session, joinedload, selectinload
+from typing import List, Optional, Tuple
+import math
 import models, schemas
+from collections import Counter
+from sqlalchemy import and_, case, null, or_
 from sqlalchemy.sql import func
+from core import search as property_search
+from core.cache import QueryCache
+from core.config import settings
+from crud import property_clusters, stored_files, table_versions
+from crud.property_clicks import click_buffer
+from crud.trending import trending
+from utils import geo, media
+from utils.pagination import InvalidCursor, decode_cursor, encode_cursor
 import logging
 logger = logging.getLogger(__name__)
 
 # ---------- Property CRUD ----------
 
+# Histogram bucket lower bounds; the last bucket is open-ended.
+# Prices cover both monthly rents and sale prices, areas are in m².
+FACET_PRICE_EDGES = [0, 500, 1000, 2500, 50000, 100000, 250000, 500000, 1000000]
+FACET_AREA_EDGES = [0, 50, 100, 150, 250, 500, 1000]
+
+# Serialised GET /api/properties/ responses for anonymous visitors; filled by the router
+listing_cache = QueryCache(
+    "property_listing",
+    max_entries=settings.LISTING_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.LISTING_CACHE_TTL_SECONDS,
+)
+
+facets_cache = QueryCache(
+    "property_facets",
+    max_entries=settings.FACETS_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.FACETS_CACHE_TTL_SECONDS,
+)
+
 class CRUDProperty:
-    def get_properties(
-        self, db: Session,
-        skip: int = 0,
-        limit: int = 20,
+    def filter_properties(
+        self, query,
+        current_user: Optional[models.User] = None,
         search: Optional[str] = None,
         property_type: Optional[str] = None,
         listing_type: Optional[str] = None,
@@ -23,25 +51,20 @@ class CRUDProperty:
         max_bathrooms: Optional[int] = None,
         min_area: Optional[float] = None,
         max_area: Optional[float] = None,
-        current_user: Optional[models.User] = None
-    ) -> List[models.Property]:
-        log_call_details = (
-            f"get_properties called with skip={skip}, limit={limit}, search='{search}', "
-            f"property_type='{property_type}', listing_type='{listing_type}', "
-            f"min_price={min_price}, max_price={max_price}, "
-            f"min_bedrooms={min_bedrooms}, max_bedrooms={max_bedrooms}, "
-            f"min_bathrooms={min_bathrooms}, max_bathrooms={max_bathrooms}, "
-            f"min_area={min_area}, max_area={max_area}"
-        )
-        logger.info(log_call_details)
-        
-        user_info = "Public user (Unauthenticated)"
-        if current_user:
-            user_info = f"User '{current_user.username}' (Role: {current_user.role.value if current_user.role else 'N/A'})"
-        logger.info(f"Request context: {user_info}")
-
-        query = db.query(models.Property)
+        bbox: Optional[geo.BBox] = None,
+        near: Optional[Tuple[float, float]] = None,
+        radius_km: Optional[float] = None,
+        rank_results: bool = False,
+    ):
+        """
+        Apply role scoping and the listing filters shared by every property list query.
 
+        `search` goes through the full-text index when the database has one. `bbox`
+        (west, south, east, north) and `near` (lat, lng) with `radius_km` only scan the
+        geo_cell ranges covering the area before checking exact coordinates. With
+        rank_results, results are ordered nearest first (for `near`) and then by search
+        relevance; callers append their own tie-breaking order after it.
+        """
         if current_user:
             if current_user.role == models.Role.staff:
                 logger.info(f"Applying filter for staff user {current_user.username}: only assigned_to_id == {current_user.id}")
@@ -53,9 +76,51 @@ class CRUDProperty:
             #     logger.info(f"User {current_user.username} (Role: {current_user.role.value}) - no specific user-based query adjustments other than general filters.")
                 
         # Standard filters applicable to all (public and authenticated)
+        if bbox is not None:
+            west, south, east, north = bbox
+            lng_filter = (
+                models.Property.longitude.between(west, east) if west <= east
+                else or_(models.Property.longitude >= west, models.Property.longitude <= east)
+            )
+            query = query.filter(
+                self._geo_cell_filter(geo.cover_bbox(bbox)),
+                models.Property.latitude.between(south, north),
+                lng_filter,
+            )
+        if near is not None and radius_km is not None:
+            lat, lng = near
+            area = geo.radius_bbox(lat, lng, radius_km)
+            longitude = models.Property.longitude
+            if area[0] > area[2]:
+                # The circle crosses the antimeridian: measure points on the far side across it
+                longitude = (
+                    case((longitude < 0, longitude + 360.0), else_=longitude) if lng > 0
+                    else case((longitude > 0, longitude - 360.0), else_=longitude)
+                )
+            # Equirectangular approximation: plain arithmetic that every backend can evaluate,
+            # accurate to well under 1% at city-scale radii
+            dy = (models.Property.latitude - lat) * geo.KM_PER_DEGREE
+            dx = (longitude - lng) * (geo.KM_PER_DEGREE * math.cos(math.radians(lat)))
+            distance_sq = dx * dx + dy * dy
+            query = query.filter(
+                self._geo_cell_filter(geo.cover_bbox(area)),
+                distance_sq <= radius_km * radius_km,
+            )
+            if rank_results:
+                query = query.order_by(distance_sq)
         if search:
-            ilike = f"%{search}%"
-            query = query.filter(models.Property.title.ilike(ilike) | models.Property.location.ilike(ilike))
+            match = property_search.match_subquery(query.session.get_bind(), search)
+            if match is not None:
+                query = query.join(match, match.c.property_id == models.Property.id)
+                if rank_results:
+                    query = query.order_by(match.c.rank.desc())
+            else:
+                ilike = f"%{search}%"
+                query = query.filter(
+                    models.Property.title.ilike(ilike)
+                    | models.Property.location.ilike(ilike)
+                    | models.Property.description.ilike(ilike)
+                )
         if property_type:
             query = query.filter(models.Property.property_type == property_type)
         if listing_type:
@@ -77,6 +142,71 @@ class CRUDProperty:
         if max_area is not None:
             query = query.filter(models.Property.square_feet <= max_area)
 
+        return query
+
+    def _geo_cell_filter(self, ranges):
+        return or_(*[models.Property.geo_cell.between(lo, hi) for lo, hi in ranges])
+
+    def _summary_query(self, db: Session):
+        """
+        Base query for list endpoints (schemas.PropertySummary): click totals are columns on
+        properties and the two users are joined, so a page is one statement plus one for the
+        main images' derivatives; the gallery and click rows are never loaded.
+        """
+        return db.query(models.Property).options(
+            joinedload(models.Property.assigned_to),
+            joinedload(models.Property.created_by),
+            selectinload(models.Property.image_variants),
+        )
+
+    def get_properties(
+        self, db: Session,
+        skip: int = 0,
+        limit: int = 20,
+        search: Optional[str] = None,
+        property_type: Optional[str] = None,
+        listing_type: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        min_bedrooms: Optional[int] = None,
+        max_bedrooms: Optional[int] = None,
+        min_bathrooms: Optional[int] = None,
+        max_bathrooms: Optional[int] = None,
+        min_area: Optional[float] = None,
+        max_area: Optional[float] = None,
+        bbox: Optional[geo.BBox] = None,
+        near: Optional[Tuple[float, float]] = None,
+        radius_km: Optional[float] = None,
+        current_user: Optional[models.User] = None
+    ) -> List[models.Property]:
+        log_call_details = (
+            f"get_properties called with skip={skip}, limit={limit}, search='{search}', "
+            f"property_type='{property_type}', listing_type='{listing_type}', "
+            f"min_price={min_price}, max_price={max_price}, "
+            f"min_bedrooms={min_bedrooms}, max_bedrooms={max_bedrooms}, "
+            f"min_bathrooms={min_bathrooms}, max_bathrooms={max_bathrooms}, "
+            f"min_area={min_area}, max_area={max_area}, "
+            f"bbox={bbox}, near={near}, radius_km={radius_km}"
+        )
+        logger.info(log_call_details)
+        
+        user_info = "Public user (Unauthenticated)"
+        if current_user:
+            user_info = f"User '{current_user.username}' (Role: {current_user.role.value if current_user.role else 'N/A'})"
+        logger.info(f"Request context: {user_info}")
+
+        query = self.filter_properties(
+            self._summary_query(db), current_user=current_user, search=search,
+            property_type=property_type, listing_type=listing_type,
+            min_price=min_price, max_price=max_price,
+            min_bedrooms=min_bedrooms, max_bedrooms=max_bedrooms,
+            min_bathrooms=min_bathrooms, max_bathrooms=max_bathrooms,
+            min_area=min_area, max_area=max_area,
+            bbox=bbox, near=near, radius_km=radius_km, rank_results=True,
+        )
+        # Order by primary key (after distance/search rank, if any) so offset pages are stable between requests
+        query = query.order_by(models.Property.id)
+
         properties_returned = query.offset(skip).limit(limit).all()
         
         logger.info(f"{user_info} - Query resulted in {len(properties_returned)} properties being returned (after offset/limit):")
@@ -92,8 +222,180 @@ class CRUDProperty:
             
         return properties_returned
 
-    def get_property(self, db: Session, property_id: int) -> Optional[models.Property]:
-        return db.query(models.Property).filter(models.Property.id == property_id).first()
+    # Keyset orderings: name -> (sort column or None for id-only, descending?).
+    # "newest" walks the primary key backwards; ids are handed out in creation order,
+    # so it matches created_at without round-tripping timestamps through the cursor.
+    KEYSET_ORDERINGS = {
+        "newest": (None, True),
+        "price_asc": ("price", False),
+        "price_desc": ("price", True),
+        "popular": ("click_count", True),
+    }
+
+    def get_properties_page(
+        self, db: Session,
+        cursor: Optional[str] = None,
+        limit: int = 20,
+        order_by: str = "newest",
+        current_user: Optional[models.User] = None,
+        **filters
+    ) -> Tuple[List[models.Property], Optional[str]]:
+        """
+        Keyset-paginated variant of get_properties.
+
+        Returns the page and the cursor for the next one (None on the last page). Each
+        page is a range scan that seeks past the previous page's last key, so deep pages
+        cost the same as the first one. Price orderings skip listings without a price;
+        "popular" orders by the denormalised click_count. Pages follow `order_by` only:
+        `near` and `search` still filter but do not rank results here.
+        Raises InvalidCursor for unknown orderings or cursors that do not decode.
+        """
+        if order_by not in self.KEYSET_ORDERINGS:
+            raise InvalidCursor(f"Unknown ordering '{order_by}'. Valid orderings are {', '.join(self.KEYSET_ORDERINGS)}.")
+        sort_field, descending = self.KEYSET_ORDERINGS[order_by]
+        id_col = models.Property.id
+        sort_col = getattr(models.Property, sort_field) if sort_field else None
+
+        query = self.filter_properties(self._summary_query(db), current_user=current_user, **filters)
+        if sort_col is not None:
+            query = query.filter(sort_col.isnot(None))
+
+        if cursor:
+            values = decode_cursor(cursor)
+            if len(values) != 3 or values[0] != order_by:
+                raise InvalidCursor("Cursor does not belong to this ordering")
+            _, last_value, last_id = values
+            if not isinstance(last_id, int) or (sort_col is not None and not isinstance(last_value, (int, float))):
+                raise InvalidCursor("Malformed cursor values")
+            if sort_col is None:
+                query = query.filter(id_col < last_id if descending else id_col > last_id)
+            elif descending:
+                query = query.filter(or_(sort_col < last_value, and_(sort_col == last_value, id_col < last_id)))
+            else:
+                query = query.filter(or_(sort_col > last_value, and_(sort_col == last_value, id_col > last_id)))
+
+        order_cols = [sort_col, id_col] if sort_col is not None else [id_col]
+        query = query.order_by(*[col.desc() if descending else col.asc() for col in order_cols])
+
+        # Fetch one extra row to learn whether another page exists without a COUNT
+        rows = query.limit(limit + 1).all()
+        page = rows[:limit]
+        next_cursor = None
+        if len(rows) > limit and page:
+            last = page[-1]
+            next_cursor = encode_cursor([order_by, getattr(last, sort_field) if sort_field else None, last.id])
+        logger.info(f"get_properties_page order_by={order_by} returned {len(page)} properties, has_next={next_cursor is not None}")
+        return page, next_cursor
+
+    def _bucket(self, column, edges: List[float]):
+        # Index of the histogram bucket holding the value; NULL stays NULL
+        return case(
+            (column.is_(None), null()),
+            *[(column < upper, idx) for idx, upper in enumerate(edges[1:])],
+            else_=len(edges) - 1,
+        )
+
+    def _histogram(self, counts: Counter, edges: List[float]) -> List[schemas.HistogramBucket]:
+        return [
+            schemas.HistogramBucket(
+                min=lower, max=edges[idx + 1] if idx + 1 < len(edges) else None, count=counts.get(idx, 0)
+            )
+            for idx, lower in enumerate(edges)
+        ]
+
+    def get_facets(
+        self, db: Session,
+        current_user: Optional[models.User] = None,
+        **filters
+    ) -> schemas.PropertyFacets:
+        """
+        Counts per property_type, listing_type, bedrooms and bathrooms plus price and area
+        histograms for the properties matching `filters` (same filters as get_properties).
+
+        Runs one GROUP BY over every facet column together and folds the combinations in
+        Python. Results are cached per filter signature and role scope until the next
+        property write.
+        """
+        scope = ("staff", current_user.id) if current_user and current_user.role == models.Role.staff else ("all",)
+        cache_key = (scope, tuple(sorted(filters.items())))
+        found, facets = facets_cache.get(cache_key)
+        if found:
+            return facets
+        version = facets_cache.version
+
+        dims = [
+            models.Property.property_type,
+            models.Property.listing_type,
+            models.Property.bedrooms,
+            models.Property.bathrooms,
+            self._bucket(models.Property.price, FACET_PRICE_EDGES),
+            self._bucket(models.Property.square_feet, FACET_AREA_EDGES),
+        ]
+        query = self.filter_properties(
+            db.query(*dims, func.count(models.Property.id)).select_from(models.Property),
+            current_user=current_user, **filters
+        )
+        counters = [Counter() for _ in dims]
+        total = 0
+        for row in query.group_by(*dims).all():
+            count = row[-1]
+            total += count
+            for counter, value in zip(counters, row[:-1]):
+                if value is not None:
+                    counter[value] += count
+
+        def by_count(counter: Counter) -> List[schemas.FacetCount]:
+            return [schemas.FacetCount(value=value, count=count) for value, count in counter.most_common()]
+
+        def by_value(counter: Counter) -> List[schemas.FacetCount]:
+            return [schemas.FacetCount(value=value, count=counter[value]) for value in sorted(counter)]
+
+        facets = schemas.PropertyFacets(
+            total=total,
+            property_type=by_count(counters[0]),
+            listing_type=by_count(counters[1]),
+            bedrooms=by_value(counters[2]),
+            bathrooms=by_value(counters[3]),
+            price=self._histogram(counters[4], FACET_PRICE_EDGES),
+            area=self._histogram(counters[5], FACET_AREA_EDGES),
+        )
+        facets_cache.set(cache_key, facets, version=version)
+        return facets
+
+    def invalidate_caches(self):
+        """Drop cached listings and aggregates after any property write."""
+        listing_cache.invalidate()
+        facets_cache.invalidate()
+        click_buffer.forget_ids()
+
+    def get_properties_by_ids(self, db: Session, property_ids: List[int]) -> List[models.Property]:
+        """Summary rows for the given ids in one statement, in the order given; missing ids are skipped."""
+        if not property_ids:
+            return []
+        found = {p.id: p for p in self._summary_query(db).filter(models.Property.id.in_(property_ids))}
+        return [found[pid] for pid in property_ids if pid in found]
+
+    def get_property(self, db: Session, property_id: int, full: bool = False) -> Optional[models.Property]:
+        """
+        Fetch one property. With full=True every relationship serialised by schemas.Property is
+        loaded up front (users joined, gallery and clicks in one SELECT each) so the detail
+        response needs no lazy loads; leave it off for existence checks and writes.
+        """
+        query = db.query(models.Property)
+        if full:
+            query = query.options(
+                joinedload(models.Property.assigned_to),
+                joinedload(models.Property.created_by),
+                selectinload(models.Property.image_variants),
+                selectinload(models.Property.images).selectinload(models.PropertyImage.variants),
+                selectinload(models.Property.clicks).joinedload(models.PropertyClick.agent),
+            )
+        return query.filter(models.Property.id == property_id).first()
+
+    def sync_indexes(self, db: Session, db_prop: models.Property):
+        """Refresh derived lookup data (geo cell, full-text document) after a property's fields change."""
+        db_prop.geo_cell = geo.encode_cell(db_prop.latitude, db_prop.longitude)
+        property_search.index_property(db, db_prop)
 
     def create_property(self, db: Session, property_in: schemas.PropertyCreate, current_user: models.User) -> models.Property:
         property_data = property_in.dict(exclude_unset=True, exclude={'additional_image_urls', 'assigned_to_id', 'created_by_user_id'})
@@ -102,6 +404,9 @@ class CRUDProperty:
             property_data['image_url'] = str(property_data['image_url'])
 
         new_prop = models.Property(**property_data)
+        new_prop.image_upload_path = media.upload_path(new_prop.image_url)
+        # Set before the INSERT so sync_indexes does not need a follow-up UPDATE
+        new_prop.geo_cell = geo.encode_cell(new_prop.latitude, new_prop.longitude)
         new_prop.created_by_user_id = current_user.id
 
         if current_user.role == models.Role.staff:
@@ -117,15 +422,47 @@ class CRUDProperty:
                 prop_image = models.PropertyImage(
                     property_id=new_prop.id,
                     image_url=str(image_url),
+                    upload_path=media.upload_path(image_url),
                     order=order_idx
                 )
                 db.add(prop_image)
-        
+        stored_files.add_references(db, [new_prop.image_url, *(str(url) for url in property_in.additional_image_urls or [])])
+
+        self.sync_indexes(db, new_prop)
+        property_clusters.add_point(db, property_clusters.snapshot(new_prop))
+        table_versions.bump(db, table_versions.PROPERTIES)
         db.commit()
-        db.refresh(new_prop)
-        return new_prop
+        self.invalidate_caches()
+        return self.get_property(db, new_prop.id, full=True)
+
+    def _append_images(self, db: Session, property_id: int, image_urls: List[str]) -> List[models.PropertyImage]:
+        """Add gallery images after the existing ones, in the order given; the caller commits."""
+        max_order = db.query(func.max(models.PropertyImage.order)).filter(models.PropertyImage.property_id == property_id).scalar()
+        current_max_order = max_order if max_order is not None else -1
+
+        images = [
+            models.PropertyImage(
+                property_id=property_id,
+                image_url=image_url,
+                upload_path=media.upload_path(image_url),
+                order=current_max_order + 1 + order_idx
+            )
+            for order_idx, image_url in enumerate(image_urls)
+        ]
+        db.add_all(images)
+        stored_files.add_references(db, image_urls)
+        return images
+
+    def add_images(self, db: Session, db_prop: models.Property, image_urls: List[str]) -> List[models.PropertyImage]:
+        """Append gallery images to a property in one transaction and return the new rows."""
+        images = self._append_images(db, db_prop.id, image_urls)
+        table_versions.bump(db, table_versions.PROPERTIES)
+        db.commit()
+        self.invalidate_caches()
+        return images
 
     def update_property(self, db: Session, db_prop: models.Property, property_update: schemas.PropertyUpdate) -> models.Property:
+        old_cluster_point = property_clusters.snapshot(db_prop)
         if property_update.delete_image_ids:
             images_to_delete = db.query(models.PropertyImage).filter(
                 models.PropertyImage.property_id == db_prop.id,
@@ -133,37 +470,46 @@ class CRUDProperty:
             ).all()
             for image in images_to_delete:
                 db.delete(image)
+            stored_files.remove_references(db, [image.image_url for image in images_to_delete])
 
         if property_update.additional_image_urls:
-            max_order = db.query(func.max(models.PropertyImage.order)).filter(models.PropertyImage.property_id == db_prop.id).scalar()
-            current_max_order = max_order if max_order is not None else -1
-            
-            for order_idx, image_url in enumerate(property_update.additional_image_urls):
-                prop_image = models.PropertyImage(
-                    property_id=db_prop.id,
-                    image_url=str(image_url),
-                    order=current_max_order + 1 + order_idx
-                )
-                db.add(prop_image)
+            self._append_images(db, db_prop.id, [str(url) for url in property_update.additional_image_urls])
 
         update_data = property_update.dict(exclude_unset=True, exclude={'additional_image_urls', 'delete_image_ids'})
         
         if 'image_url' in update_data and update_data['image_url'] is not None:
             update_data['image_url'] = str(update_data['image_url'])
+        if 'image_url' in update_data and update_data['image_url'] != db_prop.image_url:
+            stored_files.remove_references(db, [db_prop.image_url])
+            stored_files.add_references(db, [update_data['image_url']])
         
         if 'assigned_to_id' in update_data:
             setattr(db_prop, 'assigned_to_id', update_data.pop('assigned_to_id'))
             
         for field, value in update_data.items():
             setattr(db_prop, field, value)
+        db_prop.image_upload_path = media.upload_path(db_prop.image_url)
         
+        self.sync_indexes(db, db_prop)
         db.add(db_prop)
+        db.flush()
+        property_clusters.move_point(db, old_cluster_point, property_clusters.snapshot(db_prop))
+        table_versions.bump(db, table_versions.PROPERTIES)
         db.commit()
-        db.refresh(db_prop)
-        return db_prop
+        self.invalidate_caches()
+        return self.get_property(db, db_prop.id, full=True)
 
     def delete_property(self, db: Session, db_prop: models.Property):
+        cluster_point = property_clusters.snapshot(db_prop)
+        property_search.unindex_property(db, db_prop.id)
+        property_id = db_prop.id
+        stored_files.remove_references(db, [db_prop.image_url, *(image.image_url for image in db_prop.images)])
         db.delete(db_prop)
+        db.flush()
+        property_clusters.remove_point(db, cluster_point)
+        table_versions.bump(db, table_versions.PROPERTIES)
         db.commit()
+        self.invalidate_caches()
+        trending.discard(property_id)
 
 property = CRUDProperty() 
\ No newline at end of file
@@ -1,23 +1,163 @@
 from sqlalchemy.orm import Session
+from sqlalchemy import bindparam, case, func, insert, or_, select
 import models, schemas
+from collections import Counter
+from core.click_buffer import ClickBuffer, ClickEvent
+from core.click_filter import ClickFilter
+from core.config import settings
+from core.database import SessionLocal
+from crud import table_versions, user_agents, visitor_sketches
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional, Set
+from utils.ip import pack_ip
 
 def create_property_click(db: Session, property_id: int, ip_address: Optional[str] = None, user_agent: Optional[str] = None) -> models.PropertyClick:
     """
-    Creates a new property click record.
+    Creates a new property click record and bumps the property's denormalised counters
+    in the same transaction. The counter is incremented in SQL, so concurrent clicks
+    cannot overwrite each other.
     """
+    clicked_at = datetime.utcnow() # Ensure consistent timezone handling if needed, or let server_default handle it
     db_property_click = models.PropertyClick(
         property_id=property_id,
-        clicked_at=datetime.utcnow(), # Ensure consistent timezone handling if needed, or let server_default handle it
-        ip_address=ip_address,
-        user_agent=user_agent
+        clicked_at=clicked_at,
+        ip=pack_ip(ip_address),
+        user_agent_id=user_agents.get_id(db, user_agent)
     )
     db.add(db_property_click)
+    db.query(models.Property).filter(models.Property.id == property_id).update(
+        {
+            models.Property.click_count: models.Property.click_count + 1,
+            models.Property.last_clicked_at: clicked_at,
+            models.Property.updated_at: models.Property.updated_at,  # A click is not an edit: skip onupdate
+        },
+        synchronize_session=False,
+    )
+    visitor_sketches.add_visits(db, [(property_id, clicked_at, ip_address, user_agent)])
     db.commit()
     db.refresh(db_property_click)
     return db_property_click
 
+def bulk_create_property_clicks(db: Session, events: List[ClickEvent]) -> int:
+    """
+    Write a batch of buffered clicks with one multi-row INSERT, one executemany UPDATE of the
+    per-property counters and a single commit. Clicks for properties that no longer exist are
+    skipped. Returns the number of clicks written.
+    """
+    property_ids = {event.property_id for event in events}
+    existing = set(db.scalars(select(models.Property.id).where(models.Property.id.in_(property_ids))))
+    events = [e for e in events if e.property_id in existing]
+    if not events:
+        return 0
+    agent_ids = user_agents.get_ids(db, (e.user_agent for e in events))
+    rows = [
+        {
+            "property_id": e.property_id,
+            "clicked_at": e.clicked_at,
+            "ip": pack_ip(e.ip_address),
+            "user_agent_id": agent_ids.get(e.user_agent),
+        }
+        for e in events
+    ]
+    db.execute(insert(models.PropertyClick.__table__), rows)
+
+    counts = Counter(row["property_id"] for row in rows)
+    latest = {}
+    for row in rows:
+        if row["property_id"] not in latest or row["clicked_at"] > latest[row["property_id"]]:
+            latest[row["property_id"]] = row["clicked_at"]
+    properties = models.Property.__table__
+    new_last = bindparam("b_last", type_=properties.c.last_clicked_at.type)
+    db.execute(
+        properties.update()
+        .where(properties.c.id == bindparam("b_id"))
+        .values(
+            click_count=properties.c.click_count + bindparam("b_count"),
+            # Replayed spill files can be older than clicks already written
+            last_clicked_at=case(
+                (or_(properties.c.last_clicked_at.is_(None), properties.c.last_clicked_at < new_last), new_last),
+                else_=properties.c.last_clicked_at,
+            ),
+            updated_at=properties.c.updated_at,
+        ),
+        [{"b_id": pid, "b_count": count, "b_last": latest[pid]} for pid, count in counts.items()],
+    )
+    visitor_sketches.add_visits(db, [(e.property_id, e.clicked_at, e.ip_address, e.user_agent) for e in events])
+    db.commit()
+    return len(rows)
+
+def _write_click_batch(events: List[ClickEvent]) -> int:
+    db = SessionLocal()
+    try:
+        return bulk_create_property_clicks(db, events)
+    finally:
+        db.close()
+
+def _load_property_ids() -> Set[int]:
+    db = SessionLocal()
+    try:
+        return set(db.scalars(select(models.Property.id)))
+    finally:
+        db.close()
+
+# Used by track-click when CLICK_INGEST_MODE=buffered; started and drained by main.py's lifespan
+click_buffer = ClickBuffer(
+    writer=_write_click_batch,
+    id_loader=_load_property_ids,
+    max_size=settings.CLICK_BUFFER_MAX_SIZE,
+    batch_size=settings.CLICK_BUFFER_BATCH_SIZE,
+    flush_interval=settings.CLICK_BUFFER_FLUSH_SECONDS,
+    policy=settings.CLICK_BUFFER_POLICY,
+    block_timeout=settings.CLICK_BUFFER_BLOCK_SECONDS,
+    spill_dir=settings.CLICK_BUFFER_SPILL_DIR,
+)
+
+# Dedup and bot filter applied by track-click in both ingest modes
+click_filter = ClickFilter(
+    window_seconds=settings.CLICK_DEDUP_WINDOW_SECONDS,
+    max_entries=settings.CLICK_DEDUP_MAX_ENTRIES,
+    filter_bots=settings.CLICK_FILTER_BOTS,
+)
+
+def reconcile_click_counters(db: Session) -> int:
+    """
+    Recompute properties.click_count and last_clicked_at from the clicks on record: the daily
+    rollups, which still count clicks archived out of property_clicks, plus the raw clicks not
+    rolled up yet. last_clicked_at keeps its stored value when no raw clicks remain.
+    Returns the number of properties whose stored counters were wrong.
+    """
+    from crud.click_rollups import get_high_water_mark, roll_up_clicks
+
+    roll_up_clicks(db)
+    high_water_mark = get_high_water_mark(db)
+    clicks = models.PropertyClick
+    daily = models.PropertyClickDaily
+    rolled_up = (
+        select(func.coalesce(func.sum(daily.count), 0)).where(daily.property_id == models.Property.id).scalar_subquery()
+    )
+    pending = (
+        select(func.count(clicks.id))
+        .where(clicks.property_id == models.Property.id, clicks.id > high_water_mark)
+        .scalar_subquery()
+    )
+    actual_count = rolled_up + pending
+    actual_last = func.coalesce(
+        select(func.max(clicks.clicked_at)).where(clicks.property_id == models.Property.id).scalar_subquery(),
+        models.Property.last_clicked_at,
+    )
+    drifted = db.query(models.Property).filter(models.Property.click_count != actual_count).count()
+    db.query(models.Property).update(
+        {
+            models.Property.click_count: actual_count,
+            models.Property.last_clicked_at: actual_last,
+            models.Property.updated_at: models.Property.updated_at,
+        },
+        synchronize_session=False,
+    )
+    table_versions.bump(db, table_versions.PROPERTIES)
+    db.commit()
+    return drifted
+
 # Optional: A function to get clicks for a property (example)
 # def get_property_clicks(db: Session, property_id: int, skip: int = 0, limit: int = 100) -> list[models.PropertyClick]:
-#     return db.query(models.PropertyClick).filter(models.PropertyClick.property_id == property_id).offset(skip).limit(limit).all() 
\ No newline at end of file
+#     return db.query(models.PropertyClick).filter(models.PropertyClick.property_id == property_id).offset(skip).limit(limit).all()
@@ -0,0 +1,161 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import and_, case, func, or_, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+from typing import List, NamedTuple, Optional
+import models
+from utils import geo
+
+# Precomputed map-pin cluster pyramid.
+#
+# property_clusters holds one row per (level, cell) that contains at least one geocoded
+# property, where cell is the property's geo_cell truncated to `level` bits per axis.
+# Rows are adjusted incrementally as properties are created, moved, repriced or deleted,
+# so serving a viewport is a few index range scans over the cells it overlaps.
+
+MIN_LEVEL = 2
+MAX_LEVEL = 20  # ~38m cells; beyond this the map should show individual pins
+ZOOM_LEVEL_OFFSET = 2  # 256px tiles split into 4x4 cells, i.e. ~64px clusters
+MAX_VIEWPORT_CELLS = 1024  # A full-HD viewport spans ~30x17 cells at its zoom's level
+
+_table = models.PropertyCluster.__table__
+
+
+class ClusterPoint(NamedTuple):
+    """The fields of a property that contribute to its clusters."""
+    geo_cell: Optional[int]
+    latitude: Optional[float]
+    longitude: Optional[float]
+    price: Optional[float]
+
+
+def snapshot(prop: models.Property) -> ClusterPoint:
+    return ClusterPoint(prop.geo_cell, prop.latitude, prop.longitude, prop.price)
+
+
+def level_for_zoom(zoom: int) -> int:
+    return min(max(zoom + ZOOM_LEVEL_OFFSET, MIN_LEVEL), MAX_LEVEL)
+
+
+def _levels():
+    return range(MIN_LEVEL, MAX_LEVEL + 1)
+
+
+def add_point(db: Session, point: ClusterPoint):
+    """Fold a property into every level of the pyramid."""
+    if point.geo_cell is None:
+        return
+    rows = [
+        {
+            "level": level, "cell": geo.cell_at_level(point.geo_cell, level), "count": 1,
+            "lat_sum": point.latitude, "lng_sum": point.longitude,
+            "min_price": point.price, "max_price": point.price,
+        }
+        for level in _levels()
+    ]
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        insert = (sqlite if dialect == "sqlite" else postgresql).insert
+        stmt = insert(_table)
+        new = stmt.excluded
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[_table.c.level, _table.c.cell],
+            set_={
+                "count": _table.c.count + 1,
+                "lat_sum": _table.c.lat_sum + new.lat_sum,
+                "lng_sum": _table.c.lng_sum + new.lng_sum,
+                "min_price": case(
+                    (new.min_price.is_(None), _table.c.min_price),
+                    (or_(_table.c.min_price.is_(None), new.min_price < _table.c.min_price), new.min_price),
+                    else_=_table.c.min_price,
+                ),
+                "max_price": case(
+                    (new.max_price.is_(None), _table.c.max_price),
+                    (or_(_table.c.max_price.is_(None), new.max_price > _table.c.max_price), new.max_price),
+                    else_=_table.c.max_price,
+                ),
+            },
+        )
+        db.execute(stmt, rows)
+        return
+    # Portable fallback: update existing cells, insert the missing ones
+    for row in rows:
+        db_cluster = db.get(models.PropertyCluster, (row["level"], row["cell"]))
+        if db_cluster is None:
+            db.add(models.PropertyCluster(**row))
+            continue
+        db_cluster.count += 1
+        db_cluster.lat_sum += point.latitude
+        db_cluster.lng_sum += point.longitude
+        if point.price is not None:
+            if db_cluster.min_price is None or point.price < db_cluster.min_price:
+                db_cluster.min_price = point.price
+            if db_cluster.max_price is None or point.price > db_cluster.max_price:
+                db_cluster.max_price = point.price
+
+
+def remove_point(db: Session, point: ClusterPoint):
+    """
+    Take a property back out of every level of the pyramid.
+
+    Must run after the property's removal or move has been flushed: when the point held
+    a cell's min or max price, that bound is recomputed from the properties still in the cell.
+    """
+    if point.geo_cell is None:
+        return
+    for level in _levels():
+        cell = geo.cell_at_level(point.geo_cell, level)
+        key = and_(_table.c.level == level, _table.c.cell == cell)
+        db.execute(
+            _table.update().where(key).values(
+                count=_table.c.count - 1,
+                lat_sum=_table.c.lat_sum - point.latitude,
+                lng_sum=_table.c.lng_sum - point.longitude,
+            )
+        )
+        db.execute(_table.delete().where(key, _table.c.count <= 0))
+        if point.price is None:
+            continue
+        bounds = db.execute(
+            select(_table.c.min_price, _table.c.max_price).where(key)
+        ).first()
+        if bounds is None or point.price not in (bounds.min_price, bounds.max_price):
+            continue
+        lo, hi = geo.cell_range(cell, level)
+        min_price, max_price = db.query(
+            func.min(models.Property.price), func.max(models.Property.price)
+        ).filter(models.Property.geo_cell.between(lo, hi)).one()
+        db.execute(_table.update().where(key).values(min_price=min_price, max_price=max_price))
+
+
+def move_point(db: Session, old: ClusterPoint, new: ClusterPoint):
+    """Apply an update; call after the new property values have been flushed."""
+    if old == new:
+        return
+    remove_point(db, old)
+    add_point(db, new)
+
+
+def get_clusters(db: Session, bbox: geo.BBox, zoom: int) -> List[models.PropertyCluster]:
+    """Return the clusters for the cells at this zoom's level that overlap bbox."""
+    level = level_for_zoom(zoom)
+    shift = 2 * (geo.CELL_BITS - level)
+    ranges = geo.cover_bbox(bbox, max_cells=MAX_VIEWPORT_CELLS)
+    cell_filter = or_(*[
+        models.PropertyCluster.cell.between(lo >> shift, hi >> shift) for lo, hi in ranges
+    ])
+    return db.query(models.PropertyCluster).filter(
+        models.PropertyCluster.level == level, cell_filter
+    ).all()
+
+
+def rebuild_clusters(db: Session):
+    """Recompute the whole pyramid from properties with one grouped pass per level."""
+    db.execute(_table.delete())
+    for level in _levels():
+        shift = 2 * (geo.CELL_BITS - level)
+        db.execute(text(
+            "INSERT INTO property_clusters (level, cell, count, lat_sum, lng_sum, min_price, max_price) "
+            f"SELECT {level}, geo_cell >> {shift}, count(*), sum(latitude), sum(longitude), min(price), max(price) "
+            f"FROM properties WHERE geo_cell IS NOT NULL GROUP BY geo_cell >> {shift}"
+        ))
+    db.commit()
@@ -1,6 +1,7 @@
 from sqlalchemy.orm import Session
 from typing import Dict, Optional
 import models, schemas
+from crud import table_versions
 
 
 def get_settings(db: Session) -> Dict[str, models.SiteSettings]:
@@ -16,6 +17,7 @@ def upsert_setting(db: Session, key: str, value: dict, category: Optional[str] =
     else:
         db_obj = models.SiteSettings(key=key, value=value, category=category)
         db.add(db_obj)
+    table_versions.bump(db, table_versions.SITE_SETTINGS)
     db.commit()
     db.refresh(db_obj)
     return db_obj
@@ -1,6 +1,7 @@
 from sqlalchemy.orm import Session
 from typing import Dict, Optional, Any
 import models, schemas
+from crud import table_versions
 
 class CRUDSiteSetting:
     def get_settings(self, db: Session) -> Dict[str, models.SiteSettings]: # Changed to models.SiteSetting, assuming SiteSettings is the model
@@ -19,6 +20,7 @@ class CRUDSiteSetting:
         else:
             db_obj = models.SiteSettings(key=key, value=value, category=category)
             db.add(db_obj)
+        table_versions.bump(db, table_versions.SITE_SETTINGS)
         db.commit()
         db.refresh(db_obj)
         return db_obj
@@ -0,0 +1,201 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import case, delete, select, update
+from sqlalchemy.exc import IntegrityError
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Iterable, Optional
+import json
+import logging
+import os
+import re
+import models
+from core.config import settings
+from core.database import SessionLocal
+from core.uploads import STORE_DIR, SavedUpload, settle
+from utils.media import UPLOAD_URL_PREFIX, upload_path
+
+logger = logging.getLogger(__name__)
+
+# Reference counts for the content-addressed upload store.
+#
+# stored_files has one row per stored file. ref_count is the number of image URL columns
+# that point at it: property_images.image_url, properties.image_url and
+# team_members.image_url. The property and team CRUD adjust it in the same transaction as
+# the rows they write. A file whose count has been 0 for UPLOAD_GC_GRACE_HOURS is deleted,
+# along with its derivatives, by collect_unreferenced_files(). The grace period covers
+# uploads that are not attached yet, and every upload of the same bytes restarts it.
+# Before anything is deleted, the counts are re-derived from the URL columns and from the
+# site settings JSON, which is not counted on write. So drift can delay a deletion but
+# never cause a wrong one.
+#
+# Uploads and collection can meet on the same bytes. Collection moves a file out of its
+# address before deleting its row, and puts it back if the row turns out to be wanted.
+# An upload of bytes that look already stored commits the row first; only then does it drop
+# its own copy, or put that copy in place if the file has gone (core/uploads.settle). So
+# an upload never ends up with a row whose file is missing.
+#
+# Legacy uploads (<type>/<name>_<uuid> paths) are not in the store and are never counted
+# or collected.
+
+_files = models.StoredFile.__table__
+
+STORE_URL = re.compile(rf"{re.escape(UPLOAD_URL_PREFIX)}{STORE_DIR}/[0-9a-f]{{2}}/[0-9a-f]{{64}}\.[a-z]+")
+
+
+def _store_paths(urls: Iterable[Optional[str]]) -> Counter:
+    paths = (upload_path(url) for url in urls if url)
+    return Counter(path for path in paths if path and path.startswith(f"{STORE_DIR}/"))
+
+
+def record_upload(db: Session, saved: SavedUpload) -> SavedUpload:
+    """
+    Register a stored upload, restarting its grace period if it is unreferenced, and commit;
+    then settle its file. Returns the settled upload.
+    """
+    now = datetime.utcnow()
+    # Waits for a collection deleting this row to commit, and then finds no row to update
+    db.execute(
+        update(_files)
+        .where(_files.c.digest == saved.digest, _files.c.ref_count == 0)
+        .values(unreferenced_since=now)
+    )
+    exists = db.execute(select(_files.c.id).where(_files.c.digest == saved.digest)).scalar()
+    if exists is None:
+        try:
+            with db.begin_nested():
+                db.execute(_files.insert().values(
+                    digest=saved.digest,
+                    path=saved.path,
+                    content_type=saved.content_type,
+                    size=saved.size,
+                    ref_count=0,
+                    unreferenced_since=now,
+                ))
+        except IntegrityError:
+            pass  # Recorded by a concurrent identical upload, which started the grace period
+    db.commit()
+    return settle(saved)
+
+
+def add_references(db: Session, urls: Iterable[Optional[str]]):
+    """Count new references from these image URLs; the caller commits."""
+    for path, n in _store_paths(urls).items():
+        db.execute(
+            update(_files)
+            .where(_files.c.path == path)
+            .values(ref_count=_files.c.ref_count + n, unreferenced_since=None)
+        )
+
+
+def remove_references(db: Session, urls: Iterable[Optional[str]]):
+    """Drop references from these image URLs; the caller commits."""
+    now = datetime.utcnow()
+    for path, n in _store_paths(urls).items():
+        released = _files.c.ref_count <= n
+        db.execute(
+            update(_files)
+            .where(_files.c.path == path)
+            .values(
+                ref_count=case((released, 0), else_=_files.c.ref_count - n),
+                unreferenced_since=case((released, now), else_=_files.c.unreferenced_since),
+            )
+        )
+
+
+def count_references(db: Session) -> Counter:
+    """Store path -> number of image URL columns pointing at it, counted from the tables."""
+    urls = []
+    urls += db.execute(select(models.PropertyImage.image_url)).scalars().all()
+    urls += db.execute(select(models.Property.image_url).where(models.Property.image_url.isnot(None))).scalars().all()
+    urls += db.execute(select(models.TeamMember.image_url).where(models.TeamMember.image_url.isnot(None))).scalars().all()
+    # Site settings (e.g. home_background_url) hold general uploads anywhere in their JSON values
+    for value in db.execute(select(models.SiteSettings.value)).scalars():
+        urls += STORE_URL.findall(json.dumps(value))
+    return _store_paths(urls)
+
+
+def reconcile_references(db: Session) -> int:
+    """Recompute every ref_count from the URL columns; returns the number of rows that had drifted."""
+    counts = count_references(db)
+    now = datetime.utcnow()
+    drifted = 0
+    for row in db.execute(select(_files.c.id, _files.c.path, _files.c.ref_count)).all():
+        actual = counts.get(row.path, 0)
+        if actual != row.ref_count:
+            drifted += 1
+            db.execute(
+                update(_files)
+                .where(_files.c.id == row.id)
+                .values(ref_count=actual, unreferenced_since=None if actual else now)
+            )
+    db.commit()
+    return drifted
+
+
+def _remove_file(relative: str):
+    try:
+        os.remove(os.path.join(settings.UPLOAD_DIR, relative))
+    except FileNotFoundError:
+        pass
+
+
+def _set_aside(relative: str) -> Optional[str]:
+    """Move a stored file out of its address before its row is deleted; returns where to, None if it is not on disk."""
+    path = os.path.join(settings.UPLOAD_DIR, relative)
+    aside = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.collect")
+    try:
+        os.replace(path, aside)
+    except FileNotFoundError:
+        if not os.path.exists(aside):  # Otherwise already set aside by an interrupted run
+            return None
+    return aside
+
+
+def collect_unreferenced_files(db: Session, grace_hours: Optional[float] = None) -> int:
+    """Delete stored files (and their derivatives) unreferenced for grace_hours; returns how many."""
+    grace_hours = settings.UPLOAD_GC_GRACE_HOURS if grace_hours is None else grace_hours
+    cutoff = datetime.utcnow() - timedelta(hours=grace_hours)
+    candidates = db.execute(
+        select(_files.c.id, _files.c.path)
+        .where(_files.c.ref_count == 0, _files.c.unreferenced_since < cutoff)
+    ).all()
+    if not candidates:
+        return 0
+    counts = count_references(db)
+    variants = models.ImageVariant
+    removed = 0
+    for row in candidates:
+        if counts.get(row.path):
+            # Referenced after all (a write path missed the count): repair it instead
+            db.execute(update(_files).where(_files.c.id == row.id).values(ref_count=counts[row.path], unreferenced_since=None))
+            continue
+        variant_paths = db.execute(select(variants.path).where(variants.source == row.path)).scalars().all()
+        # From here an identical upload finds no stored file and puts its own copy in place
+        aside = _set_aside(row.path)
+        deleted = db.execute(
+            delete(_files).where(_files.c.id == row.id, _files.c.ref_count == 0, _files.c.unreferenced_since < cutoff)
+        ).rowcount
+        if not deleted:
+            # Re-uploaded or attached meanwhile
+            if aside is not None:
+                os.replace(aside, os.path.join(settings.UPLOAD_DIR, row.path))
+            continue
+        db.execute(delete(variants).where(variants.source == row.path))
+        db.commit()
+        # Files go after the rows: a failure here leaves orphan files, never rows without files
+        for relative in variant_paths:
+            _remove_file(relative)
+        if aside is not None:
+            _remove_file(os.path.relpath(aside, settings.UPLOAD_DIR))
+        removed += 1
+    db.commit()
+    return removed
+
+
+def collect_unreferenced_files_job() -> int:
+    """Entry point for the periodic job: one session per run."""
+    db = SessionLocal()
+    try:
+        return collect_unreferenced_files(db)
+    finally:
+        db.close()
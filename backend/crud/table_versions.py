@@ -0,0 +1,76 @@
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects import postgresql, sqlite
+import time
+from datetime import datetime, timezone
+from typing import NamedTuple, Optional
+import models
+from core.config import settings
+
+# Per-table write counters.
+#
+# Every write path that changes what a public read endpoint returns calls bump() inside its
+# own transaction. Readers fetch the counter with one primary-key lookup and derive their
+# ETag from it, so a conditional request can be answered without running the real query.
+# Being stored in the database, the counters stay consistent across worker processes.
+#
+# Clicks do not bump PROPERTIES: every click would queue on the same row and invalidate every
+# cached listing. Endpoints showing click counters fold with_click_window() into their validators
+# instead, so those counters are at most LISTING_CACHE_TTL_SECONDS stale, like cached listings.
+
+PROPERTIES = "properties"  # properties and their images and assigned/creator users (not clicks)
+SITE_SETTINGS = "site_settings"
+TEAM_MEMBERS = "team_members"
+
+_table = models.TableVersion.__table__
+
+
+class TableVersion(NamedTuple):
+    version: int
+    updated_at: Optional[datetime]
+    window: int = 0  # See with_click_window()
+
+
+def bump(db: Session, name: str):
+    """Increment a table's counter; the caller commits."""
+    now = datetime.now(timezone.utc)
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        insert = (sqlite if dialect == "sqlite" else postgresql).insert
+        stmt = insert(_table).values(name=name, version=1, updated_at=now)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[_table.c.name],
+            set_={"version": _table.c.version + 1, "updated_at": now},
+        )
+        db.execute(stmt)
+        return
+    # Portable fallback
+    updated = db.execute(
+        _table.update().where(_table.c.name == name).values(version=_table.c.version + 1, updated_at=now)
+    )
+    if updated.rowcount == 0:
+        db.add(models.TableVersion(name=name, version=1, updated_at=now))
+        db.flush()
+
+
+def get_version(db: Session, name: str) -> TableVersion:
+    row = db.execute(
+        _table.select().with_only_columns(_table.c.version, _table.c.updated_at).where(_table.c.name == name)
+    ).first()
+    if row is None:
+        return TableVersion(0, None)
+    return TableVersion(row.version, row.updated_at)
+
+
+
+def with_click_window(table_version: TableVersion) -> TableVersion:
+    """
+    Add the current click window to a PROPERTIES version: endpoints put `window` in their
+    ETag, and Last-Modified is never earlier than the window's start.
+    """
+    length = max(settings.LISTING_CACHE_TTL_SECONDS, 1)
+    window = int(time.time() // length)
+    started = datetime.fromtimestamp(window * length, timezone.utc)
+    updated_at = table_version.updated_at
+    if updated_at is not None and updated_at.tzinfo is None:
+        updated_at = updated_at.replace(tzinfo=timezone.utc)  # SQLite drops the offset
+    return TableVersion(table_version.version, max(updated_at, started) if updated_at else started, window)
@@ -1,6 +1,7 @@
 from sqlalchemy.orm import Session
 from typing import List, Optional
 import models, schemas
+from crud import stored_files, table_versions
 
 
 def get_team_member(db: Session, member_id: int) -> Optional[models.TeamMember]:
@@ -17,6 +18,8 @@ def create_team_member(db: Session, member_in: schemas.TeamMemberCreate) -> mode
         data['image_url'] = str(data['image_url'])
     db_member = models.TeamMember(**data)
     db.add(db_member)
+    stored_files.add_references(db, [db_member.image_url])
+    table_versions.bump(db, table_versions.TEAM_MEMBERS)
     db.commit()
     db.refresh(db_member)
     return db_member
@@ -26,14 +29,20 @@ def update_team_member(db: Session, db_member: models.TeamMember, member_update:
     update_data = member_update.dict(exclude_unset=True)
     if 'image_url' in update_data and update_data['image_url'] is not None:
         update_data['image_url'] = str(update_data['image_url'])
+    if 'image_url' in update_data and update_data['image_url'] != db_member.image_url:
+        stored_files.remove_references(db, [db_member.image_url])
+        stored_files.add_references(db, [update_data['image_url']])
     for field, value in update_data.items():
         setattr(db_member, field, value)
     db.add(db_member)
+    table_versions.bump(db, table_versions.TEAM_MEMBERS)
     db.commit()
     db.refresh(db_member)
     return db_member
 
 
 def delete_team_member(db: Session, db_member: models.TeamMember):
+    stored_files.remove_references(db, [db_member.image_url])
     db.delete(db_member)
+    table_versions.bump(db, table_versions.TEAM_MEMBERS)
     db.commit() 
\ No newline at end of file
@@ -0,0 +1,87 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import delete, select
+from datetime import datetime, timezone
+from typing import Dict
+import logging
+import math
+import models
+from core.config import settings
+from core.database import SessionLocal
+from core.trending import TrendingScores
+
+logger = logging.getLogger(__name__)
+
+# Persistence for the in-memory trending scores (core/trending.py).
+#
+# property_trending_scores holds one score per property as of its updated_at. Every worker
+# periodically merges the clicks it recorded since its last run into that table (decaying
+# the stored score to now, then adding) and reloads the merged table, so each worker serves
+# the trending clicks of all workers, and a restart resumes from the table.
+
+# Fed by track-click in routers/properties.py; read by GET /api/properties/trending/
+trending = TrendingScores(
+    half_life_seconds=settings.TRENDING_HALF_LIFE_HOURS * 3600,
+    top_k=settings.TRENDING_TOP_K,
+)
+
+
+def _decayed(score: float, updated_at: datetime, now: datetime) -> float:
+    if updated_at.tzinfo is None:
+        updated_at = updated_at.replace(tzinfo=timezone.utc)
+    return score * math.exp(-max((now - updated_at).total_seconds(), 0.0) / trending.tau)
+
+
+def _merge_pending(db: Session, pending: Dict[int, float], now: datetime):
+    table = models.PropertyTrendingScore
+    rows = {
+        row.property_id: row
+        for row in db.query(table).filter(table.property_id.in_(pending)).with_for_update()
+    }
+    live = set(db.execute(select(models.Property.id).where(models.Property.id.in_(pending))).scalars())
+    for property_id, score in pending.items():
+        row = rows.get(property_id)
+        if row is not None:
+            row.score = _decayed(row.score, row.updated_at, now) + score
+            row.updated_at = now
+        elif property_id in live:
+            db.add(table(property_id=property_id, score=score, updated_at=now))
+
+
+def persist_trending(db: Session) -> int:
+    """
+    Merge this worker's new clicks into property_trending_scores, drop scores that have decayed
+    below TRENDING_MIN_SCORE and reload the merged scores. Returns the number of scores loaded.
+    """
+    pending = trending.take_pending()
+    now = datetime.now(timezone.utc)
+    table = models.PropertyTrendingScore
+    try:
+        if pending:
+            _merge_pending(db, pending, now)
+            db.flush()
+        scores = {}
+        expired = []
+        for row in db.query(table).join(models.Property, models.Property.id == table.property_id):
+            score = _decayed(row.score, row.updated_at, now)
+            if score < settings.TRENDING_MIN_SCORE:
+                expired.append(row.property_id)
+            else:
+                scores[row.property_id] = score
+        if expired:
+            db.execute(delete(table).where(table.property_id.in_(expired)))
+        db.commit()
+    except Exception:
+        db.rollback()
+        trending.restore_pending(pending)  # Retried on the next run
+        raise
+    trending.load(scores)
+    return len(scores)
+
+
+def persist_trending_job() -> int:
+    """Entry point for the periodic job: one session per run."""
+    db = SessionLocal()
+    try:
+        return persist_trending(db)
+    finally:
+        db.close()
@@ -0,0 +1,99 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import delete, select
+from datetime import datetime, timedelta
+from typing import Optional
+import os
+import time
+import uuid
+import models
+from core import uploads
+from core.config import settings
+from core.database import SessionLocal
+
+# Resumable upload sessions.
+#
+# A session row records who is uploading what and how big it will be; the bytes themselves
+# go to a temporary file in the store directory named after the session id, whose size is the
+# received offset (core/uploads.py). Every chunk pushes expires_at UPLOAD_SESSION_TTL_HOURS
+# into the future; expire_sessions() deletes sessions idle past it together with their
+# files, and also any temporary file left behind by a process that died mid-upload.
+
+SESSION_PREFIX = "session-"
+
+
+def session_path(session_id: str) -> str:
+    return uploads.temp_path(f"{SESSION_PREFIX}{session_id}")
+
+
+def _expiry() -> datetime:
+    return datetime.utcnow() + timedelta(hours=settings.UPLOAD_SESSION_TTL_HOURS)
+
+
+def create_session(db: Session, user: models.User, upload_type: str, size: int) -> models.UploadSession:
+    upload_session = models.UploadSession(
+        id=uuid.uuid4().hex, user_id=user.id, upload_type=upload_type, size=size, expires_at=_expiry()
+    )
+    db.add(upload_session)
+    db.commit()
+    open(session_path(upload_session.id), "wb").close()
+    return upload_session
+
+
+def get_session(db: Session, session_id: str, user: models.User) -> Optional[models.UploadSession]:
+    """The live session with this id, if it belongs to the user (admins may resume anyone's)."""
+    upload_session = db.get(models.UploadSession, session_id)
+    if upload_session is None or upload_session.expires_at <= datetime.utcnow():
+        return None
+    if upload_session.user_id != user.id and user.role != models.Role.admin:
+        return None
+    return upload_session
+
+
+def touch_session(db: Session, upload_session: models.UploadSession):
+    upload_session.expires_at = _expiry()
+    db.commit()
+
+
+def delete_session(db: Session, upload_session: models.UploadSession):
+    """Drop the session and whatever is left of its file (finalising moves the file away first)."""
+    path = session_path(upload_session.id)
+    db.delete(upload_session)
+    db.commit()
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def expire_sessions(db: Session) -> int:
+    """Delete expired sessions, their files and stale orphan temporary files; returns the number of files removed."""
+    now = datetime.utcnow()
+    db.execute(delete(models.UploadSession).where(models.UploadSession.expires_at <= now))
+    db.commit()
+    live = set(db.execute(select(models.UploadSession.id)).scalars())
+    store = os.path.dirname(uploads.temp_path())
+    stale_before = time.time() - settings.UPLOAD_SESSION_TTL_HOURS * 3600
+    removed = 0
+    for name in os.listdir(store):
+        if not (name.startswith(".") and name.endswith(".part")):
+            continue
+        token = name[1:-len(".part")]
+        if token.startswith(SESSION_PREFIX) and token[len(SESSION_PREFIX):] in live:
+            continue
+        # An expired session's file, or a streamed upload abandoned by a process that died;
+        # untouched for a whole TTL, so never a transfer still in progress
+        path = os.path.join(store, name)
+        try:
+            if os.path.getmtime(path) < stale_before:
+                os.remove(path)
+                removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+def expire_sessions_job() -> int:
+    """Entry point for the periodic job: one session per run."""
+    db = SessionLocal()
+    try:
+        return expire_sessions(db)
+    finally:
+        db.close()
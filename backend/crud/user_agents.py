@@ -0,0 +1,77 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from typing import Dict, Iterable, Optional
+import hashlib
+import models
+from core.cache import QueryCache
+from core.config import settings
+
+# User-Agent dictionary: property_clicks stores user_agents.id instead of the string.
+#
+# Rows are append-only and an id never changes, so ids are cached per process with no TTL.
+# Only ids read back from committed rows are cached: an id inserted by the current
+# transaction would point nowhere if that transaction rolled back, so it is cached on the
+# next lookup instead.
+
+_table = models.UserAgent.__table__
+
+user_agent_ids = QueryCache(
+    "user_agent_ids",
+    max_entries=settings.USER_AGENT_CACHE_MAX_ENTRIES,
+    ttl_seconds=float("inf"),
+)
+
+
+def digest(user_agent: str) -> bytes:
+    return hashlib.blake2b(user_agent.encode("utf-8"), digest_size=16).digest()
+
+
+def _insert_missing(db: Session, user_agents: Dict[bytes, str]):
+    rows = [{"digest": key, "user_agent": value} for key, value in user_agents.items()]
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        insert = (sqlite if dialect == "sqlite" else postgresql).insert
+        db.execute(insert(_table).on_conflict_do_nothing(index_elements=[_table.c.digest]), rows)
+        return
+    # Portable fallback
+    for row in rows:
+        try:
+            with db.begin_nested():
+                db.execute(_table.insert().values(**row))
+        except IntegrityError:
+            pass  # Inserted concurrently
+
+
+def get_ids(db: Session, user_agents: Iterable[Optional[str]]) -> Dict[str, int]:
+    """Map User-Agent strings to their user_agents ids, inserting the new ones; the caller commits."""
+    ids: Dict[str, int] = {}
+    missing: Dict[bytes, str] = {}
+    for user_agent in set(user_agents):
+        if not user_agent:
+            continue
+        found, user_agent_id = user_agent_ids.get(user_agent)
+        if found:
+            ids[user_agent] = user_agent_id
+        else:
+            missing[digest(user_agent)] = user_agent
+    if not missing:
+        return ids
+
+    def lookup():
+        return db.execute(select(_table.c.digest, _table.c.id).where(_table.c.digest.in_(list(missing)))).all()
+
+    for row in lookup():
+        user_agent = missing.pop(row.digest)
+        ids[user_agent] = row.id
+        user_agent_ids.set(user_agent, row.id)
+    if missing:
+        _insert_missing(db, missing)
+        for row in lookup():
+            ids[missing[row.digest]] = row.id
+    return ids
+
+
+def get_id(db: Session, user_agent: Optional[str]) -> Optional[int]:
+    return get_ids(db, [user_agent]).get(user_agent) if user_agent else None
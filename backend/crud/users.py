@@ -3,6 +3,7 @@ from typing import List, Optional
 import models, schemas
 from auth import utils as auth_utils
 from models import Role
+from crud import table_versions
 
 class CRUDUser:
     def get_user(self, db: Session, user_id: int) -> Optional[models.User]:
@@ -34,12 +35,15 @@ class CRUDUser:
         for field, value in update_data.items():
             setattr(db_user, field, value)
         db.add(db_user)
+        # Property responses embed the assigned and creating users
+        table_versions.bump(db, table_versions.PROPERTIES)
         db.commit()
         db.refresh(db_user)
         return db_user
 
     def delete_user(self, db: Session, db_user: models.User):
         db.delete(db_user)
+        table_versions.bump(db, table_versions.PROPERTIES)
         db.commit()
 
 user = CRUDUser() 
\ No newline at end of file
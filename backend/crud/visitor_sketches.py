@@ -0,0 +1,118 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+import models
+from core.hll import HyperLogLog
+from utils.ip import unpack_ip
+
+# Unique visitor sketches.
+#
+# property_visitor_sketches holds one HyperLogLog per (property, UTC day) of the visitors who
+# clicked it, a visitor being an (ip_address, user_agent) pair as in the click filter. Clicks
+# are added to their sketch in the same transaction as their insert, so no background job is
+# needed, and the sketches outlive click archival. Distinct visitors over any date range are the
+# union of that range's daily sketches, a few kilobytes per day at most.
+
+_sketches = models.PropertyVisitorSketch.__table__
+
+# (property_id, clicked_at, ip_address, user_agent)
+Visit = Tuple[int, datetime, Optional[str], Optional[str]]
+
+
+def visitor_key(ip_address: Optional[str], user_agent: Optional[str]) -> str:
+    return f"{ip_address or ''}\x00{user_agent or ''}"
+
+
+def _utc_day(value: datetime) -> date:
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return value.date()
+
+
+def add_visits(db: Session, visits: Iterable[Visit]):
+    """Merge visits into their daily sketches; the caller commits."""
+    batch: Dict[Tuple[int, date], HyperLogLog] = defaultdict(HyperLogLog)
+    for property_id, clicked_at, ip_address, user_agent in visits:
+        batch[(property_id, _utc_day(clicked_at))].add(visitor_key(ip_address, user_agent))
+    if batch:
+        merge_sketches(db, batch)
+
+
+def merge_sketches(db: Session, sketches: Dict[Tuple[int, date], HyperLogLog]):
+    """Union each sketch into the stored one for its (property_id, day); the caller commits."""
+    property_ids = {pid for pid, _ in sketches}
+    days = {day for _, day in sketches}
+    stored = {
+        (row.property_id, row.day): row.sketch
+        for row in db.execute(
+            select(_sketches)
+            .where(_sketches.c.property_id.in_(property_ids), _sketches.c.day.in_(days))
+            .with_for_update()
+        )
+    }
+    for (property_id, day), sketch in sketches.items():
+        blob = stored.get((property_id, day))
+        if blob is None:
+            try:
+                with db.begin_nested():
+                    db.execute(_sketches.insert().values(property_id=property_id, day=day, sketch=sketch.to_bytes()))
+                continue
+            except IntegrityError:
+                # Another transaction created the row first: merge into it instead
+                blob = db.execute(
+                    select(_sketches.c.sketch)
+                    .where(_sketches.c.property_id == property_id, _sketches.c.day == day)
+                    .with_for_update()
+                ).scalar()
+        merged = HyperLogLog.from_bytes(blob).update(sketch)
+        db.execute(
+            _sketches.update()
+            .where(_sketches.c.property_id == property_id, _sketches.c.day == day)
+            .values(sketch=merged.to_bytes())
+        )
+
+
+def get_daily_sketches(db: Session, property_ids: List[int], start: date, end: date) -> Dict[int, Dict[date, HyperLogLog]]:
+    """The stored sketches of the given properties for the UTC days start..end (inclusive)."""
+    result: Dict[int, Dict[date, HyperLogLog]] = {pid: {} for pid in property_ids}
+    if not property_ids:
+        return result
+    for row in db.execute(
+        select(_sketches).where(
+            _sketches.c.property_id.in_(property_ids), _sketches.c.day >= start, _sketches.c.day <= end
+        )
+    ):
+        result[row.property_id][row.day] = HyperLogLog.from_bytes(row.sketch)
+    return result
+
+
+def rebuild_visitor_sketches(db: Session, start: Optional[date] = None, end: Optional[date] = None) -> int:
+    """
+    Merge the raw clicks of each day in start..end (default: every day with clicks) into the
+    sketches, one day per transaction. Merging is idempotent, so this is safe to re-run; use it
+    to backfill days clicked before the sketches existed. Returns the number of days processed.
+    """
+    clicks = models.PropertyClick
+    if start is None or end is None:
+        first, last = db.execute(select(func.min(clicks.clicked_at), func.max(clicks.clicked_at))).one()
+        if first is None:
+            return 0
+        start = start or _utc_day(first)
+        end = end or _utc_day(last)
+    processed = 0
+    day = start
+    while day <= end:
+        lower = datetime.combine(day, time.min)
+        rows = db.execute(
+            select(clicks.property_id, clicks.clicked_at, clicks.ip, models.UserAgent.user_agent)
+            .outerjoin(models.UserAgent, models.UserAgent.id == clicks.user_agent_id)
+            .where(clicks.clicked_at >= lower, clicks.clicked_at < lower + timedelta(days=1))
+        ).yield_per(5000)
+        add_visits(db, ((row.property_id, row.clicked_at, unpack_ip(row.ip), row.user_agent) for row in rows))
+        db.commit()
+        processed += 1
+        day += timedelta(days=1)
+    return processed
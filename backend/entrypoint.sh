@@ -11,4 +11,6 @@ python seed_data.py
 
 # Start the application
 echo "Starting server with direct Uvicorn call for debugging..."
-python -m uvicorn main:app --host 0.0.0.0 --port 8000 --log-level debug
\ No newline at end of file
+# Client addresses come from X-Forwarded-For only when the request is from the nginx proxy
+# (FORWARDED_ALLOW_IPS, set in docker-compose.yml); anyone else gets the socket address
+python -m uvicorn main:app --host 0.0.0.0 --port 8000 --proxy-headers --forwarded-allow-ips "${FORWARDED_ALLOW_IPS:-127.0.0.1}" --log-level debug
\ No newline at end of file
@@ -19,6 +19,12 @@ try:
 except ImportError as e:
     logger.error(f"Failed to import CORSMiddleware: {e}")
     raise
+try:
+    from contextlib import asynccontextmanager
+    logger.info("Imported asynccontextmanager")
+except ImportError as e:
+    logger.error(f"Failed to import asynccontextmanager: {e}")
+    raise
 try:
     from core.config import settings  # settings needed early
     logger.info("Imported settings from core.config")
@@ -34,11 +40,55 @@ except ImportError as e:
 # Uncomment the below line if using SQLAlchemy and Alembic migrations
 # models.Base.metadata.create_all(bind=engine)
 
+@asynccontextmanager
+async def lifespan(app):
+    from core.jobs import PeriodicJob
+    jobs = []
+    if settings.CLICK_ROLLUP_INTERVAL_SECONDS > 0:
+        from crud.click_rollups import roll_up_clicks_job
+        jobs.append(PeriodicJob("click-rollups", settings.CLICK_ROLLUP_INTERVAL_SECONDS, roll_up_clicks_job))
+    if settings.CLICK_RETENTION_DAYS > 0 and settings.CLICK_RETENTION_INTERVAL_SECONDS > 0:
+        from crud.click_retention import archive_clicks_job
+        jobs.append(PeriodicJob("click-retention", settings.CLICK_RETENTION_INTERVAL_SECONDS, archive_clicks_job))
+    if settings.UPLOAD_GC_INTERVAL_SECONDS > 0:
+        from crud.stored_files import collect_unreferenced_files_job
+        jobs.append(PeriodicJob("upload-gc", settings.UPLOAD_GC_INTERVAL_SECONDS, collect_unreferenced_files_job))
+    if settings.UPLOAD_SESSION_CLEANUP_SECONDS > 0:
+        from crud.upload_sessions import expire_sessions_job
+        jobs.append(PeriodicJob("upload-sessions", settings.UPLOAD_SESSION_CLEANUP_SECONDS, expire_sessions_job))
+    from crud.trending import persist_trending_job
+    trending_job = PeriodicJob("trending", settings.TRENDING_PERSIST_SECONDS, persist_trending_job)
+    trending_job.run_once()  # Serve the persisted scores from the first request
+    jobs.append(trending_job)
+    for job in jobs:
+        job.start()
+    # Buffered click ingestion runs a background flusher that must drain before exit
+    click_buffer = None
+    if settings.CLICK_INGEST_MODE == "buffered":
+        from crud.property_clicks import click_buffer
+        click_buffer.start()
+    yield
+    if click_buffer is not None:
+        click_buffer.stop()
+    for job in jobs:
+        job.stop()
+    trending_job.run_once()  # Keep the clicks recorded since the last run
+    from core.images import shutdown_pool
+    shutdown_pool()  # Image derivative processes, if any were started
+
+# FAST_JSON opts into orjson rendering (and the prebuilt serializers in core/serialization.py)
+app_options = {"lifespan": lifespan}
+if settings.FAST_JSON:
+    from core.serialization import ORJSONResponse
+    app_options["default_response_class"] = ORJSONResponse
+    logger.info("Fast JSON mode enabled: orjson default response class.")
+
 logger.info("Initializing FastAPI app...")
 app = FastAPI(
     title="Habitat API",
     description="API for the Habitat Real Estate Application",
-    version="0.1.0"
+    version="0.1.0",
+    **app_options
 )
 logger.info("FastAPI app initialized.")
 
@@ -61,6 +111,20 @@ app.add_middleware(
 )
 logger.info("CORS middleware added.")
 
+from core.compression import CompressionMiddleware
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.COMPRESSION_MINIMUM_SIZE,
+    offload_size=settings.COMPRESSION_OFFLOAD_SIZE,
+)
+logger.info("Compression middleware added.")
+
+if settings.SQL_QUERY_BUDGET > 0:
+    from core.database import engine
+    from core.query_guard import QueryBudgetMiddleware
+    app.add_middleware(QueryBudgetMiddleware, engine=engine, max_queries=settings.SQL_QUERY_BUDGET)
+    logger.info(f"SQL query budget middleware added ({settings.SQL_QUERY_BUDGET} statements per request).")
+
 @app.get("/")
 def read_root():
     logger.debug("Root endpoint / called")
@@ -99,10 +163,10 @@ logger.info("All routers included.")
 # Add logic for serving static files if backend handles uploads directly
 logger.info("Setting up static files...")
 try:
-    from fastapi.staticfiles import StaticFiles
-    logger.info("Imported StaticFiles")
+    from core.static import UploadStaticFiles
+    logger.info("Imported UploadStaticFiles")
 except ImportError as e:
-    logger.error(f"Failed to import StaticFiles: {e}")
+    logger.error(f"Failed to import UploadStaticFiles: {e}")
     raise
 try:
     import os
@@ -119,6 +183,6 @@ logger.debug(f"Static files directory: {static_files_directory}")
 # Ensure the static directory itself exists, though UPLOAD_DIR creation already implies its parent exists.
 # os.makedirs(static_files_directory, exist_ok=True) # This line is actually not needed if UPLOAD_DIR is within static_files_directory
 
-app.mount("/static", StaticFiles(directory=static_files_directory), name="static")
+app.mount("/static", UploadStaticFiles(directory=static_files_directory), name="static")
 logger.info("Static files mounted.")
 logger.info("main.py setup complete.")
\ No newline at end of file
@@ -0,0 +1,127 @@
+"""Operational maintenance commands for the Habitat database.
+
+Usage (from the backend directory):
+
+    python maintenance.py reconcile-click-counts
+    python maintenance.py rollup-clicks
+    python maintenance.py archive-clicks [--days N]
+    python maintenance.py import-click-archive --start YYYY-MM-DD --end YYYY-MM-DD
+    python maintenance.py rebuild-visitor-sketches [--start YYYY-MM-DD] [--end YYYY-MM-DD]
+    python maintenance.py build-image-variants [--dir properties|team|general]
+    python maintenance.py reconcile-upload-refs
+    python maintenance.py collect-uploads [--grace-hours H]
+
+Each command is safe to re-run.
+"""
+
+import argparse
+from datetime import date
+
+from sqlalchemy.orm import Session
+
+from core.database import SessionLocal
+from crud.property_clicks import reconcile_click_counters
+from crud.click_rollups import roll_up_clicks
+from crud.click_retention import archive_clicks, import_click_archive
+from crud.visitor_sketches import rebuild_visitor_sketches
+from crud.image_variants import build_missing_variants
+from crud.stored_files import collect_unreferenced_files, reconcile_references
+from core.config import settings
+
+
+def reconcile_click_counts(db: Session, args):
+    drifted = reconcile_click_counters(db)
+    print(f"Recomputed click counters from the click rollups and raw clicks ({drifted} properties had drifted).")
+
+
+def rollup_clicks(db: Session, args):
+    processed = roll_up_clicks(db)
+    print(f"Rolled up {processed} new clicks into the hourly and daily tables.")
+
+
+def archive_old_clicks(db: Session, args):
+    days = settings.CLICK_RETENTION_DAYS if args.days is None else args.days
+    if days <= 0:
+        print("Retention is disabled; pass --days or set CLICK_RETENTION_DAYS.")
+        return
+    archived = archive_clicks(db, retention_days=days)
+    print(f"Archived and deleted {archived} clicks older than {days} days (archive: {settings.CLICK_ARCHIVE_DIR}).")
+
+
+def import_archive(db: Session, args):
+    imported, skipped = import_click_archive(db, args.start, args.end)
+    print(f"Imported {imported} archived clicks from {args.start} to {args.end} ({skipped} already present or orphaned).")
+
+
+def rebuild_sketches(db: Session, args):
+    days = rebuild_visitor_sketches(db, args.start, args.end)
+    print(f"Merged the raw clicks of {days} days into the visitor sketches.")
+
+
+def build_image_variants(db: Session, args):
+    processed = build_missing_variants(db, args.dir)
+    print(f"Rendered derivatives of {processed} uploaded images.")
+
+
+def reconcile_upload_refs(db: Session, args):
+    drifted = reconcile_references(db)
+    print(f"Recounted stored upload references ({drifted} files had drifted).")
+
+
+def collect_uploads(db: Session, args):
+    removed = collect_unreferenced_files(db, args.grace_hours)
+    print(f"Deleted {removed} unreferenced stored uploads and their derivatives.")
+
+
+def _archive_arguments(parser):
+    parser.add_argument("--days", type=int, help="Retention in days (default: CLICK_RETENTION_DAYS)")
+
+
+def _import_arguments(parser):
+    parser.add_argument("--start", type=date.fromisoformat, required=True, help="First UTC day to restore")
+    parser.add_argument("--end", type=date.fromisoformat, required=True, help="Last UTC day to restore (inclusive)")
+
+
+def _rebuild_arguments(parser):
+    parser.add_argument("--start", type=date.fromisoformat, help="First UTC day (default: the oldest click)")
+    parser.add_argument("--end", type=date.fromisoformat, help="Last UTC day, inclusive (default: the newest click)")
+
+
+def _variants_arguments(parser):
+    parser.add_argument("--dir", help="Only this subdirectory of UPLOAD_DIR (default: all uploads)")
+
+
+def _collect_arguments(parser):
+    parser.add_argument("--grace-hours", type=float, help="Minimum hours unreferenced (default: UPLOAD_GC_GRACE_HOURS)")
+
+
+COMMANDS = {
+    "reconcile-click-counts": (reconcile_click_counts, "Recompute properties.click_count/last_clicked_at from the rollups and raw clicks", None),
+    "rollup-clicks": (rollup_clicks, "Fold new property_clicks rows into the hourly/daily rollups now", None),
+    "archive-clicks": (archive_old_clicks, "Archive raw clicks older than the retention period and delete them", _archive_arguments),
+    "import-click-archive": (import_archive, "Re-insert archived clicks for a day range with their original ids", _import_arguments),
+    "rebuild-visitor-sketches": (rebuild_sketches, "Backfill the daily unique-visitor sketches from raw clicks", _rebuild_arguments),
+    "build-image-variants": (build_image_variants, "Render derivatives of uploaded images that have none yet", _variants_arguments),
+    "reconcile-upload-refs": (reconcile_upload_refs, "Recompute stored_files.ref_count from the image URL columns", None),
+    "collect-uploads": (collect_uploads, "Delete stored uploads that are no longer referenced", _collect_arguments),
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Habitat maintenance commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for name, (_, help_text, add_arguments) in COMMANDS.items():
+        subparser = subparsers.add_parser(name, help=help_text)
+        if add_arguments is not None:
+            add_arguments(subparser)
+    args = parser.parse_args(argv)
+
+    db: Session = SessionLocal()
+    try:
+        COMMANDS[args.command][0](db, args)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,11 @@
-from sqlalchemy import (Boolean, Column, Integer, String, Text, Float, DateTime, 
-                          ForeignKey, JSON, Enum)
+from sqlalchemy import (Boolean, Column, Integer, BigInteger, String, Text, Float, Date, DateTime, 
+                          ForeignKey, JSON, Enum, Index, LargeBinary)
 from sqlalchemy.orm import relationship, declarative_base
 from sqlalchemy.sql import func
 import enum
+from typing import Dict, Optional
+from utils.ip import unpack_ip
+from utils.media import srcset as build_srcset
 
 # Using declarative_base() from SQLAlchemy
 Base = declarative_base()
@@ -55,8 +58,11 @@ class Property(Base):
     listing_type = Column(String, nullable=True)
     status = Column(String, default="available")  # e.g., 'available', 'sold', 'pending'
     image_url = Column(String, nullable=True) 
+    # image_url's path under UPLOAD_DIR when it is a local upload, which keys its derivatives (as on PropertyImage)
+    image_upload_path = Column(String, nullable=True)
     latitude = Column(Float, nullable=True)
     longitude = Column(Float, nullable=True)
+    geo_cell = Column(BigInteger, nullable=True, index=True) # Morton-coded lat/lng grid cell for spatial lookups; see utils/geo.py
     is_featured = Column(Boolean, default=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
@@ -72,7 +78,55 @@ class Property(Base):
     created_by = relationship("User", foreign_keys=[created_by_user_id], back_populates="created_properties")
 
     images = relationship("PropertyImage", back_populates="property", cascade="all, delete-orphan")
+    image_variants = relationship(
+        "ImageVariant",
+        primaryjoin="foreign(ImageVariant.source) == Property.image_upload_path",
+        viewonly=True,
+        order_by="ImageVariant.width",
+    )
     clicks = relationship("PropertyClick", back_populates="property") # Relationship to PropertyClick
+    # Denormalised from property_clicks by create_property_click; recompute (rollups + raw clicks) with
+    # `python maintenance.py reconcile-click-counts`
+    click_count = Column(Integer, nullable=False, default=0, server_default="0")
+    last_clicked_at = Column(DateTime(timezone=True), nullable=True)
+
+    @property
+    def image_srcset(self) -> Dict[str, str]:
+        return build_srcset((v.content_type, v.width, v.path) for v in self.image_variants)
+
+    __table_args__ = (
+        # Serve keyset pagination ordered by (price, id) and (click_count, id); see CRUDProperty.get_properties_page
+        Index("ix_properties_price_id", "price", "id"),
+        Index("ix_properties_click_count_id", "click_count", "id"),
+    )
+
+class PropertyCluster(Base):
+    # Precomputed map-pin clusters, one row per occupied grid cell per level; see crud/property_clusters.py
+    __tablename__ = "property_clusters"
+
+    level = Column(Integer, primary_key=True)
+    cell = Column(BigInteger, primary_key=True) # Property.geo_cell truncated to `level` bits per axis
+    count = Column(Integer, nullable=False, default=0)
+    lat_sum = Column(Float, nullable=False, default=0.0)
+    lng_sum = Column(Float, nullable=False, default=0.0)
+    min_price = Column(Float, nullable=True)
+    max_price = Column(Float, nullable=True)
+
+class TableVersion(Base):
+    # Write counters behind the ETags of public read endpoints; see crud/table_versions.py
+    __tablename__ = "table_versions"
+
+    name = Column(String, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), nullable=True)
+
+class PropertyTrendingScore(Base):
+    # Decayed click scores shared by all workers; see crud/trending.py
+    __tablename__ = "property_trending_scores"
+
+    property_id = Column(Integer, ForeignKey("properties.id", ondelete="CASCADE"), primary_key=True)
+    score = Column(Float, nullable=False) # As of updated_at
+    updated_at = Column(DateTime(timezone=True), nullable=False)
 
 class PropertyImage(Base):
     __tablename__ = "property_images"
@@ -81,9 +135,65 @@ class PropertyImage(Base):
     property_id = Column(Integer, ForeignKey("properties.id"), nullable=False)
     image_url = Column(String, nullable=False)
     order = Column(Integer, default=0) # For ordering images in a gallery
+    # image_url's path under UPLOAD_DIR when it is a local upload (utils/media.py), which keys its derivatives
+    upload_path = Column(String, nullable=True, index=True)
+
+    variants = relationship(
+        "ImageVariant",
+        primaryjoin="foreign(ImageVariant.source) == PropertyImage.upload_path",
+        viewonly=True,
+        order_by="ImageVariant.width",
+    )
+
+    # Defined before the `property` relationship below shadows the builtin in this class body
+    @property
+    def srcset(self) -> Dict[str, str]:
+        return build_srcset((v.content_type, v.width, v.path) for v in self.variants)
 
     property = relationship("Property", back_populates="images")
 
+# Uploaded files in the content-addressed store (core/uploads.py), with the number of
+# property/team rows whose image URLs point at them; see crud/stored_files.py
+class StoredFile(Base):
+    __tablename__ = "stored_files"
+
+    id = Column(Integer, primary_key=True)
+    digest = Column(String(64), nullable=False, unique=True) # SHA-256, hex
+    path = Column(String, nullable=False, unique=True) # Under UPLOAD_DIR
+    content_type = Column(String, nullable=False)
+    size = Column(BigInteger, nullable=False)
+    width = Column(Integer, nullable=True) # Set once derivatives are rendered
+    height = Column(Integer, nullable=True)
+    ref_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # UTC time ref_count last became 0 (or of the latest upload); collected after UPLOAD_GC_GRACE_HOURS
+    unreferenced_since = Column(DateTime, nullable=True, index=True)
+
+# In-progress resumable uploads; the received bytes are in a temporary file named after the id
+# (see crud/upload_sessions.py)
+class UploadSession(Base):
+    __tablename__ = "upload_sessions"
+
+    id = Column(String(32), primary_key=True) # Random hex token
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    upload_type = Column(String, nullable=False)
+    size = Column(BigInteger, nullable=False) # Declared total, bytes
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(DateTime, nullable=False, index=True) # UTC; pushed back by every chunk
+
+# Resized/re-encoded copies of an uploaded image (core/images.py), keyed by the original's path
+# under UPLOAD_DIR; see crud/image_variants.py
+class ImageVariant(Base):
+    __tablename__ = "image_variants"
+
+    id = Column(Integer, primary_key=True)
+    source = Column(String, nullable=False, index=True)
+    path = Column(String, nullable=False, unique=True) # Under UPLOAD_DIR
+    content_type = Column(String, nullable=False)
+    width = Column(Integer, nullable=False)
+    height = Column(Integer, nullable=False)
+    size = Column(Integer, nullable=False) # Bytes
+
 class TeamMember(Base):
     __tablename__ = "team_members"
 
@@ -116,20 +226,78 @@ class Contact(Base):
 # and add constraints based on requirements.
 # Consider using Alembic for database migrations. 
 
+# Distinct User-Agent strings, referenced by property_clicks.user_agent_id; see crud/user_agents.py
+class UserAgent(Base):
+    __tablename__ = "user_agents"
+
+    id = Column(Integer, primary_key=True)
+    digest = Column(LargeBinary(16), nullable=False, unique=True) # blake2b-128 of user_agent; a fixed-size unique key
+    user_agent = Column(Text, nullable=False)
+
 # New Model for Property Clicks
 class PropertyClick(Base):
     __tablename__ = "property_clicks"
 
     id = Column(Integer, primary_key=True, index=True)
-    property_id = Column(Integer, ForeignKey("properties.id"), nullable=False)
+    property_id = Column(Integer, ForeignKey("properties.id"), nullable=False) # Indexed by ix_property_clicks_property_id_clicked_at
     clicked_at = Column(DateTime(timezone=True), server_default=func.now())
-    ip_address = Column(String, nullable=True)
-    user_agent = Column(String, nullable=True)
+    # Stored compactly: the IP packed to 4/16 bytes (utils/ip.py) and the User-Agent as an id
+    # into user_agents. Write them through crud/property_clicks.py; read the ip_address and
+    # user_agent properties below.
+    ip = Column(LargeBinary(16), nullable=True)
+    user_agent_id = Column(Integer, ForeignKey("user_agents.id"), nullable=True)
     # We could add a user_id if we want to track clicks by logged-in users specifically
     # user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
 
+    # Defined before the `property` relationship below shadows the builtin in this class body
+    @property
+    def ip_address(self) -> Optional[str]:
+        return unpack_ip(self.ip)
+
+    @property
+    def user_agent(self) -> Optional[str]:
+        return self.agent.user_agent if self.agent is not None else None
+
     property = relationship("Property", back_populates="clicks")
+    agent = relationship("UserAgent")
     # user = relationship("User") # If user_id is added
 
+    __table_args__ = (
+        # Per-property time ranges: daily unique-IP recounts in crud/click_rollups.py
+        Index("ix_property_clicks_property_id_clicked_at", "property_id", "clicked_at"),
+    )
+
+# Click rollups, maintained incrementally from property_clicks by crud/click_rollups.py
+class PropertyClickHourly(Base):
+    __tablename__ = "property_click_hourly"
+
+    property_id = Column(Integer, ForeignKey("properties.id", ondelete="CASCADE"), primary_key=True)
+    hour = Column(DateTime, primary_key=True, index=True) # UTC, truncated to the hour
+    count = Column(Integer, nullable=False, default=0)
+
+class PropertyClickDaily(Base):
+    __tablename__ = "property_click_daily"
+
+    property_id = Column(Integer, ForeignKey("properties.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True, index=True) # UTC day
+    count = Column(Integer, nullable=False, default=0)
+    unique_ips = Column(Integer, nullable=False, default=0)
+
+class PropertyVisitorSketch(Base):
+    # HyperLogLog of the distinct visitors of a property on a UTC day; see crud/visitor_sketches.py
+    __tablename__ = "property_visitor_sketches"
+
+    property_id = Column(Integer, ForeignKey("properties.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True, index=True)
+    sketch = Column(LargeBinary, nullable=False) # core.hll.HyperLogLog.to_bytes()
+
+class RollupState(Base):
+    # High-water marks of incremental jobs, e.g. the last property_clicks.id rolled up
+    __tablename__ = "rollup_state"
+
+    name = Column(String, primary_key=True)
+    last_id = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), nullable=True)
+
 # If you have a different base or metadata object, ensure this model uses it.
 # For example, if you are using Base = declarative_base() from a different file. 
\ No newline at end of file
@@ -59,6 +59,13 @@ try:
 except ImportError as e:
     logger.error(f"Failed to import auth_utils: {e}")
     raise
+try:
+    from core import serialization
+    from core.config import settings
+    logger.info("Imported serialization, settings from core")
+except ImportError as e:
+    logger.error(f"Failed to import serialization, settings from core: {e}")
+    raise
 try:
     from utils.pdf import generate_contact_pdf
     logger.info("Imported generate_contact_pdf from utils.pdf")
@@ -87,6 +94,8 @@ def list_submissions(skip: int = 0, limit: int = 100, db: Session = Depends(get_
     try:
         submissions = crud_contact.get_contacts(db, current_user, skip, limit)
         logger.debug(f"Retrieved {len(submissions)} contact submissions.")
+        if settings.FAST_JSON:
+            return serialization.contact_serializer.response(submissions, many=True)
         return submissions
     except Exception as e:
         logger.error(f"Error in list_submissions: {e}", exc_info=True)
@@ -101,6 +110,8 @@ def get_submission(submission_id: int, db: Session = Depends(get_db), current_us
             logger.warn(f"Contact submission with id {submission_id} not found.")
             raise HTTPException(status_code=404, detail="Submission not found")
         logger.debug(f"Retrieved contact submission: {db_contact.subject}")
+        if settings.FAST_JSON:
+            return serialization.contact_serializer.response(db_contact)
         return db_contact
     except HTTPException:
         raise
@@ -5,11 +5,18 @@ logger.setLevel(logging.DEBUG)
 logger.info("Loading properties router...")
 
 try:
-    from fastapi import APIRouter, Depends, HTTPException, status, Request
+    from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
+    from fastapi.responses import JSONResponse
     logger.info("Imported from fastapi")
 except ImportError as e:
     logger.error(f"Failed to import from fastapi: {e}")
     raise
+try:
+    from pydantic import TypeAdapter
+    logger.info("Imported TypeAdapter from pydantic")
+except ImportError as e:
+    logger.error(f"Failed to import TypeAdapter from pydantic: {e}")
+    raise
 try:
     from sqlalchemy.orm import Session
     logger.info("Imported Session from sqlalchemy.orm")
@@ -17,10 +24,16 @@ except ImportError as e:
     logger.error(f"Failed to import Session from sqlalchemy.orm: {e}")
     raise
 try:
-    from typing import List, Optional
-    logger.info("Imported List, Optional from typing")
+    from datetime import date, datetime, timedelta
+    logger.info("Imported date, datetime, timedelta")
+except ImportError as e:
+    logger.error(f"Failed to import datetime: {e}")
+    raise
+try:
+    from typing import List, Optional, Union
+    logger.info("Imported List, Optional, Union from typing")
 except ImportError as e:
-    logger.error(f"Failed to import List, Optional from typing: {e}")
+    logger.error(f"Failed to import List, Optional, Union from typing: {e}")
     raise
 try:
     from core.database import get_db
@@ -41,11 +54,48 @@ except ImportError as e:
     logger.error(f"Failed to import crud_property: {e}")
     raise
 try:
-    from crud.property_clicks import create_property_click
-    logger.info("Imported create_property_click from crud.property_clicks")
+    from utils import geo
+    logger.info("Imported geo from utils")
+except ImportError as e:
+    logger.error(f"Failed to import geo: {e}")
+    raise
+try:
+    from utils.pagination import InvalidCursor
+    logger.info("Imported InvalidCursor from utils.pagination")
+except ImportError as e:
+    logger.error(f"Failed to import InvalidCursor: {e}")
+    raise
+try:
+    from crud.properties import listing_cache, facets_cache
+    logger.info("Imported listing_cache, facets_cache from crud.properties")
+except ImportError as e:
+    logger.error(f"Failed to import property caches: {e}")
+    raise
+try:
+    from crud import click_rollups, property_clusters, table_versions
+    logger.info("Imported click_rollups, property_clusters, table_versions from crud")
+except ImportError as e:
+    logger.error(f"Failed to import click_rollups, property_clusters, table_versions: {e}")
+    raise
+try:
+    from crud.property_clicks import create_property_click, click_buffer, click_filter
+    from core.click_buffer import ClickEvent
+    logger.info("Imported create_property_click, click_buffer, click_filter from crud.property_clicks")
 except ImportError as e:
     logger.error(f"Failed to import create_property_click: {e}")
     raise
+try:
+    from crud.trending import trending
+    logger.info("Imported trending from crud.trending")
+except ImportError as e:
+    logger.error(f"Failed to import trending: {e}")
+    raise
+try:
+    from core import compression, conditional, serialization
+    logger.info("Imported compression, conditional, serialization from core")
+except ImportError as e:
+    logger.error(f"Failed to import compression, conditional, serialization from core: {e}")
+    raise
 try:
     from auth import utils as auth_utils
     logger.info("Imported utils as auth_utils from auth")
@@ -104,10 +154,7 @@ def get_optional_current_user(db: Session = Depends(get_db), token: Optional[str
             return None
     return None
 
-@router.get("/", response_model=List[schemas.Property]) # Replace PropertySchema with actual schemas.Property
-def read_properties(
-    skip: int = 0,
-    limit: int = 20,
+def get_property_filters(
     search: Optional[str] = None,
     property_type: Optional[str] = None,
     listing_type: Optional[str] = None,
@@ -119,33 +166,247 @@ def read_properties(
     max_bathrooms: Optional[int] = None,
     min_area: Optional[float] = None,
     max_area: Optional[float] = None,
+    bbox: Optional[str] = None, # Viewport as "west,south,east,north" (Leaflet toBBoxString order)
+    near: Optional[str] = None, # Centre point as "lat,lng"; requires radius_km. Offset pages are nearest first; cursor pages keep order_by
+    radius_km: Optional[float] = None,
+) -> dict:
+    """Listing filter query parameters shared by the list and facets endpoints, as CRUDProperty keyword arguments."""
+    try:
+        bbox_value = geo.parse_bbox(bbox) if bbox else None
+        near_value = geo.parse_point(near) if near else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid geographic filter: {e}")
+    if near_value is not None and (radius_km is None or radius_km <= 0):
+        raise HTTPException(status_code=400, detail="near requires a positive radius_km.")
+    return dict(
+        search=search, property_type=property_type,
+        listing_type=listing_type, min_price=min_price, max_price=max_price,
+        min_bedrooms=min_bedrooms, max_bedrooms=max_bedrooms,
+        min_bathrooms=min_bathrooms, max_bathrooms=max_bathrooms,
+        min_area=min_area, max_area=max_area,
+        bbox=bbox_value, near=near_value, radius_km=radius_km,
+    )
+
+_summary_list_adapter = TypeAdapter(List[schemas.PropertySummary])
+
+def _listing_cache_key(keyset: bool, skip: int, limit: int, cursor: Optional[str], order_by: str, filters: dict):
+    normalized = dict(filters)
+    if normalized.get("search"):
+        # Search matching is case-insensitive, so these spellings share one entry
+        normalized["search"] = " ".join(normalized["search"].lower().split())
+    paging = ("cursor", cursor, order_by) if keyset else ("offset", skip)
+    return paging + (limit, tuple(sorted(normalized.items())))
+
+def _dump_summaries(properties: List[models.Property]) -> bytes:
+    if settings.FAST_JSON:
+        return serialization.property_summary_serializer.dumps_many(properties)
+    return _summary_list_adapter.dump_json(_summary_list_adapter.validate_python(properties, from_attributes=True))
+
+def _dump_page(properties: List[models.Property], next_cursor: Optional[str]) -> bytes:
+    if settings.FAST_JSON:
+        items = serialization.property_summary_serializer.to_python_many(properties)
+        return serialization.dumps({"items": items, "next_cursor": next_cursor})
+    page = {"items": properties, "next_cursor": next_cursor}
+    return schemas.PropertyPage.model_validate(page, from_attributes=True).model_dump_json().encode()
+
+@router.get("/", response_model=Union[List[schemas.PropertySummary], schemas.PropertyPage])
+def read_properties(
+    request: Request,
+    response: Response,
+    skip: int = 0,
+    limit: int = 20,
+    pagination: str = "offset", # "offset" returns a plain list; "cursor" returns a PropertyPage envelope
+    cursor: Optional[str] = None, # Opaque next_cursor from the previous page (implies pagination=cursor)
+    order_by: str = "newest", # Keyset ordering: newest, price_asc, price_desc or popular
+    filters: dict = Depends(get_property_filters),
     db: Session = Depends(get_db),
     current_user: Optional[models.User] = Depends(get_optional_current_user) # Use optional user
 ):
-    logger.debug(f"GET /api/properties/ called with params: skip={skip}, limit={limit}, search='{search}', ...")
+    logger.debug(f"GET /api/properties/ called with params: skip={skip}, limit={limit}, pagination={pagination}, order_by={order_by}, filters={filters}")
+    if pagination not in ("offset", "cursor"):
+        raise HTTPException(status_code=400, detail="Invalid pagination mode. Valid modes are offset, cursor.")
+    keyset = pagination == "cursor" or bool(cursor)
+
+    query_key = _listing_cache_key(keyset, skip, limit, cursor, order_by, filters)
+    table_version = table_versions.with_click_window(table_versions.get_version(db, table_versions.PROPERTIES))
+    scope = (current_user.id, current_user.role.value) if current_user else None
+    etag = conditional.make_etag(table_version.version, "list", table_version.window, scope, query_key)
+    validators = dict(last_modified=table_version.updated_at, private=current_user is not None, vary="Authorization")
+    if conditional.is_not_modified(request, etag, table_version.updated_at):
+        logger.debug("Properties list not modified since the client's copy.")
+        return conditional.not_modified(etag, **validators)
+    conditional.set_validators(response, etag, **validators)
+
+    # Anonymous responses are identical for identical filters, so serve them from the
+    # listing cache as ready-made JSON bytes (with their compressed variants); authenticated
+    # results depend on the user's role. Keying on the table version keeps workers from
+    # serving bodies older than the ETag.
+    cache_key = None
+    if current_user is None:
+        cache_key = (table_version.version, table_version.window) + query_key
+        found, variants = listing_cache.get(cache_key)
+        if found:
+            logger.debug("Serving properties list from listing cache.")
+            cached = compression.variant_response(variants, request)
+            conditional.set_validators(cached, etag, **validators)
+            return cached
+        cache_version = listing_cache.version
+
     try:
-        properties = crud_property.get_properties(
-            db, skip=skip, limit=limit, search=search, property_type=property_type,
-            listing_type=listing_type, min_price=min_price, max_price=max_price,
-            min_bedrooms=min_bedrooms, max_bedrooms=max_bedrooms,
-            min_bathrooms=min_bathrooms, max_bathrooms=max_bathrooms,
-            min_area=min_area, max_area=max_area, current_user=current_user # Pass current_user
-        )
-        logger.debug(f"Retrieved {len(properties)} properties.")
-        return properties
+        if keyset:
+            properties, next_cursor = crud_property.get_properties_page(
+                db, cursor=cursor, limit=limit, order_by=order_by, current_user=current_user, **filters
+            )
+            logger.debug(f"Retrieved {len(properties)} properties (keyset page, has_next={next_cursor is not None}).")
+            if cache_key is None and not settings.FAST_JSON:
+                return {"items": properties, "next_cursor": next_cursor}
+            body = _dump_page(properties, next_cursor)
+        else:
+            properties = crud_property.get_properties(
+                db, skip=skip, limit=limit, current_user=current_user, **filters # Pass current_user
+            )
+            logger.debug(f"Retrieved {len(properties)} properties.")
+            if cache_key is None and not settings.FAST_JSON:
+                return properties
+            body = _dump_summaries(properties)
+        if cache_key is None:
+            fresh = Response(content=body, media_type="application/json")
+        else:
+            variants = compression.CompressedVariants(body)
+            listing_cache.set(cache_key, variants, version=cache_version)
+            fresh = compression.variant_response(variants, request)
+        conditional.set_validators(fresh, etag, **validators)
+        return fresh
+    except InvalidCursor as e:
+        logger.warn(f"Rejected keyset pagination request: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error in read_properties: {e}", exc_info=True)
         raise
 
+@router.get("/analytics/", response_model=schemas.ClickAnalytics)
+def read_click_analytics(
+    start: Optional[date] = None, # Inclusive UTC day; defaults to 29 days before end
+    end: Optional[date] = None, # Inclusive UTC day; defaults to today
+    granularity: str = "day", # "day" or "hour"
+    property_id: Optional[int] = None, # One property's series; omit for the top properties
+    top: int = 10,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(auth_utils.require_manager)
+):
+    logger.debug(f"GET /api/properties/analytics/ called by user {current_user.username}: start={start}, end={end}, granularity={granularity}, property_id={property_id}, top={top}")
+    if granularity not in ("day", "hour"):
+        raise HTTPException(status_code=400, detail="Invalid granularity. Valid values are day, hour.")
+    end = end or datetime.utcnow().date()
+    start = start or end - timedelta(days=29)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    if granularity == "hour" and (end - start).days + 1 > settings.CLICK_ANALYTICS_MAX_HOURLY_DAYS:
+        raise HTTPException(status_code=400, detail=f"Hourly analytics cover at most {settings.CLICK_ANALYTICS_MAX_HOURLY_DAYS} days")
+    if not 1 <= top <= 100:
+        raise HTTPException(status_code=400, detail="top must be between 1 and 100")
+    try:
+        return click_rollups.get_click_analytics(
+            db, start=start, end=end, granularity=granularity, property_id=property_id, top=top
+        )
+    except Exception as e:
+        logger.error(f"Error in read_click_analytics: {e}", exc_info=True)
+        raise
+
+@router.get("/click-stats/")
+def read_click_ingest_stats(current_user: models.User = Depends(auth_utils.require_manager)):
+    logger.debug(f"GET /api/properties/click-stats/ called by user {current_user.username}")
+    return {
+        "mode": settings.CLICK_INGEST_MODE,
+        "buffer": click_buffer.stats(),
+        "filter": click_filter.stats(),
+        "trending": trending.stats(),
+    }
+
+@router.get("/cache-stats/")
+def read_property_cache_stats(current_user: models.User = Depends(auth_utils.require_manager)):
+    logger.debug(f"GET /api/properties/cache-stats/ called by user {current_user.username}")
+    return {"listing": listing_cache.stats(), "facets": facets_cache.stats()}
+
+@router.get("/facets/", response_model=schemas.PropertyFacets)
+def read_property_facets(
+    filters: dict = Depends(get_property_filters),
+    db: Session = Depends(get_db),
+    current_user: Optional[models.User] = Depends(get_optional_current_user)
+):
+    logger.debug(f"GET /api/properties/facets/ called with filters={filters}")
+    try:
+        facets = crud_property.get_facets(db, current_user=current_user, **filters)
+        logger.debug(f"Computed facets over {facets.total} properties.")
+        return facets
+    except Exception as e:
+        logger.error(f"Error in read_property_facets: {e}", exc_info=True)
+        raise
+
+@router.get("/clusters/", response_model=List[schemas.PropertyCluster])
+def read_property_clusters(
+    bbox: str, # Viewport as "west,south,east,north" (Leaflet toBBoxString order)
+    zoom: int, # Leaflet map zoom level
+    db: Session = Depends(get_db)
+):
+    logger.debug(f"GET /api/properties/clusters/ called with bbox={bbox}, zoom={zoom}")
+    try:
+        bbox_value = geo.parse_bbox(bbox)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid bbox: {e}")
+    if not 0 <= zoom <= 30:
+        raise HTTPException(status_code=400, detail="zoom must be between 0 and 30.")
+    try:
+        clusters = property_clusters.get_clusters(db, bbox_value, zoom)
+        logger.debug(f"Retrieved {len(clusters)} clusters.")
+        return [
+            schemas.PropertyCluster(
+                cell=f"{cluster.level}:{cluster.cell}",
+                count=cluster.count,
+                latitude=cluster.lat_sum / cluster.count,
+                longitude=cluster.lng_sum / cluster.count,
+                min_price=cluster.min_price,
+                max_price=cluster.max_price,
+            )
+            for cluster in clusters
+        ]
+    except Exception as e:
+        logger.error(f"Error in read_property_clusters: {e}", exc_info=True)
+        raise
+
+@router.get("/trending/", response_model=List[schemas.TrendingProperty])
+def read_trending_properties(limit: int = 10, db: Session = Depends(get_db)):
+    logger.debug(f"GET /api/properties/trending/ called with limit={limit}")
+    if not 1 <= limit <= settings.TRENDING_TOP_K:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {settings.TRENDING_TOP_K}")
+    try:
+        # Ranking comes from the in-memory top K; only those rows are read from the database
+        ranked = trending.top(limit)
+        properties = crud_property.get_properties_by_ids(db, [property_id for property_id, _ in ranked])
+        scores = dict(ranked)
+        logger.debug(f"Retrieved {len(properties)} trending properties.")
+        return [{"score": round(scores[p.id], 4), "property": p} for p in properties]
+    except Exception as e:
+        logger.error(f"Error in read_trending_properties: {e}", exc_info=True)
+        raise
+
 @router.get("/{property_id}/", response_model=schemas.Property) # Replace PropertySchema
-def read_property(property_id: int, db: Session = Depends(get_db)):
+def read_property(property_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
     logger.debug(f"GET /api/properties/{property_id} called.")
+    table_version = table_versions.with_click_window(table_versions.get_version(db, table_versions.PROPERTIES))
+    etag = conditional.make_etag(table_version.version, "detail", table_version.window, property_id)
+    if conditional.is_not_modified(request, etag, table_version.updated_at):
+        logger.debug(f"Property {property_id} not modified since the client's copy.")
+        return conditional.not_modified(etag, table_version.updated_at)
+    conditional.set_validators(response, etag, table_version.updated_at)
     try:
-        db_property = crud_property.get_property(db, property_id=property_id)
+        db_property = crud_property.get_property(db, property_id=property_id, full=True)
         if db_property is None:
             logger.warn(f"Property with id {property_id} not found.")
             raise HTTPException(status_code=404, detail="Property not found")
         logger.debug(f"Retrieved property: {db_property.title}")
+        if settings.FAST_JSON:
+            return serialization.property_serializer.response(db_property, headers=response.headers)
         return db_property
     except HTTPException:
         raise
@@ -211,7 +472,12 @@ def delete_property(
         logger.error(f"Error in delete_property for id {property_id}: {e}", exc_info=True)
         raise
 
-@router.post("/{property_id}/track-click/", response_model=schemas.PropertyClick, status_code=status.HTTP_201_CREATED)
+@router.post(
+    "/{property_id}/track-click/",
+    response_model=schemas.PropertyClick,
+    status_code=status.HTTP_201_CREATED,
+    responses={202: {"description": "Click queued (CLICK_INGEST_MODE=buffered), or skipped as a duplicate, bot or prefetch"}},
+)
 def track_property_click(
     property_id: int,
     request: Request, # Inject Request object
@@ -219,13 +485,35 @@ def track_property_click(
 ):
     logger.debug(f"POST /api/properties/{property_id}/track-click called.")
     try:
+        client_host = request.client.host if request.client else None
+        user_agent = request.headers.get("user-agent")
+        prefetch = "prefetch" in (request.headers.get("sec-purpose") or request.headers.get("purpose") or "")
+
+        if settings.CLICK_INGEST_MODE == "buffered":
+            # No database round trip: validate against the cached id set and queue the click
+            if not click_buffer.is_known_property(property_id):
+                logger.warn(f"Property with id {property_id} not found for click tracking.")
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Property not found")
+            skipped = click_filter.check(client_host, user_agent, property_id, prefetch=prefetch)
+            if skipped:
+                logger.debug(f"Skipped {skipped} click for property {property_id}.")
+                return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content={"accepted": False, "skipped": skipped})
+            accepted = click_buffer.submit(ClickEvent(property_id, datetime.utcnow(), client_host, user_agent))
+            if accepted:
+                trending.record(property_id)
+            else:
+                logger.warn(f"Click buffer full; dropped click for property {property_id}.")
+            return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content={"accepted": accepted})
+
         db_property = crud_property.get_property(db, property_id=property_id)
         if not db_property:
             logger.warn(f"Property with id {property_id} not found for click tracking.")
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Property not found")
+        skipped = click_filter.check(client_host, user_agent, property_id, prefetch=prefetch)
+        if skipped:
+            logger.debug(f"Skipped {skipped} click for property {property_id}.")
+            return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content={"accepted": False, "skipped": skipped})
         
-        client_host = request.client.host if request.client else None
-        user_agent = request.headers.get("user-agent")
         logger.debug(f"Tracking click for property {property_id}. IP: {client_host}, UA: {user_agent}")
 
         click = create_property_click(
@@ -234,6 +522,7 @@ def track_property_click(
             ip_address=client_host,
             user_agent=user_agent
         )
+        trending.record(property_id)
         logger.info(f"Click tracked for property {property_id}, click ID: {click.id}")
         return click
     except HTTPException:
@@ -5,8 +5,8 @@ logger.setLevel(logging.DEBUG) # Ensure this logger also captures debug messages
 logger.info("Loading settings router...")
 
 try:
-    from fastapi import APIRouter, Depends
-    logger.info("Imported APIRouter, Depends from fastapi")
+    from fastapi import APIRouter, Depends, Request, Response
+    logger.info("Imported APIRouter, Depends, Request, Response from fastapi")
 except ImportError as e:
     logger.error(f"Failed to import from fastapi: {e}")
     raise
@@ -41,6 +41,18 @@ try:
 except ImportError as e:
     logger.error(f"Failed to import crud_settings: {e}")
     raise
+try:
+    from crud import table_versions
+    logger.info("Imported table_versions from crud")
+except ImportError as e:
+    logger.error(f"Failed to import table_versions: {e}")
+    raise
+try:
+    from core import conditional
+    logger.info("Imported conditional from core")
+except ImportError as e:
+    logger.error(f"Failed to import conditional from core: {e}")
+    raise
 try:
     from auth import utils as auth_utils
     logger.info("Imported utils as auth_utils from auth")
@@ -52,8 +64,14 @@ router = APIRouter()
 logger.info("Settings router APIRouter initialized.")
 
 @router.get("/", response_model=Dict[str, schemas.SiteSetting])
-def get_all_settings(db: Session = Depends(get_db)):
+def get_all_settings(request: Request, response: Response, db: Session = Depends(get_db)):
     logger.debug("GET /api/settings/ called")
+    table_version = table_versions.get_version(db, table_versions.SITE_SETTINGS)
+    etag = conditional.make_etag(table_version.version, "settings")
+    if conditional.is_not_modified(request, etag, table_version.updated_at):
+        logger.debug("Settings not modified since the client's copy.")
+        return conditional.not_modified(etag, table_version.updated_at)
+    conditional.set_validators(response, etag, table_version.updated_at)
     try:
         settings_data = crud_settings.get_settings(db)
         logger.debug(f"Retrieved settings data: {settings_data}")
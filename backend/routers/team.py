@@ -5,7 +5,7 @@ logger.setLevel(logging.DEBUG)
 logger.info("Loading team router...")
 
 try:
-    from fastapi import APIRouter, Depends, HTTPException, status
+    from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
     logger.info("Imported from fastapi")
 except ImportError as e:
     logger.error(f"Failed to import from fastapi: {e}")
@@ -41,6 +41,24 @@ try:
 except ImportError as e:
     logger.error(f"Failed to import crud_team: {e}")
     raise
+try:
+    from crud import table_versions
+    logger.info("Imported table_versions from crud")
+except ImportError as e:
+    logger.error(f"Failed to import table_versions: {e}")
+    raise
+try:
+    from core import conditional, serialization
+    logger.info("Imported conditional, serialization from core")
+except ImportError as e:
+    logger.error(f"Failed to import conditional, serialization from core: {e}")
+    raise
+try:
+    from core.config import settings
+    logger.info("Imported settings from core.config")
+except ImportError as e:
+    logger.error(f"Failed to import settings from core.config: {e}")
+    raise
 try:
     from auth import utils as auth_utils
     logger.info("Imported utils as auth_utils from auth")
@@ -52,11 +70,19 @@ router = APIRouter()
 logger.info("Team router APIRouter initialized.")
 
 @router.get("/", response_model=List[schemas.TeamMember])
-def read_team(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def read_team(request: Request, response: Response, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
     logger.debug(f"GET /api/team/ called. Skip: {skip}, Limit: {limit}")
+    table_version = table_versions.get_version(db, table_versions.TEAM_MEMBERS)
+    etag = conditional.make_etag(table_version.version, "team", skip, limit)
+    if conditional.is_not_modified(request, etag, table_version.updated_at):
+        logger.debug("Team list not modified since the client's copy.")
+        return conditional.not_modified(etag, table_version.updated_at)
+    conditional.set_validators(response, etag, table_version.updated_at)
     try:
         members = crud_team.get_team_members(db, skip, limit)
         logger.debug(f"Retrieved {len(members)} team members.")
+        if settings.FAST_JSON:
+            return serialization.team_member_serializer.response(members, many=True, headers=response.headers)
         return members
     except Exception as e:
         logger.error(f"Error in read_team: {e}", exc_info=True)
@@ -5,29 +5,20 @@ logger.setLevel(python_logging.DEBUG)
 logger.info("Loading uploads router...")
 
 try:
-    from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile
+    from fastapi import APIRouter, Depends, HTTPException, Query, status, Request
+    from starlette.requests import ClientDisconnect
     logger.info("Imported from fastapi")
 except ImportError as e:
     logger.error(f"Failed to import from fastapi: {e}")
     raise
 # from fastapi.responses import JSONResponse # Not used
-try:
-    import shutil
-    logger.info("Imported shutil")
-except ImportError as e:
-    logger.error(f"Failed to import shutil: {e}")
-    raise
 try:
     import os
-    logger.info("Imported os")
-except ImportError as e:
-    logger.error(f"Failed to import os: {e}")
-    raise
-try:
-    import uuid # For generating unique filenames
-    logger.info("Imported uuid")
+    from contextlib import aclosing
+    from typing import Dict, List, Optional
+    logger.info("Imported os, aclosing, typing")
 except ImportError as e:
-    logger.error(f"Failed to import uuid: {e}")
+    logger.error(f"Failed to import os/aclosing/typing: {e}")
     raise
 
 try:
@@ -42,6 +33,34 @@ try:
 except ImportError as e:
     logger.error(f"Failed to import settings from core.config: {e}")
     raise
+try:
+    from core.uploads import (
+        SavedUpload, UploadRejected, discard_pending, finish_file, receive_chunk, receive_upload, receive_uploads, received_bytes
+    )
+    logger.info("Imported upload helpers from core.uploads")
+except ImportError as e:
+    logger.error(f"Failed to import from core.uploads: {e}")
+    raise
+try:
+    import anyio
+    from anyio import to_thread
+    from sqlalchemy.orm import Session
+    logger.info("Imported anyio, to_thread from anyio, Session from sqlalchemy.orm")
+except ImportError as e:
+    logger.error(f"Failed to import to_thread/Session: {e}")
+    raise
+try:
+    from core.database import SessionLocal, get_db
+    from core.images import build_variants
+    from crud.image_variants import load_rendered, save_variants
+    from crud.stored_files import record_upload
+    from crud import property as crud_property
+    from crud import upload_sessions
+    from utils.media import srcset, upload_url
+    logger.info("Imported get_db, SessionLocal, build_variants, load_rendered, save_variants, record_upload, srcset, upload_url")
+except ImportError as e:
+    logger.error(f"Failed to import image variant helpers: {e}")
+    raise
 try:
     import schemas # Import your actual schemas
     logger.info("Imported schemas")
@@ -68,6 +87,7 @@ except Exception as e:
     # For now, we'll let it proceed and potentially fail later if paths are critical
 
 # Specific directories for properties and team uploads
+# (new uploads go to the content-addressed store; files uploaded earlier stay here and are still served)
 PROPERTY_UPLOAD_DIR = os.path.join(settings.UPLOAD_DIR, "properties")
 TEAM_UPLOAD_DIR = os.path.join(settings.UPLOAD_DIR, "team")
 GENERAL_UPLOAD_DIR = os.path.join(settings.UPLOAD_DIR, "general") # Added for consistency
@@ -87,68 +107,302 @@ except Exception as e:
 # logger = python_logging.getLogger("uvicorn.error") # This was the original, might be too specific
 # Using the module's own logger, configured at the top, is generally better for module-specific logs.
 
-@router.post("/{upload_type}/", response_model=schemas.UploadResponse)
-async def upload_file(
-    upload_type: str,
-    file: UploadFile = File(...),
-    current_user: User = Depends(auth_utils.require_manager)
-):
-    logger.debug(f"POST /api/uploads/{upload_type} called by user {current_user.username} for file: {file.filename}")
-    # Authorization check: Example - allow only admins or editors
-    # if not current_user.is_admin and not current_user.is_editor:
-    #     raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to upload files")
+# The body is parsed by core.uploads.receive_upload as it streams in, so the multipart schema
+# is declared here for the OpenAPI docs instead of through an UploadFile parameter
+UPLOAD_REQUEST_BODY = {
+    "required": True,
+    "content": {
+        "multipart/form-data": {
+            "schema": {
+                "type": "object",
+                "properties": {"file": {"type": "string", "format": "binary"}},
+                "required": ["file"],
+            }
+        }
+    },
+}
+
+ALLOWED_UPLOAD_TYPES = ["properties", "team", "general"]
+
+# Batch uploads repeat the `files` part once per file
+BATCH_UPLOAD_REQUEST_BODY = {
+    "required": True,
+    "content": {
+        "multipart/form-data": {
+            "schema": {
+                "type": "object",
+                "properties": {"files": {"type": "array", "items": {"type": "string", "format": "binary"}}},
+                "required": ["files"],
+            }
+        }
+    },
+}
+
+# Resumable upload chunks are the raw bytes of the file, starting at ?offset=
+CHUNK_REQUEST_BODY = {
+    "required": True,
+    "content": {"application/octet-stream": {"schema": {"type": "string", "format": "binary"}}},
+}
 
+
+def _check_upload_type(upload_type: str, current_user: User):
     # Support flexible upload types (e.g., 'properties', 'team', 'general').
-    allowed_types = ["properties", "team", "general"]
-    if upload_type not in allowed_types:
+    if upload_type not in ALLOWED_UPLOAD_TYPES:
         logger.warn(f"Invalid upload_type '{upload_type}' specified by user {current_user.username}.")
-        raise HTTPException(status_code=400, detail=f"Invalid upload type specified. Valid types are {', '.join(allowed_types)}.")
+        raise HTTPException(status_code=400, detail=f"Invalid upload type specified. Valid types are {', '.join(ALLOWED_UPLOAD_TYPES)}.")
 
-    # Ensure directory exists for this upload type
-    target_dir = os.path.join(settings.UPLOAD_DIR, upload_type)
-    try: # Added try-except for directory creation during request as a fallback
-        os.makedirs(target_dir, exist_ok=True)
-    except Exception as e:
-        logger.error(f"Could not create target directory {target_dir} during upload request: {e}", exc_info=True)
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Could not prepare upload location.")
+
+async def _stored_upload_response(db: Session, saved: SavedUpload, current_user: User) -> schemas.UploadResponse:
+    """Record a file that has reached the content-addressed store and describe it, with its derivatives."""
+    saved = await to_thread.run_sync(record_upload, db, saved)
+    if saved.existed:
+        logger.info(f"Upload by {current_user.username} matches stored file '{saved.path}' ({saved.size} bytes).")
+    else:
+        logger.info(f"File '{saved.path}' ({saved.size} bytes, {saved.content_type}) uploaded successfully by user {current_user.username}.")
+
+    # Construct absolute URL to access the file via static route
+    # e.g., http://your-api-domain/static/uploads/objects/ab/<sha256>.jpg
+    file_url = upload_url(saved.path)
+    logger.debug(f"Generated file URL: {file_url}")
+
+    # Resized WebP/JPEG copies: reused for bytes already stored, otherwise rendered in the image process pool
+    rendered = await to_thread.run_sync(load_rendered, db, saved.path) if saved.existed else None
+    if rendered is None:
+        rendered = await build_variants(os.path.join(settings.UPLOAD_DIR, saved.path))
+        if rendered is None:
+            return schemas.UploadResponse(filename=saved.filename, url=file_url, deduplicated=saved.existed)
+        await to_thread.run_sync(save_variants, db, saved.path, rendered)
+        logger.info(f"Rendered {len(rendered['variants'])} derivatives of '{saved.path}'.")
+    directory = os.path.dirname(saved.path)
+    return schemas.UploadResponse(
+        filename=saved.filename,
+        url=file_url,
+        width=rendered["width"],
+        height=rendered["height"],
+        variants=srcset((v["content_type"], v["width"], f"{directory}/{v['filename']}") for v in rendered["variants"]),
+        deduplicated=saved.existed,
+    )
+
+
+def _session_response(upload_session) -> schemas.UploadSession:
+    return schemas.UploadSession(
+        id=upload_session.id,
+        upload_type=upload_session.upload_type,
+        size=upload_session.size,
+        offset=received_bytes(upload_sessions.session_path(upload_session.id)),
+        expires_at=upload_session.expires_at,
+    )
+
+
+def _live_session(db: Session, session_id: str, current_user: User):
+    upload_session = upload_sessions.get_session(db, session_id, current_user)
+    if upload_session is None:
+        raise HTTPException(status_code=404, detail="Upload session not found or expired.")
+    return upload_session
+
+
+# Resumable uploads, for large files and unreliable connections:
+#   POST   /sessions/                 {upload_type, size} -> session with offset 0
+#   PUT    /sessions/{id}/?offset=N   raw bytes from N on -> session with the new offset
+#   GET    /sessions/{id}/            -> session; after a dropped connection, resume from its offset
+#   POST   /sessions/{id}/complete/   -> UploadResponse, exactly as a single-request upload
+#   DELETE /sessions/{id}/            abandon it (idle sessions expire on their own)
+# Chunks may be any size that fits nginx's client_max_body_size. Declared before
+# /{upload_type}/ so that POST /sessions/ is not taken for an upload type.
+
+@router.post("/sessions/", response_model=schemas.UploadSession, status_code=status.HTTP_201_CREATED)
+def create_upload_session(
+    session_in: schemas.UploadSessionCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(auth_utils.require_manager)
+):
+    _check_upload_type(session_in.upload_type, current_user)
+    if session_in.size <= 0:
+        raise HTTPException(status_code=400, detail="The upload size must be positive.")
+    if session_in.size > settings.UPLOAD_SESSION_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"File exceeds the {settings.UPLOAD_SESSION_MAX_BYTES} byte upload limit.")
+    upload_session = upload_sessions.create_session(db, current_user, session_in.upload_type, session_in.size)
+    logger.info(f"Upload session {upload_session.id} ({session_in.size} bytes) started by {current_user.username}.")
+    return _session_response(upload_session)
 
 
+@router.get("/sessions/{session_id}/", response_model=schemas.UploadSession)
+def read_upload_session(session_id: str, db: Session = Depends(get_db), current_user: User = Depends(auth_utils.require_manager)):
+    return _session_response(_live_session(db, session_id, current_user))
+
+
+@router.put("/sessions/{session_id}/", response_model=schemas.UploadSession, openapi_extra={"requestBody": CHUNK_REQUEST_BODY})
+async def upload_chunk(
+    session_id: str,
+    request: Request,
+    offset: int = Query(..., ge=0, description="Bytes already received; must match the session's offset"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(auth_utils.require_manager)
+):
+    upload_session = await to_thread.run_sync(_live_session, db, session_id, current_user)
+    path = upload_sessions.session_path(session_id)
     try:
-        original_filename = os.path.basename(file.filename) if file.filename else "" # Handle None filename
-        if not original_filename:
-            logger.warn(f"Upload attempt by {current_user.username} with empty filename.")
-            raise HTTPException(status_code=400, detail="Filename cannot be empty.")
-
-        # Sanitize filename and make it unique
-        file_extension = os.path.splitext(original_filename)[1]
-        # A more robust sanitization might be needed for production
-        sanitized_name_part = "".join(c if c.isalnum() or c in ['_', '.'] else '_' for c in os.path.splitext(original_filename)[0])
-        unique_filename = f"{sanitized_name_part}_{uuid.uuid4().hex}{file_extension}"
-        
-        file_path = os.path.join(target_dir, unique_filename)
-        logger.debug(f"Attempting to save uploaded file to: {file_path}")
-
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        logger.info(f"File '{unique_filename}' uploaded successfully to {target_dir} by user {current_user.username}.")
-        
-        # Construct absolute URL to access the file via static route
-        # e.g., http://your-api-domain/static/uploads/properties/filename.jpg
-        file_url = f"{settings.API_BASE_URL}/static/uploads/{upload_type}/{unique_filename}"
-        logger.debug(f"Generated file URL: {file_url}")
-        
-        return schemas.UploadResponse(filename=unique_filename, url=file_url)
-    except HTTPException: # Re-raise HTTPExceptions directly
+        # Written straight to the session's file as it arrives; a dropped connection keeps what was received
+        await receive_chunk(request, path, offset, upload_session.size)
+    except UploadRejected as e:
+        logger.warn(f"Rejected chunk of upload session {session_id} by {current_user.username}: {e.detail}")
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    except ClientDisconnect:
+        logger.info(f"Client disconnected during a chunk of upload session {session_id}; {received_bytes(path)} bytes kept.")
         raise
+    finally:
+        await to_thread.run_sync(upload_sessions.touch_session, db, upload_session)
+    return await to_thread.run_sync(_session_response, upload_session)
+
+
+@router.post("/sessions/{session_id}/complete/", response_model=schemas.UploadResponse)
+async def complete_upload_session(session_id: str, db: Session = Depends(get_db), current_user: User = Depends(auth_utils.require_manager)):
+    upload_session = await to_thread.run_sync(_live_session, db, session_id, current_user)
+    received = received_bytes(upload_sessions.session_path(session_id))
+    if received != upload_session.size:
+        raise HTTPException(status_code=409, detail=f"Upload incomplete: {received} of {upload_session.size} bytes received.")
+    try:
+        # Checked, hashed and moved into the content-addressed store like a single-request upload
+        saved = await to_thread.run_sync(finish_file, upload_sessions.session_path(session_id), upload_session.size)
+    except UploadRejected as e:
+        logger.warn(f"Rejected upload session {session_id} by {current_user.username}: {e.detail}")
+        if e.status_code == 415:
+            # Not an image: the session is of no further use. A 404 or 409 means another request
+            # completed it or is writing to it, and that request owns the session.
+            await to_thread.run_sync(upload_sessions.delete_session, db, upload_session)
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    await to_thread.run_sync(upload_sessions.delete_session, db, upload_session)
+    try:
+        return await _stored_upload_response(db, saved, current_user)
     except Exception as e:
-        logger.error(f"File upload failed for {original_filename if 'original_filename' in locals() else 'unknown file'} by {current_user.username}: {e}", exc_info=True)
+        logger.error(f"Completing upload session {session_id} failed for {current_user.username}: {e}", exc_info=True)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Could not upload file: An unexpected error occurred.")
-    finally:
-        # Ensure the file is closed, swallow any errors during close
+
+
+@router.delete("/sessions/{session_id}/", status_code=status.HTTP_204_NO_CONTENT)
+def delete_upload_session(session_id: str, db: Session = Depends(get_db), current_user: User = Depends(auth_utils.require_manager)):
+    upload_sessions.delete_session(db, _live_session(db, session_id, current_user))
+
+
+def _attach_images(db: Session, property_id: int, image_urls: List[str]) -> List[schemas.PropertyImage]:
+    db_prop = crud_property.get_property(db, property_id)
+    if db_prop is None:
+        raise HTTPException(status_code=404, detail="Property not found")
+    images = crud_property.add_images(db, db_prop, image_urls)
+    return [schemas.PropertyImage.model_validate(image, from_attributes=True) for image in images]
+
+
+# Batch uploads: many files in one multipart request, e.g. a whole property gallery.
+# Files arrive one after another in the body; each is stored as soon as its last byte is in,
+# and up to UPLOAD_BATCH_CONCURRENCY stored files are recorded and get their derivatives
+# rendered while the next ones are still being received. The response has one result per
+# file, failures included; with ?property_id= the stored files are appended to that
+# property's gallery, in the order sent, in one transaction.
+
+@router.post("/batch/{upload_type}/", response_model=schemas.BatchUploadResponse, openapi_extra={"requestBody": BATCH_UPLOAD_REQUEST_BODY})
+async def upload_files(
+    upload_type: str,
+    request: Request,
+    property_id: Optional[int] = Query(None, description="Append the stored files to this property's images"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(auth_utils.require_manager)
+):
+    logger.debug(f"POST /api/uploads/batch/{upload_type} called by user {current_user.username}")
+    _check_upload_type(upload_type, current_user)
+    if property_id is not None:
+        if upload_type != "properties":
+            raise HTTPException(status_code=400, detail="Only 'properties' uploads can be attached to a property.")
+        if await to_thread.run_sync(crud_property.get_property, db, property_id) is None:
+            raise HTTPException(status_code=404, detail="Property not found")
+
+    results: List[Optional[schemas.BatchUploadResult]] = []
+    filenames: List[str] = []
+    first_of: Dict[str, int] = {}  # Digest -> index of the first file with those bytes
+    repeats: Dict[int, int] = {}  # Index of a repeated file -> index of the first
+    slots = anyio.Semaphore(max(1, settings.UPLOAD_BATCH_CONCURRENCY))
+
+    async def store(index: int, filename: str, saved: SavedUpload):
+        task_db = SessionLocal()  # Sessions are not shared between concurrent tasks
         try:
-            await file.close()
-            logger.debug(f"UploadFile {file.filename if file else ''} closed.")
-        except Exception as e_close:
-            logger.warn(f"Error closing uploaded file {file.filename if file else ''}: {e_close}", exc_info=True)
-            pass
-logger.info("Uploads router loaded successfully.")
\ No newline at end of file
+            upload = await _stored_upload_response(task_db, saved, current_user)
+            results[index] = schemas.BatchUploadResult(filename=filename, upload=upload)
+        except Exception as e:
+            logger.error(f"Storing '{filename}' from a batch upload failed for {current_user.username}: {e}", exc_info=True)
+            results[index] = schemas.BatchUploadResult(
+                filename=filename, status_code=500, error="Could not upload file: An unexpected error occurred."
+            )
+        finally:
+            await to_thread.run_sync(task_db.close)
+            slots.release()
+
+    failure: Optional[Exception] = None
+    async with anyio.create_task_group() as tasks:
+        try:
+            async with aclosing(receive_uploads(request)) as files:
+                async for filename, outcome in files:
+                    results.append(None)
+                    filenames.append(filename)
+                    if isinstance(outcome, UploadRejected):
+                        logger.warn(f"Rejected '{filename}' in a batch upload by {current_user.username}: {outcome.detail}")
+                        results[-1] = schemas.BatchUploadResult(filename=filename, status_code=outcome.status_code, error=outcome.detail)
+                        continue
+                    if outcome.digest in first_of:
+                        # Same bytes earlier in this batch: share that file's result rather than race it
+                        repeats[len(results) - 1] = first_of[outcome.digest]
+                        await to_thread.run_sync(discard_pending, outcome)
+                        continue
+                    first_of[outcome.digest] = len(results) - 1
+                    # Waiting for a free slot also stops reading the body until one is free
+                    await slots.acquire()
+                    tasks.start_soon(store, len(results) - 1, filename, outcome)
+        except Exception as e:
+            failure = e  # Files already stored finish processing; unattached, they are collected later
+    if isinstance(failure, UploadRejected):
+        logger.warn(f"Rejected batch upload by {current_user.username}: {failure.detail}")
+        raise HTTPException(status_code=failure.status_code, detail=failure.detail)
+    if failure is not None:
+        logger.error(f"Batch upload failed for {current_user.username}: {failure}", exc_info=failure)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Could not upload files: An unexpected error occurred.")
+
+    for index, first in repeats.items():
+        upload = results[first].upload
+        results[index] = results[first].model_copy(update={
+            "filename": filenames[index],
+            "upload": upload.model_copy(update={"deduplicated": True}) if upload is not None else None,
+        })
+
+    stored = sum(result.upload is not None for result in results)
+    logger.info(f"Batch upload by {current_user.username}: {stored} of {len(results)} files stored.")
+    images: List[schemas.PropertyImage] = []
+    if property_id is not None and stored:
+        image_urls = [result.upload.url for result in results if result.upload is not None]
+        images = await to_thread.run_sync(_attach_images, db, property_id, image_urls)
+        logger.info(f"Attached {len(images)} images to property {property_id}.")
+    return schemas.BatchUploadResponse(results=results, images=images)
+
+
+@router.post("/{upload_type}/", response_model=schemas.UploadResponse, openapi_extra={"requestBody": UPLOAD_REQUEST_BODY})
+async def upload_file(
+    upload_type: str,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(auth_utils.require_manager)
+):
+    logger.debug(f"POST /api/uploads/{upload_type} called by user {current_user.username}")
+    # Authorization check: Example - allow only admins or editors
+    # if not current_user.is_admin and not current_user.is_editor:
+    #     raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to upload files")
+    _check_upload_type(upload_type, current_user)
+
+    try:
+        # Streams the file into the content-addressed store chunk by chunk; type and size are
+        # checked and the SHA-256 computed as bytes arrive
+        saved = await receive_upload(request)
+        return await _stored_upload_response(db, saved, current_user)
+    except UploadRejected as e:
+        logger.warn(f"Rejected upload by {current_user.username}: {e.detail}")
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    except Exception as e:
+        logger.error(f"File upload failed for {current_user.username}: {e}", exc_info=True)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Could not upload file: An unexpected error occurred.")
+logger.info("Uploads router loaded successfully.")
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, EmailStr, HttpUrl
-from typing import List, Optional, Any
-from datetime import datetime
+from typing import Dict, List, Optional, Any, Union
+from datetime import date, datetime
 from enum import Enum
 
 # Schemas define the shape of data for API requests and responses
@@ -17,6 +17,7 @@ class PropertyImageCreate(PropertyImageBase):
 class PropertyImage(PropertyImageBase):
     id: int
     property_id: int
+    srcset: Dict[str, str] = {} # Derivatives by content type, as srcset attribute values
 
     class Config:
         orm_mode = True
@@ -57,6 +58,9 @@ class Property(PropertyBase):
     id: int
     created_at: datetime
     updated_at: Optional[datetime] = None
+    click_count: int = 0
+    last_clicked_at: Optional[datetime] = None
+    image_srcset: Dict[str, str] = {} # Derivatives of image_url by content type, as srcset attribute values
     images: List[PropertyImage] = [] # Include related images (PropertyImage schema)
     clicks: List['PropertyClick'] = [] # Include click records to show click count
 
@@ -67,6 +71,55 @@ class Property(PropertyBase):
     class Config:
         orm_mode = True
 
+class PropertySummary(PropertyBase):
+    # Compact list representation: scalar fields, the main image_url and a click total.
+    # The gallery and click rows stay on the full Property returned by the detail endpoint.
+    id: int
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+    click_count: int = 0
+    last_clicked_at: Optional[datetime] = None
+    image_srcset: Dict[str, str] = {} # Derivatives of image_url by content type, as srcset attribute values
+    assigned_to: Optional['User'] = None
+    created_by: Optional['User'] = None
+
+    class Config:
+        from_attributes = True
+
+class PropertyPage(BaseModel):
+    items: List[PropertySummary]
+    next_cursor: Optional[str] = None # Pass back as ?cursor= to fetch the next page; None on the last page
+
+class TrendingProperty(BaseModel):
+    score: float # Exponentially decayed click count (TRENDING_HALF_LIFE_HOURS)
+    property: PropertySummary
+
+class PropertyCluster(BaseModel):
+    cell: str # Opaque cluster id, unique within a zoom level
+    count: int
+    latitude: float # Centroid of the clustered properties
+    longitude: float
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+
+class FacetCount(BaseModel):
+    value: Any
+    count: int
+
+class HistogramBucket(BaseModel):
+    min: float
+    max: Optional[float] = None # None for the open-ended top bucket
+    count: int
+
+class PropertyFacets(BaseModel):
+    total: int
+    property_type: List[FacetCount] = []
+    listing_type: List[FacetCount] = []
+    bedrooms: List[FacetCount] = []
+    bathrooms: List[FacetCount] = []
+    price: List[HistogramBucket] = []
+    area: List[HistogramBucket] = []
+
 # ------------- Role Enum -------------
 
 class Role(str, Enum):
@@ -179,6 +232,33 @@ class Contact(ContactBase):
 class UploadResponse(BaseModel):
     filename: str
     url: str  # Accept relative paths, not only absolute URLs
+    width: Optional[int] = None
+    height: Optional[int] = None
+    # Resized copies by content type, as srcset attribute values, e.g.
+    # {"image/webp": "<url> 320w, <url> 640w", "image/jpeg": "..."}; empty if none could be made
+    variants: Dict[str, str] = {}
+    deduplicated: bool = False # The same file was already stored; url is the existing one
+
+class BatchUploadResult(BaseModel):
+    filename: str # As sent by the client
+    upload: Optional[UploadResponse] = None # Set when the file was stored
+    status_code: int = 200 # What a single-file upload of it would have returned
+    error: Optional[str] = None
+
+class BatchUploadResponse(BaseModel):
+    results: List[BatchUploadResult] # One per file, in the order they were sent
+    images: List[PropertyImage] = [] # Gallery rows added when property_id was given, in order
+
+class UploadSessionCreate(BaseModel):
+    upload_type: str # properties, team or general, as for single-request uploads
+    size: int # Total bytes the upload will have
+
+class UploadSession(BaseModel):
+    id: str
+    upload_type: str
+    size: int
+    offset: int # Bytes received so far; the next chunk starts here
+    expires_at: datetime # UTC; every chunk extends it
 
 # Schemas for Property Click Tracking
 class PropertyClickBase(BaseModel):
@@ -196,8 +276,30 @@ class PropertyClick(PropertyClickBase):
     class Config:
         orm_mode = True 
 
+# ------------- Click Analytics Schemas -------------
+
+class ClickSeriesPoint(BaseModel):
+    bucket: Union[datetime, date] # Start of the UTC hour, or the UTC day
+    clicks: int
+    unique_ips: Optional[int] = None # Distinct IPs; daily buckets only
+    unique_visitors: Optional[int] = None # Approximate distinct (IP, user agent) pairs; daily buckets only
+
+class PropertyClickSeries(BaseModel):
+    property_id: int
+    total_clicks: int
+    unique_visitors: int = 0 # Approximate distinct visitors over the whole range
+    points: List[ClickSeriesPoint] = [] # Buckets without clicks are omitted
+
+class ClickAnalytics(BaseModel):
+    start: date
+    end: date
+    granularity: str # "day" or "hour"
+    series: List[PropertyClickSeries] = []
+
 # Update forward refs
 Property.model_rebuild()
+PropertySummary.model_rebuild()
+PropertyPage.model_rebuild()
 Contact.model_rebuild()
 # Add model_rebuild() for any other schemas that use forward references if needed.
 # User.model_rebuild() # Not strictly necessary for User itself unless it refers to others, but doesn't hurt 
\ No newline at end of file
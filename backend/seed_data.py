@@ -15,6 +15,9 @@ from sqlalchemy.orm import Session
 
 from core.database import SessionLocal
 import models
+from crud import property as crud_property
+from crud.property_clusters import rebuild_clusters
+from crud import table_versions
 from auth import utils as auth_utils
 from models import Role
 
@@ -393,8 +396,11 @@ def seed_properties(db: Session):
                 # Update area (square_feet) if seed data had area
                 if "area" in prop:
                     db_prop.square_feet = prop["area"]
+                crud_property.sync_indexes(db, db_prop)
                 db.add(db_prop)
+        table_versions.bump(db, table_versions.PROPERTIES)
         db.commit()
+        rebuild_clusters(db)
         print("Updated latitude/longitude and area for existing properties.")
         return
 
@@ -408,6 +414,8 @@ def seed_properties(db: Session):
         prop_data.pop("listing_type", None)
         db_prop = models.Property(**prop_data, created_at=datetime.utcnow())
         db.add(db_prop)
+        db.flush()
+        crud_property.sync_indexes(db, db_prop)
         db.commit()
         db.refresh(db_prop)
 
@@ -415,6 +423,9 @@ def seed_properties(db: Session):
         for idx, img_url in enumerate(images):
             db.add(models.PropertyImage(property_id=db_prop.id, image_url=img_url, order=idx))
         db.commit()
+    table_versions.bump(db, table_versions.PROPERTIES)
+    db.commit()
+    rebuild_clusters(db)
     print(f"Inserted {len(SAMPLE_PROPERTIES)} sample properties with images.")
 
 
@@ -443,6 +454,7 @@ def seed_team(db: Session):
             # Add new member
             db.add(models.TeamMember(**member_data))
             created_count += 1
+    table_versions.bump(db, table_versions.TEAM_MEMBERS)
     db.commit()
     if created_count > 0:
         print(f"Inserted {created_count} new team members.")
@@ -495,6 +507,7 @@ def seed_settings(db: Session):
 
 
             db.add(models.SiteSettings(key=key, value=final_value, category=data["category"]))
+    table_versions.bump(db, table_versions.SITE_SETTINGS)
     db.commit()
     print("Basic site settings stored / updated.")
 
@@ -0,0 +1,56 @@
+import os
+import tempfile
+
+# Settings are read at import time, so point the app at a scratch database and upload
+# directory before anything imports core.config. Image rendering is left off: tests that
+# need derivatives insert ImageVariant rows directly.
+_TMP_DIR = tempfile.mkdtemp(prefix="habitat-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_TMP_DIR, 'test.db')}"
+os.environ["UPLOAD_DIR"] = os.path.join(_TMP_DIR, "uploads")
+os.environ["IMAGE_WORKERS"] = "0"
+os.environ["SQL_QUERY_BUDGET"] = "0"
+
+import pytest
+
+import models
+from core.database import SessionLocal, engine
+from auth.utils import get_password_hash
+
+
+@pytest.fixture
+def db():
+    """A session on the test database; every table is emptied again afterwards."""
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.rollback()
+        session.close()
+        with engine.begin() as conn:
+            for table in reversed(models.Base.metadata.sorted_tables):
+                conn.execute(table.delete())
+
+
+@pytest.fixture
+def admin(db):
+    user = models.User(
+        username="admin", email="admin@example.com",
+        password_hash=get_password_hash("password"), role=models.Role.admin,
+    )
+    db.add(user)
+    db.commit()
+    return user
+
+
+@pytest.fixture
+def client():
+    """The API without its lifespan: no background jobs or click buffer are started."""
+    from fastapi.testclient import TestClient
+    from main import app
+    return TestClient(app)
+
+
+@pytest.fixture
+def admin_headers(client, admin):
+    response = client.post("/api/users/token/", data={"username": "admin", "password": "password"})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
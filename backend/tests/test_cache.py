@@ -0,0 +1,57 @@
+from core import cache as cache_module
+from core.cache import QueryCache
+
+
+def test_get_returns_what_was_set():
+    cache = QueryCache("test")
+    assert cache.get("a") == (False, None)
+    cache.set("a", [1, 2])
+    assert cache.get("a") == (True, [1, 2])
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+
+
+def test_cached_none_is_a_hit():
+    cache = QueryCache("test")
+    cache.set("a", None)
+    assert cache.get("a") == (True, None)
+
+
+def test_invalidate_turns_entries_into_misses():
+    cache = QueryCache("test")
+    cache.set("a", 1)
+    cache.invalidate()
+    assert cache.get("a") == (False, None)
+    assert cache.stats()["entries"] == 0  # Evicted on the miss
+
+
+def test_set_drops_values_computed_before_an_invalidation():
+    cache = QueryCache("test")
+    version = cache.version
+    cache.invalidate()  # A write lands while the value is being computed
+    cache.set("a", "stale", version=version)
+    assert cache.get("a") == (False, None)
+    cache.set("a", "fresh", version=cache.version)
+    assert cache.get("a") == (True, "fresh")
+
+
+def test_entries_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    cache = QueryCache("test", ttl_seconds=10)
+    cache.set("a", 1)
+    now[0] += 9
+    assert cache.get("a") == (True, 1)
+    now[0] += 2
+    assert cache.get("a") == (False, None)
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = QueryCache("test", max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")  # "b" is now the least recently used
+    cache.set("c", 3)
+    assert cache.get("b") == (False, None)
+    assert cache.get("a") == (True, 1)
+    assert cache.get("c") == (True, 3)
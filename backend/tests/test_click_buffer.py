@@ -0,0 +1,174 @@
+import os
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+import models
+from core import click_buffer as click_buffer_module
+from core.click_buffer import ClickBuffer, ClickEvent
+from crud.property_clicks import bulk_create_property_clicks
+
+NOW = datetime(2026, 10, 1, 12, 0, 0)
+
+
+def click(property_id=1, minutes_ago=0):
+    return ClickEvent(property_id, NOW - timedelta(minutes=minutes_ago), "192.0.2.1", "Mozilla/5.0")
+
+
+class Writer:
+    """Records the batches it is given; fails while `failing` is set."""
+
+    def __init__(self):
+        self.batches = []
+        self.failing = False
+
+    def __call__(self, batch):
+        if self.failing:
+            raise RuntimeError("database unavailable")
+        self.batches.append(list(batch))
+        return len(batch)
+
+    @property
+    def written(self):
+        return [event for batch in self.batches for event in batch]
+
+
+def make_buffer(writer, **kwargs):
+    kwargs.setdefault("max_size", 10)
+    kwargs.setdefault("batch_size", 4)
+    return ClickBuffer(writer=writer, id_loader=lambda: {1, 2}, **kwargs)
+
+
+def test_rejects_unknown_policies():
+    with pytest.raises(ValueError):
+        make_buffer(Writer(), policy="ignore")
+    with pytest.raises(ValueError):
+        make_buffer(Writer(), policy="spill")  # Needs a spill directory
+
+
+def test_flush_writes_in_batches():
+    writer = Writer()
+    buffer = make_buffer(writer)
+    for _ in range(10):
+        assert buffer.submit(click())
+    buffer.flush()
+    assert [len(batch) for batch in writer.batches] == [4, 4, 2]
+    assert buffer.stats()["written"] == 10
+
+
+def test_drop_policy_discards_clicks_when_full():
+    buffer = make_buffer(Writer(), max_size=3)
+    assert [buffer.submit(click()) for _ in range(5)] == [True, True, True, False, False]
+    assert buffer.stats()["dropped"] == 2
+
+
+def test_block_policy_gives_up_after_the_timeout():
+    buffer = make_buffer(Writer(), max_size=1, policy="block", block_timeout=0.05)
+    assert buffer.submit(click())
+    started = time.monotonic()
+    assert not buffer.submit(click())
+    assert time.monotonic() - started >= 0.05
+
+
+def test_background_flusher_drains_on_stop():
+    writer = Writer()
+    buffer = make_buffer(writer, flush_interval=60)
+    buffer.start()
+    for _ in range(6):
+        buffer.submit(click())
+    buffer.stop()
+    assert len(writer.written) == 6
+    assert buffer.stats()["running"] is False
+
+
+def test_spill_policy_writes_overflow_to_disk_and_replays_it(tmp_path):
+    writer = Writer()
+    buffer = make_buffer(writer, max_size=2, policy="spill", spill_dir=str(tmp_path))
+    events = [click(property_id=1 + i % 2, minutes_ago=i) for i in range(5)]
+    assert all(buffer.submit(event) for event in events)
+    assert buffer.stats()["spilled"] == 3
+    assert os.listdir(tmp_path) == [f"clicks-{os.getpid()}.jsonl"]
+
+    buffer.flush()
+    buffer._replay_spills()
+    assert sorted(writer.written) == sorted(events)  # Timestamps and fields survive the round trip
+    assert buffer.stats()["replayed"] == 3
+    assert os.listdir(tmp_path) == []
+
+
+def test_failed_batches_are_spilled_and_retried(tmp_path):
+    writer = Writer()
+    buffer = make_buffer(writer, policy="spill", spill_dir=str(tmp_path))
+    for _ in range(3):
+        buffer.submit(click())
+    writer.failing = True
+    buffer.flush()
+    assert writer.written == []
+    assert buffer.stats()["flush_errors"] == 1
+
+    writer.failing = False
+    buffer._replay_spills()
+    assert len(writer.written) == 3
+    assert buffer.stats()["lost"] == 0
+
+
+def test_failed_batches_without_a_spill_dir_are_counted_lost():
+    writer = Writer()
+    writer.failing = True
+    buffer = make_buffer(writer)
+    buffer.submit(click())
+    buffer.flush()
+    assert buffer.stats()["lost"] == 1
+
+
+def test_other_workers_spill_files_wait_until_orphaned(tmp_path):
+    writer = Writer()
+    buffer = make_buffer(writer, policy="spill", spill_dir=str(tmp_path))
+    other = tmp_path / "clicks-999999.jsonl"
+    other.write_text(f'[1, "{NOW.isoformat()}", null, null]\n', encoding="utf-8")
+
+    buffer._replay_spills()
+    assert writer.written == [] and other.exists()  # Possibly a live worker's file
+
+    stale = time.time() - click_buffer_module.ORPHAN_SPILL_AGE_SECONDS - 1
+    os.utime(other, (stale, stale))
+    buffer._replay_spills()
+    assert writer.written == [ClickEvent(1, NOW, None, None)]
+    assert not other.exists()
+
+
+def test_known_ids_reload_on_a_miss_at_most_every_few_seconds(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(click_buffer_module.time, "monotonic", lambda: now[0])
+    ids = {1}
+    loads = []
+
+    def load():
+        loads.append(now[0])
+        return set(ids)
+
+    buffer = ClickBuffer(writer=Writer(), id_loader=load)
+    assert buffer.is_known_property(1)
+    ids.add(2)
+    assert not buffer.is_known_property(2)  # Loaded moments ago
+    now[0] += click_buffer_module.MIN_ID_RELOAD_SECONDS + 1
+    assert buffer.is_known_property(2)
+    assert len(loads) == 2
+
+
+def test_bulk_insert_updates_counters_and_skips_deleted_properties(db):
+    prop = models.Property(title="House", price=1000.0, click_count=0, last_clicked_at=NOW)
+    db.add(prop)
+    db.commit()
+
+    # Replayed spill files can hold clicks older than the last recorded one
+    written = bulk_create_property_clicks(db, [
+        click(prop.id, minutes_ago=30), click(prop.id, minutes_ago=90), click(prop.id + 1000),
+    ])
+    assert written == 2
+    db.refresh(prop)
+    assert prop.click_count == 2
+    assert prop.last_clicked_at.replace(tzinfo=None) == NOW
+    assert prop.updated_at is None  # A click is not an edit
+    assert db.query(models.PropertyClick).filter_by(property_id=prop.id).count() == 2
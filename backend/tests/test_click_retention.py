@@ -0,0 +1,132 @@
+import fcntl
+import gzip
+import json
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+import models
+from crud import click_retention
+from crud.click_rollups import get_high_water_mark
+from crud.property_clicks import reconcile_click_counters
+from utils.ip import pack_ip
+
+TODAY = datetime.utcnow().replace(hour=12, minute=0, second=0, microsecond=0)
+OLD_DAY = (TODAY - timedelta(days=40)).date()
+
+
+@pytest.fixture
+def archive_dir(tmp_path):
+    return str(tmp_path / "archive")
+
+
+@pytest.fixture
+def prop(db):
+    prop = models.Property(title="House", price=1000.0, click_count=0)
+    db.add(prop)
+    db.commit()
+    return prop
+
+
+def add_clicks(db, prop, ids, days_ago, ip="192.0.2.7", user_agent="Mozilla/5.0 retention"):
+    agent = db.query(models.UserAgent).filter_by(user_agent=user_agent).first()
+    if agent is None:
+        agent = models.UserAgent(digest=os.urandom(16), user_agent=user_agent)
+        db.add(agent)
+        db.flush()
+    for click_id in ids:
+        db.add(models.PropertyClick(
+            id=click_id, property_id=prop.id, clicked_at=TODAY - timedelta(days=days_ago),
+            ip=pack_ip(ip), user_agent_id=agent.id,
+        ))
+    db.commit()
+
+
+def archived_records(archive_dir, day):
+    with gzip.open(click_retention.partition_path(archive_dir, day), "rt", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def remaining_ids(db):
+    return sorted(click_id for (click_id,) in db.query(models.PropertyClick.id))
+
+
+def test_archives_and_deletes_clicks_past_retention(db, prop, archive_dir):
+    add_clicks(db, prop, [1, 2], days_ago=40)
+    add_clicks(db, prop, [3], days_ago=1)
+
+    assert click_retention.archive_clicks(db, retention_days=30, archive_dir=archive_dir, batch_size=1) == 2
+    assert remaining_ids(db) == [3]
+    records = archived_records(archive_dir, OLD_DAY)
+    assert [r["id"] for r in records] == [1, 2]
+    assert records[0]["ip_address"] == "192.0.2.7"
+    assert records[0]["user_agent"] == "Mozilla/5.0 retention"
+
+    # Archived clicks are still counted through the rollups
+    reconcile_click_counters(db)
+    db.refresh(prop)
+    assert prop.click_count == 3
+
+
+def test_only_archives_rolled_up_clicks(db, prop, archive_dir):
+    add_clicks(db, prop, [1, 3], days_ago=40)  # Click 2 is still being committed
+    assert click_retention.archive_clicks(db, retention_days=30, archive_dir=archive_dir) == 1
+    assert get_high_water_mark(db) == 1
+    assert remaining_ids(db) == [3]
+
+
+def test_disabled_retention_archives_nothing(db, prop, archive_dir):
+    add_clicks(db, prop, [1], days_ago=400)
+    assert click_retention.archive_clicks(db, retention_days=0, archive_dir=archive_dir) == 0
+    assert remaining_ids(db) == [1]
+
+
+def test_skips_a_pass_while_another_process_holds_the_archive(db, prop, archive_dir):
+    add_clicks(db, prop, [1], days_ago=40)
+    os.makedirs(archive_dir)
+    with open(os.path.join(archive_dir, ".lock"), "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        assert click_retention.archive_clicks(db, retention_days=30, archive_dir=archive_dir) == 0
+    assert remaining_ids(db) == [1]
+
+
+def test_import_restores_archived_clicks_with_their_ids(db, prop, archive_dir):
+    add_clicks(db, prop, [1, 2, 3], days_ago=40)
+    click_retention.archive_clicks(db, retention_days=30, archive_dir=archive_dir)
+    rolled_up = db.query(models.PropertyClickDaily).one().count
+
+    imported, skipped = click_retention.import_click_archive(db, OLD_DAY, OLD_DAY, archive_dir=archive_dir, batch_size=2)
+    assert (imported, skipped) == (3, 0)
+    assert remaining_ids(db) == [1, 2, 3]
+    restored = db.get(models.PropertyClick, 1)
+    assert (restored.ip_address, restored.user_agent) == ("192.0.2.7", "Mozilla/5.0 retention")
+
+    # Below the high-water mark: the rollups do not count them twice
+    reconcile_click_counters(db)
+    assert db.query(models.PropertyClickDaily).one().count == rolled_up
+    db.refresh(prop)
+    assert prop.click_count == 3
+
+    assert click_retention.import_click_archive(db, OLD_DAY, OLD_DAY, archive_dir=archive_dir) == (0, 3)
+
+
+def test_import_reads_clicks_archived_twice_once(db, prop, archive_dir):
+    add_clicks(db, prop, [1, 2], days_ago=40)
+    click_retention.archive_clicks(db, retention_days=30, archive_dir=archive_dir)
+    click_retention.import_click_archive(db, OLD_DAY, OLD_DAY, archive_dir=archive_dir)
+    click_retention.archive_clicks(db, retention_days=30, archive_dir=archive_dir)  # Same rows, appended again
+    assert len(archived_records(archive_dir, OLD_DAY)) == 4
+
+    assert click_retention.import_click_archive(db, OLD_DAY, OLD_DAY, archive_dir=archive_dir) == (2, 0)
+
+
+def test_import_skips_clicks_of_deleted_properties(db, prop, archive_dir):
+    add_clicks(db, prop, [1], days_ago=40)
+    click_retention.archive_clicks(db, retention_days=30, archive_dir=archive_dir)
+    db.query(models.PropertyClickDaily).delete()
+    db.delete(prop)
+    db.commit()
+
+    assert click_retention.import_click_archive(db, OLD_DAY, OLD_DAY, archive_dir=archive_dir) == (0, 1)
+    assert remaining_ids(db) == []
@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import models
+from crud import click_rollups
+from crud.property_clicks import reconcile_click_counters
+
+
+@pytest.fixture
+def prop(db):
+    prop = models.Property(title="House", price=1000.0, click_count=0)
+    db.add(prop)
+    db.commit()
+    return prop
+
+
+def add_clicks(db, prop, ids, clicked_at=None):
+    # Buffered and replayed clicks are written late: their clicked_at is older than their commit
+    clicked_at = clicked_at or datetime.utcnow() - timedelta(hours=2)
+    for click_id in ids:
+        db.add(models.PropertyClick(id=click_id, property_id=prop.id, clicked_at=clicked_at))
+    db.commit()
+
+
+def rolled_up(db, prop):
+    return sum(row.count for row in db.query(models.PropertyClickDaily).filter_by(property_id=prop.id))
+
+
+def stall_mark(db, seconds):
+    """Pretend the mark last moved `seconds` ago."""
+    db.query(models.RollupState).update({models.RollupState.updated_at: datetime.utcnow() - timedelta(seconds=seconds)})
+    db.commit()
+
+
+def test_rolls_up_consecutive_clicks(db, prop):
+    add_clicks(db, prop, [1, 2, 3])
+    assert click_rollups.roll_up_clicks(db) == 3
+    assert click_rollups.get_high_water_mark(db) == 3
+    assert rolled_up(db, prop) == 3
+    assert click_rollups.roll_up_clicks(db) == 0
+
+
+def test_recent_clicks_are_rolled_up_without_delay(db, prop):
+    add_clicks(db, prop, [1, 2], clicked_at=datetime.utcnow())
+    assert click_rollups.roll_up_clicks(db) == 2
+
+
+def test_waits_for_a_lower_id_committed_after_a_higher_one(db, prop):
+    # Click 2 belongs to a batch whose transaction is still open while click 3 has committed
+    add_clicks(db, prop, [1, 3])
+    assert click_rollups.roll_up_clicks(db) == 1
+    assert click_rollups.get_high_water_mark(db) == 1
+
+    add_clicks(db, prop, [2])  # The batch commits
+    assert click_rollups.roll_up_clicks(db) == 2
+    assert click_rollups.get_high_water_mark(db) == 3
+    assert rolled_up(db, prop) == 3
+
+    reconcile_click_counters(db)
+    db.refresh(prop)
+    assert prop.click_count == 3
+
+
+def test_skips_a_gap_that_stays_open(db, prop):
+    add_clicks(db, prop, [1, 3, 4])  # Click 2 was rolled back
+    assert click_rollups.roll_up_clicks(db) == 1
+    stall_mark(db, click_rollups.GAP_TIMEOUT.total_seconds() - 5)
+    assert click_rollups.roll_up_clicks(db) == 0
+    stall_mark(db, click_rollups.GAP_TIMEOUT.total_seconds() + 5)
+    assert click_rollups.roll_up_clicks(db) == 2
+    assert click_rollups.get_high_water_mark(db) == 4
+
+
+def test_first_run_waits_for_ids_below_the_first_click(db, prop):
+    add_clicks(db, prop, [5, 6])
+    assert click_rollups.roll_up_clicks(db) == 0
+    assert click_rollups.get_high_water_mark(db) == 0
+    stall_mark(db, click_rollups.GAP_TIMEOUT.total_seconds() + 5)
+    assert click_rollups.roll_up_clicks(db) == 2
@@ -0,0 +1,170 @@
+import gzip
+
+import anyio
+import pytest
+
+from starlette.requests import Request
+
+from core import compression
+from core.compression import CompressedVariants, CompressionMiddleware, negotiate, variant_response
+from core.static import UploadStaticFiles
+
+pytestmark = pytest.mark.anyio
+
+TEXT = b"Plain text, long enough to be worth compressing. " * 100
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+async def call(app, path="/", headers=(), extensions=None):
+    """Run one GET through an ASGI app and return the messages it sent."""
+    scope = {
+        "type": "http", "method": "GET", "path": path, "root_path": "", "query_string": b"",
+        "headers": [(name.encode(), value.encode()) for name, value in headers],
+        "extensions": extensions or {},
+    }
+    sent = []
+    requested = False
+
+    async def receive():
+        nonlocal requested
+        if requested:
+            await anyio.sleep_forever()  # The client stays connected; the app stops listening when done
+        requested = True
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+    return sent
+
+
+def response_headers(messages):
+    return {name.decode().lower(): value.decode() for name, value in messages[0]["headers"]}
+
+
+def single_response_app(status, headers, body):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": status, "headers": [
+            (name.encode(), value.encode()) for name, value in headers
+        ]})
+        await send({"type": "http.response.body", "body": body, "more_body": False})
+    return app
+
+
+@pytest.fixture
+def static_app(tmp_path):
+    (tmp_path / "notes.txt").write_bytes(TEXT)
+    return CompressionMiddleware(UploadStaticFiles(directory=str(tmp_path)), minimum_size=100)
+
+
+async def test_compresses_complete_text_responses():
+    app = CompressionMiddleware(single_response_app(200, [("content-type", "text/plain")], TEXT), minimum_size=100)
+    messages = await call(app, headers=[("accept-encoding", "gzip")])
+    assert response_headers(messages)["content-encoding"] == "gzip"
+    assert gzip.decompress(messages[1]["body"]) == TEXT
+
+
+async def test_sends_the_start_message_before_pathsend(static_app):
+    messages = await call(
+        static_app, "/notes.txt", headers=[("accept-encoding", "gzip")],
+        extensions={"http.response.pathsend": {}},
+    )
+    assert [m["type"] for m in messages] == ["http.response.start", "http.response.pathsend"]
+    assert messages[0]["status"] == 200
+    assert "content-encoding" not in response_headers(messages)
+
+
+async def test_leaves_byte_ranges_uncompressed(static_app):
+    messages = await call(static_app, "/notes.txt", headers=[("accept-encoding", "gzip"), ("range", "bytes=0-499")])
+    headers = response_headers(messages)
+    assert messages[0]["status"] == 206
+    assert "content-encoding" not in headers
+    assert headers["content-range"] == f"bytes 0-499/{len(TEXT)}"
+    assert b"".join(m.get("body", b"") for m in messages[1:]) == TEXT[:500]
+
+
+def test_negotiate_prefers_brotli_and_honours_q_values(monkeypatch):
+    assert negotiate("gzip, deflate, br") == "br"
+    assert negotiate("br;q=0.5, gzip") == "gzip"
+    assert negotiate("gzip;q=0, *;q=0.1") == "br"
+    assert negotiate("deflate, identity") is None
+    assert negotiate("br;q=0, gzip;q=0") is None
+    assert negotiate(None) is None
+    monkeypatch.setattr(compression, "brotli", None)  # Without the optional module only gzip is offered
+    assert negotiate("br, gzip") == "gzip"
+    assert negotiate("br") is None
+
+
+@pytest.mark.parametrize("headers, body", [
+    ([("content-type", "text/plain")], b"too short"),
+    ([("content-type", "image/png")], TEXT),
+    ([("content-type", "text/plain"), ("content-encoding", "gzip")], gzip.compress(TEXT)),
+])
+async def test_passes_small_binary_and_encoded_responses_through(headers, body):
+    app = CompressionMiddleware(single_response_app(200, headers, body), minimum_size=100)
+    messages = await call(app, headers=[("accept-encoding", "gzip")])
+    assert response_headers(messages).get("content-encoding") == dict(headers).get("content-encoding")
+    assert messages[1]["body"] == body
+
+
+async def test_passes_streaming_responses_through():
+    async def streaming_app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/plain")]})
+        await send({"type": "http.response.body", "body": TEXT, "more_body": True})
+        await send({"type": "http.response.body", "body": TEXT, "more_body": False})
+
+    messages = await call(CompressionMiddleware(streaming_app, minimum_size=100), headers=[("accept-encoding", "gzip")])
+    headers = response_headers(messages)
+    assert "content-encoding" not in headers
+    assert headers["vary"] == "Accept-Encoding"  # Compressible, so caches must still key on the encoding
+    assert b"".join(m["body"] for m in messages[1:]) == TEXT * 2
+
+
+async def test_weakens_the_etag_of_compressed_responses():
+    app = single_response_app(200, [("content-type", "application/json"), ("etag", '"v1"')], TEXT)
+    messages = await call(CompressionMiddleware(app, minimum_size=100), headers=[("accept-encoding", "gzip")])
+    headers = response_headers(messages)
+    assert headers["etag"] == 'W/"v1"'
+    assert headers["vary"] == "Accept-Encoding"
+    assert headers["content-length"] == str(len(messages[1]["body"]))
+
+
+async def test_compresses_large_bodies_off_the_event_loop():
+    app = CompressionMiddleware(single_response_app(200, [("content-type", "text/plain")], TEXT), 100, offload_size=1000)
+    messages = await call(app, headers=[("accept-encoding", "gzip")])
+    assert gzip.decompress(messages[1]["body"]) == TEXT
+
+
+def request_with(accept_encoding):
+    return Request({"type": "http", "headers": [(b"accept-encoding", accept_encoding.encode())]})
+
+
+def test_variant_response_reuses_each_encoding(monkeypatch):
+    monkeypatch.setattr(compression.settings, "COMPRESSION_MINIMUM_SIZE", 100)
+    variants = CompressedVariants(TEXT)
+    first = variant_response(variants, request_with("gzip"))
+    assert first.headers["content-encoding"] == "gzip"
+    assert first.headers["vary"] == "Accept-Encoding"
+    assert gzip.decompress(first.body) == TEXT
+
+    calls = []
+    monkeypatch.setattr(compression, "compress", lambda *args: calls.append(args))
+    assert variant_response(variants, request_with("gzip")).body == first.body
+    assert calls == []  # Served from the kept encoding
+
+    identity = variant_response(variants, request_with("identity"))
+    assert identity.body == TEXT
+    assert "content-encoding" not in identity.headers
+    assert identity.headers["vary"] == "Accept-Encoding"
+
+
+def test_variant_response_leaves_small_bodies_alone(monkeypatch):
+    monkeypatch.setattr(compression.settings, "COMPRESSION_MINIMUM_SIZE", 100)
+    response = variant_response(CompressedVariants(b"[]"), request_with("gzip"))
+    assert response.body == b"[]"
+    assert "content-encoding" not in response.headers
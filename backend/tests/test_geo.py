@@ -0,0 +1,91 @@
+import itertools
+
+import pytest
+
+from utils import geo
+
+
+def covered(ranges, lat, lng):
+    cell = geo.encode_cell(lat, lng)
+    return any(lo <= cell <= hi for lo, hi in ranges)
+
+
+def test_encode_cell_needs_both_coordinates():
+    assert geo.encode_cell(None, 2.17) is None
+    assert geo.encode_cell(41.39, None) is None
+    assert geo.encode_cell(41.39, 2.17) is not None
+
+
+def test_cell_range_contains_the_cell_at_every_level():
+    cell = geo.encode_cell(41.39, 2.17)
+    for level in (0, 5, 13, geo.CELL_BITS):
+        lo, hi = geo.cell_range(geo.cell_at_level(cell, level), level)
+        assert lo <= cell <= hi
+
+
+@pytest.mark.parametrize("bbox", [
+    (2.05, 41.32, 2.23, 41.47),  # A city
+    (-10.0, 35.0, 5.0, 44.0),  # A country
+    (-180.0, -90.0, 180.0, 90.0),  # The world
+])
+def test_cover_bbox_contains_every_point_in_the_box(bbox):
+    west, south, east, north = bbox
+    ranges = geo.cover_bbox(bbox)
+    assert 0 < len(ranges) <= geo.MAX_COVER_CELLS
+    steps = [i / 10 for i in range(11)]
+    for fx, fy in itertools.product(steps, steps):
+        assert covered(ranges, south + (north - south) * fy, west + (east - west) * fx)
+
+
+def test_cover_bbox_ranges_are_sorted_and_disjoint():
+    ranges = geo.cover_bbox((-10.0, 35.0, 5.0, 44.0))
+    for (_, hi), (lo, _) in zip(ranges, ranges[1:]):
+        assert hi + 1 < lo
+
+
+def test_cover_bbox_excludes_distant_points():
+    ranges = geo.cover_bbox((2.05, 41.32, 2.23, 41.47))
+    assert not covered(ranges, 40.42, -3.70)
+    assert not covered(ranges, -33.87, 151.21)
+
+
+def test_cover_bbox_splits_at_the_antimeridian():
+    # West of the east edge: the box runs from 170E across 180 to 170W
+    ranges = geo.cover_bbox((170.0, -10.0, -170.0, 10.0))
+    assert len(ranges) <= geo.MAX_COVER_CELLS
+    for lng in (170.0, 175.0, 179.99, -180.0, -175.0, -170.0):
+        for lat in (-10.0, 0.0, 10.0):
+            assert covered(ranges, lat, lng)
+    for lng in (0.0, 90.0, -90.0, 160.0, -160.0):
+        assert not covered(ranges, 0.0, lng)
+
+
+def test_radius_bbox_wraps_at_the_antimeridian():
+    west, south, east, north = geo.radius_bbox(0.0, 179.5, 200)
+    assert west > east  # Wrapped, the form cover_bbox splits
+    assert 177.0 < west < 179.5 and -180.0 < east < -178.0
+    assert south < 0.0 < north
+    ranges = geo.cover_bbox((west, south, east, north))
+    assert covered(ranges, 0.0, 179.9) and covered(ranges, 0.0, -179.5)
+
+
+def test_radius_bbox_clamps_latitudes():
+    west, south, east, north = geo.radius_bbox(89.5, 10.0, 200)
+    assert north == 90.0
+    assert (west, east) == (-180.0, 180.0)  # Near the pole the circle spans every longitude
+
+
+def test_parse_bbox():
+    assert geo.parse_bbox("2.05,41.32,2.23,41.47") == (2.05, 41.32, 2.23, 41.47)
+    with pytest.raises(ValueError):
+        geo.parse_bbox("2.05,41.32,2.23")
+    with pytest.raises(ValueError):
+        geo.parse_bbox("2.05,41.47,2.23,41.32")  # South above north
+    with pytest.raises(ValueError):
+        geo.parse_bbox("a,b,c,d")
+
+
+def test_parse_point():
+    assert geo.parse_point("41.39,2.17") == (41.39, 2.17)
+    with pytest.raises(ValueError):
+        geo.parse_point("91,0")
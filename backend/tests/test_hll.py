@@ -0,0 +1,67 @@
+import pytest
+
+from core.hll import PRECISION, SPARSE_FLAG, HyperLogLog
+
+
+def sketch_of(values, precision=PRECISION):
+    sketch = HyperLogLog(precision)
+    for value in values:
+        sketch.add(value)
+    return sketch
+
+
+def test_empty_sketch_counts_zero():
+    assert HyperLogLog().count() == 0
+
+
+@pytest.mark.parametrize("n", [1, 10, 100, 1000, 20000, 200000])
+def test_count_is_close_to_the_distinct_count(n):
+    sketch = sketch_of(f"192.0.2.{i}" for i in range(n))
+    assert sketch.count() == pytest.approx(n, rel=0.05, abs=1)
+
+
+def test_repeated_values_count_once():
+    sketch = sketch_of(["a", "b", "a", "a", "b"])
+    assert sketch.count() == 2
+
+
+def test_union_estimates_the_distinct_count_over_all_sketches():
+    monday = sketch_of(f"v{i}" for i in range(0, 6000))
+    tuesday = sketch_of(f"v{i}" for i in range(3000, 9000))
+    assert HyperLogLog.union([monday, tuesday]).count() == pytest.approx(9000, rel=0.05)
+    assert monday.count() == pytest.approx(6000, rel=0.05)  # union() leaves its inputs alone
+
+
+def test_update_matches_adding_everything_to_one_sketch():
+    merged = sketch_of(f"v{i}" for i in range(500)).update(sketch_of(f"v{i}" for i in range(400, 900)))
+    assert merged.registers == sketch_of(f"v{i}" for i in range(900)).registers
+
+
+def test_update_rejects_other_precisions():
+    with pytest.raises(ValueError):
+        HyperLogLog(10).update(HyperLogLog(12))
+
+
+def test_precision_is_bounded():
+    with pytest.raises(ValueError):
+        HyperLogLog(3)
+    with pytest.raises(ValueError):
+        HyperLogLog(17)
+
+
+def test_small_sketches_serialise_sparse():
+    sketch = sketch_of(["a", "b", "c"])
+    blob = sketch.to_bytes()
+    assert blob[0] == SPARSE_FLAG | PRECISION
+    assert len(blob) == 1 + 3 * 3
+    assert HyperLogLog.from_bytes(blob).registers == sketch.registers
+
+
+def test_large_sketches_serialise_dense():
+    sketch = sketch_of(f"v{i}" for i in range(20000))
+    blob = sketch.to_bytes()
+    assert blob[0] == PRECISION
+    assert len(blob) == 1 + sketch.m
+    restored = HyperLogLog.from_bytes(blob)
+    assert restored.registers == sketch.registers
+    assert restored.count() == sketch.count()
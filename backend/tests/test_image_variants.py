@@ -0,0 +1,28 @@
+import pytest
+from PIL import Image
+
+import models
+from core.config import settings
+from crud import table_versions
+from crud.image_variants import build_missing_variants
+
+
+@pytest.fixture
+def upload_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "IMAGE_VARIANT_WIDTHS", "32")
+    return tmp_path
+
+
+def test_backfill_invalidates_cached_property_representations(db, upload_dir):
+    (upload_dir / "properties").mkdir()
+    Image.new("RGB", (64, 48), "red").save(upload_dir / "properties" / "house_0123.png")
+    before = table_versions.get_version(db, table_versions.PROPERTIES).version
+
+    assert build_missing_variants(db) == 1
+    assert db.query(models.ImageVariant).filter_by(source="properties/house_0123.png").count() > 0
+    after = table_versions.get_version(db, table_versions.PROPERTIES).version
+    assert after == before + 1
+
+    assert build_missing_variants(db) == 0  # Nothing new: cached responses stay valid
+    assert table_versions.get_version(db, table_versions.PROPERTIES).version == after
@@ -0,0 +1,38 @@
+import pytest
+
+import models
+from crud.properties import property as crud_property
+from utils import geo
+
+
+@pytest.fixture
+def places(db):
+    """Properties around the antimeridian on the equator, by name."""
+    coordinates = {"east": 179.9, "west": -179.95, "further_west": -179.5, "far": 170.0}
+    ids = {}
+    for title, lng in coordinates.items():
+        prop = models.Property(title=title, price=1000.0, latitude=0.0, longitude=lng, geo_cell=geo.encode_cell(0.0, lng))
+        db.add(prop)
+        db.flush()
+        ids[title] = prop.id
+    db.commit()
+    return ids
+
+
+def titles(properties):
+    return [p.title for p in properties]
+
+
+def test_radius_search_reaches_across_the_antimeridian(db, places):
+    found = crud_property.get_properties(db, near=(0.0, 179.95), radius_km=70)
+    assert titles(found) == ["east", "west", "further_west"]  # Nearest first
+
+
+def test_radius_search_from_the_west_side(db, places):
+    found = crud_property.get_properties(db, near=(0.0, -179.99), radius_km=20)
+    assert titles(found) == ["west", "east"]
+
+
+def test_cursor_pages_filter_by_radius_in_their_own_order(db, places):
+    page, _ = crud_property.get_properties_page(db, order_by="newest", near=(0.0, 179.95), radius_km=70)
+    assert titles(page) == ["further_west", "west", "east"]
@@ -0,0 +1,85 @@
+import hashlib
+
+import pytest
+
+import models
+import schemas
+from core.database import engine
+from core.query_guard import TooManyQueries, count_queries
+from crud.properties import property as crud_property
+
+# The detail and list endpoints serialise everything they return from what these queries
+# load; a lazy load while serialising would show up here as an extra statement per row.
+DETAIL_QUERIES = 5  # Property with both users, main image derivatives, gallery, gallery derivatives, clicks with agents
+LISTING_QUERIES = 2  # Properties with both users, main image derivatives
+
+
+def add_variants(db, source):
+    for width in (320, 640):
+        for content_type, ext in (("image/webp", "webp"), ("image/avif", "avif")):
+            db.add(models.ImageVariant(
+                source=source, path=f"variants/{source}-{width}.{ext}",
+                content_type=content_type, width=width, height=width // 2, size=1000,
+            ))
+
+
+def add_property(db, owner, n, images=2, clicks=3):
+    main = f"objects/aa/main{n}.jpg"
+    prop = models.Property(
+        title=f"House {n}", description="", price=1000.0 * n, location="Barcelona",
+        bedrooms=2, bathrooms=1, square_feet=80, property_type="House",
+        image_url=f"http://localhost:8000/static/uploads/{main}", image_upload_path=main,
+        created_by_user_id=owner.id, assigned_to_id=owner.id,
+    )
+    db.add(prop)
+    db.flush()
+    add_variants(db, main)
+    for i in range(images):
+        gallery = f"objects/bb/gallery{n}-{i}.jpg"
+        db.add(models.PropertyImage(
+            property_id=prop.id, image_url=f"http://localhost:8000/static/uploads/{gallery}",
+            upload_path=gallery, order=i,
+        ))
+        add_variants(db, gallery)
+    for i in range(clicks):
+        agent = f"Mozilla/5.0 test {n}-{i}"
+        user_agent = models.UserAgent(digest=hashlib.blake2b(agent.encode(), digest_size=16).digest(), user_agent=agent)
+        db.add(user_agent)
+        db.flush()
+        db.add(models.PropertyClick(property_id=prop.id, user_agent_id=user_agent.id))
+    db.commit()
+    return prop.id
+
+
+@pytest.mark.parametrize("images,clicks", [(1, 1), (5, 10)])
+def test_get_property_full_loads_the_detail_in_fixed_queries(db, admin, images, clicks):
+    property_id = add_property(db, admin, 1, images=images, clicks=clicks)
+    db.expunge_all()
+
+    with count_queries(engine, max_queries=DETAIL_QUERIES) as counter:
+        prop = crud_property.get_property(db, property_id, full=True)
+        detail = schemas.Property.model_validate(prop, from_attributes=True)
+    assert counter.count == DETAIL_QUERIES
+    assert len(detail.images) == images and len(detail.clicks) == clicks
+    assert set(detail.image_srcset) == {"image/webp", "image/avif"}
+    assert all(image.srcset for image in detail.images)
+
+
+@pytest.mark.parametrize("count", [1, 8])
+def test_summary_listing_loads_a_page_in_fixed_queries(db, admin, count):
+    for n in range(count):
+        add_property(db, admin, n)
+    db.expunge_all()
+
+    with count_queries(engine, max_queries=LISTING_QUERIES) as counter:
+        page = [schemas.PropertySummary.model_validate(p, from_attributes=True) for p in crud_property.get_properties(db, limit=20)]
+    assert counter.count == LISTING_QUERIES
+    assert len(page) == count
+    assert all(summary.image_srcset for summary in page)
+
+
+def test_count_queries_raises_over_budget(db):
+    with pytest.raises(TooManyQueries):
+        with count_queries(engine, max_queries=1):
+            db.query(models.User).all()
+            db.query(models.Property).all()
@@ -0,0 +1,94 @@
+import gzip
+
+import pytest
+from starlette.applications import Starlette
+from starlette.routing import Mount
+from starlette.testclient import TestClient
+
+from core.config import settings
+from core.static import UploadStaticFiles, accepts_encoding
+
+DIGEST = "ab" * 32
+TEXT = b"body { color: black; }\n" * 50
+
+
+@pytest.fixture
+def files(tmp_path):
+    (tmp_path / "ab").mkdir()
+    (tmp_path / "ab" / f"{DIGEST}.png").write_bytes(b"\x89PNG\r\n\x1a\n" + b"\0" * 100)
+    (tmp_path / "ab" / f"{DIGEST}-480w.webp").write_bytes(b"RIFF" + b"\0" * 100)
+    (tmp_path / "logo.png").write_bytes(b"\x89PNG\r\n\x1a\n")
+    (tmp_path / "site.css").write_bytes(TEXT)
+    (tmp_path / "site.css.gz").write_bytes(gzip.compress(TEXT))
+    (tmp_path / ".0123abcd.part").write_bytes(b"half an upload")
+    (tmp_path / ".hidden").mkdir()
+    (tmp_path / ".hidden" / "file.txt").write_bytes(b"secret")
+    return tmp_path
+
+
+@pytest.fixture
+def client(files):
+    app = Starlette(routes=[Mount("/static", UploadStaticFiles(directory=str(files)))])  # As main.py mounts it
+    return TestClient(app, base_url="http://testserver/static")
+
+
+def test_content_addressed_files_are_immutable(client):
+    response = client.get(f"/ab/{DIGEST}.png")
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == "public, max-age=31536000, immutable"
+    assert response.headers["etag"] == f'"{DIGEST}.png"'
+    assert "vary" not in response.headers  # Images are never served encoded
+
+    variant = client.get(f"/ab/{DIGEST}-480w.webp")
+    assert variant.headers["cache-control"].endswith("immutable")
+
+
+def test_other_files_are_cached_for_the_configured_time(client, monkeypatch):
+    monkeypatch.setattr(settings, "STATIC_MAX_AGE_SECONDS", 120)
+    response = client.get("/logo.png")
+    assert response.headers["cache-control"] == "public, max-age=120"
+    assert response.headers["etag"] != '"logo.png"'
+
+
+def test_revalidation_answers_not_modified(client):
+    etag = client.get(f"/ab/{DIGEST}.png").headers["etag"]
+    response = client.get(f"/ab/{DIGEST}.png", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["cache-control"].endswith("immutable")
+
+
+@pytest.mark.parametrize("path", ["/.0123abcd.part", "/.hidden/file.txt", "/missing.png"])
+def test_hidden_and_missing_files_are_not_found(client, path):
+    assert client.get(path).status_code == 404
+
+
+def test_serves_a_precompressed_sidecar(client):
+    response = client.get("/site.css", headers={"Accept-Encoding": "br, gzip"})  # No .br next to it
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.content == TEXT  # Decoded by the client
+
+    identity = client.get("/site.css", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in identity.headers
+    assert identity.content == TEXT
+    assert identity.headers["vary"] == "Accept-Encoding"
+
+
+def test_accel_redirect_hands_the_file_to_nginx(client, monkeypatch):
+    monkeypatch.setattr(settings, "STATIC_ACCEL_REDIRECT_PREFIX", "/_static/")
+    response = client.get(f"/ab/{DIGEST}.png")
+    assert response.status_code == 200
+    assert response.content == b""
+    assert response.headers["x-accel-redirect"] == f"/_static/ab/{DIGEST}.png"
+    assert response.headers["content-type"] == "image/png"
+    assert response.headers["cache-control"].endswith("immutable")
+    assert client.get("/.0123abcd.part").status_code == 404
+
+
+def test_accepts_encoding():
+    assert accepts_encoding("gzip, deflate", "gzip")
+    assert accepts_encoding("*", "br")
+    assert not accepts_encoding("gzip;q=0", "gzip")
+    assert not accepts_encoding("gzip", "br")
+    assert not accepts_encoding(None, "gzip")
@@ -0,0 +1,156 @@
+import hashlib
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+import models
+import schemas
+from core import uploads
+from core.config import settings
+from core.database import SessionLocal
+from crud import stored_files
+from crud.properties import property as crud_property
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"stored file test" * 10
+JPEG = b"\xff\xd8\xff\xe0" + b"another stored file" * 10
+
+
+@pytest.fixture(autouse=True)
+def upload_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path))
+    return tmp_path
+
+
+def store(content: bytes) -> uploads.SavedUpload:
+    """Put bytes in the store the way a finished upload does, before it is recorded."""
+    temp = uploads.temp_path()
+    with open(temp, "wb") as f:
+        f.write(content)
+    digest = hashlib.sha256(content).hexdigest()
+    content_type = uploads.sniff_image_type(content)
+    relative, pending = uploads.commit_to_store(temp, digest, content_type)
+    return uploads._saved(relative, len(content), content_type, digest, pending)
+
+
+def upload(db, content: bytes) -> uploads.SavedUpload:
+    return stored_files.record_upload(db, store(content))
+
+
+def url(saved: uploads.SavedUpload) -> str:
+    return f"http://localhost:8000/static/uploads/{saved.path}"
+
+
+def on_disk(saved: uploads.SavedUpload) -> bool:
+    return os.path.exists(os.path.join(settings.UPLOAD_DIR, saved.path))
+
+
+def row(db, saved: uploads.SavedUpload):
+    db.expire_all()
+    return db.query(models.StoredFile).filter_by(digest=saved.digest).first()
+
+
+def age(db, saved: uploads.SavedUpload, hours: float):
+    db.query(models.StoredFile).filter_by(digest=saved.digest).update(
+        {models.StoredFile.unreferenced_since: datetime.utcnow() - timedelta(hours=hours)}
+    )
+    db.commit()
+
+
+def no_temp_files():
+    store_dir = os.path.join(settings.UPLOAD_DIR, uploads.STORE_DIR)
+    return not [name for name in os.listdir(store_dir) if name.startswith(".")]
+
+
+def test_record_upload_registers_each_file_once(db):
+    first = upload(db, PNG)
+    repeat = upload(db, PNG)
+    assert (first.existed, repeat.existed) == (False, True)
+    assert repeat.path == first.path and repeat.pending is None
+    assert db.query(models.StoredFile).count() == 1
+    stored = row(db, first)
+    assert stored.ref_count == 0 and stored.unreferenced_since is not None
+    assert no_temp_files()
+
+
+def test_property_writes_count_references(db, admin):
+    main, gallery = upload(db, PNG), upload(db, JPEG)
+    prop = crud_property.create_property(db, schemas.PropertyCreate(
+        title="House", image_url=url(main), additional_image_urls=[url(gallery), url(main)],
+    ), admin)
+    assert (row(db, main).ref_count, row(db, gallery).ref_count) == (2, 1)
+    assert row(db, main).unreferenced_since is None
+
+    crud_property.update_property(db, prop, schemas.PropertyUpdate(image_url=url(gallery)))
+    assert (row(db, main).ref_count, row(db, gallery).ref_count) == (1, 2)
+
+    crud_property.delete_property(db, prop)
+    assert (row(db, main).ref_count, row(db, gallery).ref_count) == (0, 0)
+    assert row(db, main).unreferenced_since is not None
+
+
+def test_collects_files_unreferenced_past_the_grace_period(db):
+    old, recent = upload(db, PNG), upload(db, JPEG)
+    variant = f"{os.path.dirname(old.path)}/{old.digest}-320w.webp"
+    with open(os.path.join(settings.UPLOAD_DIR, variant), "wb") as f:
+        f.write(b"variant")
+    db.add(models.ImageVariant(source=old.path, path=variant, content_type="image/webp", width=320, height=200, size=7))
+    db.commit()
+    age(db, old, 48)
+    age(db, recent, 1)
+
+    assert stored_files.collect_unreferenced_files(db, grace_hours=24) == 1
+    assert row(db, old) is None and not on_disk(old)
+    assert not os.path.exists(os.path.join(settings.UPLOAD_DIR, variant))
+    assert db.query(models.ImageVariant).count() == 0
+    assert row(db, recent) is not None and on_disk(recent)
+    assert no_temp_files()
+
+
+def test_collection_repairs_missed_references_instead_of_deleting(db):
+    in_property, in_settings = upload(db, PNG), upload(db, JPEG)
+    # Written without going through the CRUD, so nothing was counted
+    db.add(models.Property(title="House", image_url=url(in_property)))
+    db.add(models.SiteSettings(key="home_background_url", value={"url": url(in_settings)}))
+    db.commit()
+    age(db, in_property, 48)
+    age(db, in_settings, 48)
+
+    assert stored_files.collect_unreferenced_files(db, grace_hours=24) == 0
+    assert on_disk(in_property) and on_disk(in_settings)
+    # Site settings are not counted on write, but they are checked before anything is deleted
+    assert (row(db, in_property).ref_count, row(db, in_settings).ref_count) == (1, 1)
+
+
+def test_reupload_during_collection_keeps_the_file(db, monkeypatch):
+    saved = upload(db, PNG)
+    age(db, saved, 48)
+    set_aside = stored_files._set_aside
+    reuploads = []
+
+    def set_aside_then_reupload(relative):
+        aside = set_aside(relative)
+        other = SessionLocal()  # The same bytes arrive while the file is out of place
+        try:
+            reuploads.append(upload(other, PNG))
+        finally:
+            other.close()
+        return aside
+
+    monkeypatch.setattr(stored_files, "_set_aside", set_aside_then_reupload)
+    assert stored_files.collect_unreferenced_files(db, grace_hours=24) == 0
+    assert not reuploads[0].existed  # Its copy was put in place
+    assert row(db, saved) is not None and on_disk(saved)
+    with open(os.path.join(settings.UPLOAD_DIR, saved.path), "rb") as f:
+        assert f.read() == PNG
+    assert no_temp_files()
+
+
+def test_reconcile_references_recounts_from_the_tables(db):
+    saved = upload(db, PNG)
+    db.add(models.Property(title="House", image_url=url(saved)))
+    db.add(models.TeamMember(name="Agent", image_url=url(saved)))
+    db.commit()
+    assert stored_files.reconcile_references(db) == 1
+    assert row(db, saved).ref_count == 2
+    assert stored_files.reconcile_references(db) == 0
@@ -0,0 +1,106 @@
+import math
+import random
+
+import pytest
+
+from core import trending as trending_module
+from core.trending import RESCALE_AT, TrendingScores
+
+HALF_LIFE = 3600.0
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_700_000_000.0]
+    monkeypatch.setattr(trending_module.time, "time", lambda: now[0])
+    return now
+
+
+def ranked(scores: TrendingScores, limit: int):
+    return [pid for pid, _ in scores.top(limit)]
+
+
+def brute_force_top(scores: TrendingScores, limit: int):
+    return [pid for pid, _ in sorted(scores.snapshot().items(), key=lambda item: (-item[1], item[0]))[:limit]]
+
+
+def test_scores_halve_every_half_life(clock):
+    scores = TrendingScores(half_life_seconds=HALF_LIFE)
+    scores.record(1)
+    clock[0] += HALF_LIFE
+    [(pid, score)] = scores.top(1)
+    assert pid == 1
+    assert score == pytest.approx(0.5)
+
+
+def test_recent_clicks_outweigh_old_ones(clock):
+    scores = TrendingScores(half_life_seconds=HALF_LIFE)
+    for _ in range(3):
+        scores.record(1, at=clock[0] - 3 * HALF_LIFE)  # Worth 3/8 now
+    scores.record(2)
+    assert ranked(scores, 2) == [2, 1]
+
+
+def test_heap_keeps_the_top_k(clock):
+    scores = TrendingScores(half_life_seconds=HALF_LIFE, top_k=3)
+    for pid in range(1, 11):
+        scores.record(pid, weight=pid)
+    assert ranked(scores, 10) == [10, 9, 8]
+    scores.record(1, weight=100)  # Climbs into the top K, evicting the lowest
+    assert ranked(scores, 3) == [1, 10, 9]
+    assert ranked(scores, 2) == [1, 10]
+
+
+def test_heap_matches_a_full_sort(clock):
+    rng = random.Random(7)
+    scores = TrendingScores(half_life_seconds=HALF_LIFE, top_k=10)
+    for _ in range(5000):
+        clock[0] += rng.random() * 5
+        scores.record(rng.randint(1, 200), weight=rng.choice([1, 1, 1, 5]))
+    assert ranked(scores, 10) == brute_force_top(scores, 10)
+    assert len(scores._heap) <= 4 * scores.top_k + 1  # Stale entries are compacted
+
+
+def test_discard_lets_the_next_property_in(clock):
+    scores = TrendingScores(half_life_seconds=HALF_LIFE, top_k=2)
+    for pid in (1, 2, 3):
+        scores.record(pid, weight=pid)
+    scores.discard(3)
+    assert ranked(scores, 2) == [2, 1]
+    assert 3 not in scores.snapshot()
+
+
+def test_rescale_keeps_scores_and_order(clock):
+    scores = TrendingScores(half_life_seconds=HALF_LIFE, top_k=5)
+    scores.record(1, weight=4)
+    scores.record(2, weight=2)
+    t0 = scores._t0
+    # Far enough ahead that exp((t - t0) / tau) would be enormous without a rescale
+    clock[0] += (RESCALE_AT + 10) * scores.tau
+    scores.record(3)
+    assert scores._t0 > t0
+    assert all(math.isfinite(value) for value in scores._scores.values())
+    assert ranked(scores, 3) == [3, 1, 2]
+    snapshot = scores.snapshot()
+    assert snapshot[3] == pytest.approx(1.0)
+    assert snapshot[1] == pytest.approx(2 * snapshot[2])
+
+
+def test_pending_round_trip(clock):
+    scores = TrendingScores(half_life_seconds=HALF_LIFE)
+    scores.record(1)
+    scores.record(2, weight=2)
+    pending = scores.take_pending()
+    assert pending == {1: pytest.approx(1.0), 2: pytest.approx(2.0)}
+    assert scores.take_pending() == {}
+    scores.restore_pending(pending)
+    assert scores.take_pending() == {1: pytest.approx(1.0), 2: pytest.approx(2.0)}
+
+
+def test_load_adds_unpersisted_clicks(clock):
+    scores = TrendingScores(half_life_seconds=HALF_LIFE)
+    scores.record(1)
+    scores.load({1: 5.0, 2: 3.0, 3: 0.0})
+    snapshot = scores.snapshot()
+    assert snapshot == {1: pytest.approx(6.0), 2: pytest.approx(3.0)}
+    assert ranked(scores, 5) == [1, 2]
@@ -0,0 +1,131 @@
+import fcntl
+import hashlib
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+import models
+from auth.utils import get_password_hash
+from core import uploads
+from core.config import settings
+from core.uploads import UploadRejected, finish_file
+from crud import upload_sessions
+
+IMAGE = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 40
+
+
+@pytest.fixture(autouse=True)
+def upload_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path))
+    return tmp_path
+
+
+def start(client, headers, size=len(IMAGE)):
+    response = client.post("/api/uploads/sessions/", json={"upload_type": "properties", "size": size}, headers=headers)
+    assert response.status_code == 201
+    return response.json()
+
+
+def put(client, headers, session, offset, data):
+    return client.put(f"/api/uploads/sessions/{session['id']}/", params={"offset": offset}, content=data, headers=headers)
+
+
+def complete(client, headers, session):
+    return client.post(f"/api/uploads/sessions/{session['id']}/complete/", headers=headers)
+
+
+def test_chunked_upload_resumes_and_completes(client, admin_headers):
+    session = start(client, admin_headers)
+    assert session["offset"] == 0
+    assert put(client, admin_headers, session, 0, IMAGE[:4000]).json()["offset"] == 4000
+
+    # A client that lost track of what arrived asks, then continues from there
+    mismatch = put(client, admin_headers, session, 2000, IMAGE[2000:])
+    assert mismatch.status_code == 409
+    offset = client.get(f"/api/uploads/sessions/{session['id']}/", headers=admin_headers).json()["offset"]
+    assert offset == 4000
+    assert put(client, admin_headers, session, offset, IMAGE[offset:]).json()["offset"] == len(IMAGE)
+
+    response = complete(client, admin_headers, session)
+    assert response.status_code == 200
+    digest = hashlib.sha256(IMAGE).hexdigest()
+    assert response.json()["url"].endswith(uploads.store_path(digest, "image/png"))
+    with open(os.path.join(settings.UPLOAD_DIR, uploads.store_path(digest, "image/png")), "rb") as f:
+        assert f.read() == IMAGE
+
+    # The session is gone, and completing it again finds nothing
+    assert client.get(f"/api/uploads/sessions/{session['id']}/", headers=admin_headers).status_code == 404
+    assert complete(client, admin_headers, session).status_code == 404
+    assert not os.path.exists(upload_sessions.session_path(session["id"]))
+
+
+def test_rejects_chunks_past_the_declared_size(client, admin_headers):
+    session = start(client, admin_headers, size=100)
+    assert put(client, admin_headers, session, 0, IMAGE[:101]).status_code == 413
+
+
+def test_rejects_a_first_chunk_that_is_not_an_image(client, admin_headers):
+    session = start(client, admin_headers, size=100)
+    assert put(client, admin_headers, session, 0, b"plain text, not an image").status_code == 415
+
+
+def test_cannot_complete_an_incomplete_upload(client, admin_headers):
+    session = start(client, admin_headers)
+    put(client, admin_headers, session, 0, IMAGE[:100])
+    assert complete(client, admin_headers, session).status_code == 409
+    assert client.get(f"/api/uploads/sessions/{session['id']}/", headers=admin_headers).json()["offset"] == 100
+
+
+def test_sessions_belong_to_their_user(db, admin):
+    manager = models.User(
+        username="manager", email="manager@example.com",
+        password_hash=get_password_hash("password"), role=models.Role.manager,
+    )
+    db.add(manager)
+    db.commit()
+    own = upload_sessions.create_session(db, manager, "properties", 100)
+    other = upload_sessions.create_session(db, admin, "properties", 100)
+    assert upload_sessions.get_session(db, own.id, manager) is own
+    assert upload_sessions.get_session(db, other.id, manager) is None
+    assert upload_sessions.get_session(db, own.id, admin) is own  # Admins may resume anyone's
+
+
+def test_finish_file_refuses_a_file_being_written(tmp_path):
+    path = str(tmp_path / "session.part")
+    with open(path, "wb") as f:
+        f.write(IMAGE)
+    with open(path, "ab") as writer:
+        fcntl.flock(writer, fcntl.LOCK_EX)  # A chunk is still being appended
+        with pytest.raises(UploadRejected) as excinfo:
+            finish_file(path, len(IMAGE))
+        assert excinfo.value.status_code == 409
+    with pytest.raises(UploadRejected) as excinfo:
+        finish_file(path, len(IMAGE) + 1)
+    assert excinfo.value.status_code == 409
+
+    saved = finish_file(path, len(IMAGE))
+    assert saved.size == len(IMAGE) and not os.path.exists(path)
+    with pytest.raises(UploadRejected) as excinfo:
+        finish_file(path, len(IMAGE))  # Completed already
+    assert excinfo.value.status_code == 404
+
+
+def test_expire_sessions_removes_idle_sessions_and_orphans(db, admin):
+    live = upload_sessions.create_session(db, admin, "properties", 100)
+    idle = upload_sessions.create_session(db, admin, "properties", 100)
+    idle.expires_at = datetime.utcnow() - timedelta(minutes=1)
+    db.commit()
+    orphan = uploads.temp_path()  # A streamed upload abandoned by a dead process
+    open(orphan, "wb").close()
+    recent = uploads.temp_path()
+    open(recent, "wb").close()
+    stale = datetime.utcnow().timestamp() - settings.UPLOAD_SESSION_TTL_HOURS * 3600 - 60
+    for path in (upload_sessions.session_path(idle.id), upload_sessions.session_path(live.id), orphan):
+        os.utime(path, (stale, stale))
+
+    assert upload_sessions.expire_sessions(db) == 2
+    assert db.query(models.UploadSession).count() == 1
+    assert os.path.exists(upload_sessions.session_path(live.id))
+    assert not os.path.exists(upload_sessions.session_path(idle.id))
+    assert not os.path.exists(orphan) and os.path.exists(recent)
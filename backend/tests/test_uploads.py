@@ -0,0 +1,199 @@
+import hashlib
+import os
+
+import pytest
+from starlette.requests import Request
+
+from core import uploads
+from core.config import settings
+from core.uploads import SavedUpload, UploadRejected, _FilePart, receive_upload, receive_uploads
+
+pytestmark = pytest.mark.anyio
+
+BOUNDARY = "testboundary"
+PNG = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 4
+JPEG = b"\xff\xd8\xff\xe0" + b"\x00\x10JFIF" + bytes(1000)
+TINY_GIF = b"GIF89a\x01\x00"  # Shorter than the magic-bytes window
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture(autouse=True)
+def upload_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path))
+    return tmp_path
+
+
+def multipart(*parts):
+    """Encode (field name, filename, bytes) parts as a multipart/form-data body."""
+    body = b""
+    for name, filename, data in parts:
+        body += (
+            f"--{BOUNDARY}\r\n"
+            f'Content-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+            "Content-Type: application/octet-stream\r\n\r\n"
+        ).encode() + data + b"\r\n"
+    return body + f"--{BOUNDARY}--\r\n".encode()
+
+
+def make_request(body: bytes, chunk_size: int = 100, content_length: bool = True) -> Request:
+    headers = [(b"content-type", f"multipart/form-data; boundary={BOUNDARY}".encode())]
+    if content_length:
+        headers.append((b"content-length", str(len(body)).encode()))
+    chunks = [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)] or [b""]
+
+    async def receive():
+        chunk = chunks.pop(0)
+        return {"type": "http.request", "body": chunk, "more_body": bool(chunks)}
+
+    return Request({"type": "http", "method": "POST", "path": "/", "headers": headers}, receive)
+
+
+def stored(saved: SavedUpload) -> bytes:
+    with open(os.path.join(settings.UPLOAD_DIR, saved.path), "rb") as f:
+        return f.read()
+
+
+def leftover_temp_files():
+    store = os.path.join(settings.UPLOAD_DIR, uploads.STORE_DIR)
+    if not os.path.isdir(store):
+        return []
+    return [name for name in os.listdir(store) if name.endswith(".part")]
+
+
+async def test_file_part_hashes_and_stores_in_small_writes():
+    part = _FilePart(max_bytes=len(PNG))
+    for i in range(0, len(PNG), 5):
+        await part.write([PNG[i:i + 5]])
+    saved = await part.finish()
+    digest = hashlib.sha256(PNG).hexdigest()
+    assert saved.digest == digest
+    assert saved.path == uploads.store_path(digest, "image/png")
+    assert (saved.size, saved.content_type) == (len(PNG), "image/png")
+    assert stored(saved) == PNG
+    assert part.done
+
+
+async def test_file_part_rejects_unknown_types_once_the_magic_bytes_arrive():
+    part = _FilePart(max_bytes=1024)
+    await part.write([b"GIF8"])  # Not enough to tell yet
+    with pytest.raises(UploadRejected) as excinfo:
+        await part.write([b"xx not an image"])
+    assert excinfo.value.status_code == 415
+
+
+async def test_file_part_rejects_oversized_files():
+    part = _FilePart(max_bytes=100)
+    await part.write([PNG[:60]])
+    with pytest.raises(UploadRejected) as excinfo:
+        await part.write([PNG[60:120]])
+    assert excinfo.value.status_code == 413
+    await part.discard()
+    assert not os.path.exists(part.temp_path)
+
+
+async def test_file_part_result_reports_empty_files():
+    part = _FilePart(max_bytes=100)
+    result = await part.result()
+    assert isinstance(result, UploadRejected) and result.status_code == 400
+
+
+async def test_receive_upload_streams_the_file_into_the_store():
+    saved = await receive_upload(make_request(multipart(("file", "house.png", PNG)), chunk_size=7))
+    assert stored(saved) == PNG
+    assert not saved.existed and saved.pending is None
+    assert leftover_temp_files() == []
+
+
+async def test_receive_upload_accepts_files_shorter_than_the_magic_bytes():
+    saved = await receive_upload(make_request(multipart(("file", "dot.gif", TINY_GIF))))
+    assert saved.content_type == "image/gif"
+    assert stored(saved) == TINY_GIF
+
+
+async def test_receive_upload_rejects_non_images_and_cleans_up():
+    with pytest.raises(UploadRejected) as excinfo:
+        await receive_upload(make_request(multipart(("file", "notes.txt", b"just some text here"))))
+    assert excinfo.value.status_code == 415
+    assert leftover_temp_files() == []
+
+
+async def test_receive_upload_needs_the_named_field():
+    with pytest.raises(UploadRejected) as excinfo:
+        await receive_upload(make_request(multipart(("other", "house.png", PNG))))
+    assert excinfo.value.status_code == 400
+
+
+
+
+async def test_receive_uploads_reports_each_file_and_keeps_going():
+    body = multipart(
+        ("files", "one.png", PNG),
+        ("files", "bad.txt", b"definitely not an image"),
+        ("files", "empty.png", b""),
+        ("files", "two.jpg", JPEG),
+    )
+    results = [item async for item in receive_uploads(make_request(body, chunk_size=64))]
+    assert [name for name, _ in results] == ["one.png", "bad.txt", "empty.png", "two.jpg"]
+    one, bad, empty, two = (result for _, result in results)
+    assert stored(one) == PNG and stored(two) == JPEG
+    assert isinstance(bad, UploadRejected) and bad.status_code == 415
+    assert isinstance(empty, UploadRejected) and empty.status_code == 400
+    assert leftover_temp_files() == []
+
+
+async def test_receive_uploads_rejects_oversized_files_individually():
+    body = multipart(("files", "big.png", PNG), ("files", "dot.gif", TINY_GIF))
+    results = [result async for _, result in receive_uploads(make_request(body), max_bytes=100)]
+    assert isinstance(results[0], UploadRejected) and results[0].status_code == 413
+    assert isinstance(results[1], SavedUpload)
+
+
+async def test_receive_uploads_limits_the_number_of_files():
+    body = multipart(*[("files", f"{i}.gif", TINY_GIF) for i in range(3)])
+    with pytest.raises(UploadRejected) as excinfo:
+        async for _ in receive_uploads(make_request(body, chunk_size=len(body)), max_files=2):
+            pass
+    assert excinfo.value.status_code == 413
+
+
+@pytest.mark.parametrize("content_length", [True, False])
+async def test_receive_uploads_limits_the_total_size(content_length):
+    body = multipart(("files", "one.png", PNG), ("files", "two.png", PNG))
+    request = make_request(body, content_length=content_length)
+    with pytest.raises(UploadRejected) as excinfo:
+        async for _ in receive_uploads(request, max_total_bytes=len(PNG) + 200):
+            pass
+    assert excinfo.value.status_code == 413
+    assert leftover_temp_files() == []
+
+
+async def test_receive_uploads_needs_files():
+    with pytest.raises(UploadRejected) as excinfo:
+        async for _ in receive_uploads(make_request(multipart(("other", "a.png", PNG)))):
+            pass
+    assert excinfo.value.status_code == 400
+
+
+async def test_repeat_upload_keeps_its_copy_until_settled():
+    first = await receive_upload(make_request(multipart(("file", "a.png", PNG))))
+    repeat = await receive_upload(make_request(multipart(("file", "b.png", PNG))))
+    assert repeat.path == first.path
+    assert repeat.existed and os.path.exists(repeat.pending)
+
+    settled = uploads.settle(repeat)
+    assert settled.existed and settled.pending is None
+    assert not os.path.exists(repeat.pending)
+
+
+async def test_settle_restores_a_stored_file_collected_meanwhile():
+    first = await receive_upload(make_request(multipart(("file", "a.jpg", JPEG))))
+    repeat = await receive_upload(make_request(multipart(("file", "b.jpg", JPEG))))
+    os.remove(os.path.join(settings.UPLOAD_DIR, first.path))  # Garbage-collected in between
+
+    settled = uploads.settle(repeat)
+    assert not settled.existed and settled.pending is None
+    assert stored(settled) == JPEG
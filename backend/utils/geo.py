@@ -0,0 +1,130 @@
+import math
+from typing import List, Optional, Tuple
+
+# Spatial indexing for property coordinates.
+#
+# Each point is quantised onto a 2^26 x 2^26 lat/lng grid (~0.6m cells) and the row and
+# column bits are interleaved into one Morton (Z-order) integer, stored in
+# properties.geo_cell. Truncating the low bits gives the enclosing cell at any coarser
+# level, and every cell at every level is one contiguous integer range, so a viewport
+# becomes a handful of indexed BETWEEN scans on a plain B-tree column.
+
+CELL_BITS = 26  # Bits per axis at full resolution
+MAX_COVER_CELLS = 32  # Upper bound on the cells (ranges) used to cover one bounding box
+KM_PER_DEGREE = 111.32
+
+BBox = Tuple[float, float, float, float]  # (west, south, east, north), i.e. Leaflet toBBoxString() order
+
+
+def _quantise(value: float, lower: float, span: float) -> int:
+    scaled = int((value - lower) / span * (1 << CELL_BITS))
+    return min(max(scaled, 0), (1 << CELL_BITS) - 1)
+
+
+def _interleave(x: int, y: int) -> int:
+    cell = 0
+    for bit in range(CELL_BITS):
+        cell |= ((x >> bit) & 1) << (2 * bit)
+        cell |= ((y >> bit) & 1) << (2 * bit + 1)
+    return cell
+
+
+def grid_xy(lat: float, lng: float) -> Tuple[int, int]:
+    return _quantise(lng, -180.0, 360.0), _quantise(lat, -90.0, 180.0)
+
+
+def encode_cell(lat: Optional[float], lng: Optional[float]) -> Optional[int]:
+    """Full-resolution Morton cell for a coordinate, or None if either part is missing."""
+    if lat is None or lng is None:
+        return None
+    return _interleave(*grid_xy(lat, lng))
+
+
+def cell_at_level(cell: int, level: int) -> int:
+    """Truncate a full-resolution cell to the enclosing cell with `level` bits per axis."""
+    return cell >> (2 * (CELL_BITS - level))
+
+
+def cell_range(cell: int, level: int) -> Tuple[int, int]:
+    """Inclusive range of full-resolution cells covered by a cell at `level`."""
+    shift = 2 * (CELL_BITS - level)
+    return cell << shift, ((cell + 1) << shift) - 1
+
+
+def cover_bbox(bbox: BBox, max_cells: int = MAX_COVER_CELLS) -> List[Tuple[int, int]]:
+    """
+    Return merged inclusive geo_cell ranges that together contain every point in bbox.
+
+    Picks the finest level at which the box needs at most max_cells cells. A box whose
+    west edge is east of its east edge crosses the antimeridian and is split in two.
+    """
+    west, south, east, north = bbox
+    if west > east:
+        halves = [(west, south, 180.0, north), (-180.0, south, east, north)]
+        return _merge_ranges([r for half in halves for r in cover_bbox(half, max_cells // 2 or 1)])
+
+    x0, y0 = grid_xy(south, west)
+    x1, y1 = grid_xy(north, east)
+    level = CELL_BITS
+    while level > 0:
+        shift = CELL_BITS - level
+        cells = ((x1 >> shift) - (x0 >> shift) + 1) * ((y1 >> shift) - (y0 >> shift) + 1)
+        if cells <= max_cells:
+            break
+        level -= 1
+    shift = CELL_BITS - level
+    ranges = []
+    for cx in range(x0 >> shift, (x1 >> shift) + 1):
+        for cy in range(y0 >> shift, (y1 >> shift) + 1):
+            ranges.append(cell_range(_interleave(cx, cy), level))
+    return _merge_ranges(ranges)
+
+
+def _merge_ranges(ranges: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    merged: List[Tuple[int, int]] = []
+    for lo, hi in sorted(ranges):
+        if merged and lo <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], hi))
+        else:
+            merged.append((lo, hi))
+    return merged
+
+
+def radius_bbox(lat: float, lng: float, radius_km: float) -> BBox:
+    """
+    Bounding box enclosing a circle. Latitudes are clamped at the poles; a circle crossing
+    the antimeridian gives a wrapped box (west > east), which cover_bbox splits in two.
+    """
+    dlat = radius_km / KM_PER_DEGREE
+    dlng = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-6))
+    south, north = max(lat - dlat, -90.0), min(lat + dlat, 90.0)
+    if dlng >= 180.0:
+        return -180.0, south, 180.0, north
+    west, east = lng - dlng, lng + dlng
+    if west < -180.0:
+        west += 360.0
+    if east > 180.0:
+        east -= 360.0
+    return west, south, east, north
+
+
+def parse_bbox(value: str) -> BBox:
+    """Parse 'west,south,east,north'. Raises ValueError on malformed or out-of-range input."""
+    parts = [float(p) for p in value.split(",")]
+    if len(parts) != 4:
+        raise ValueError("bbox must be 'west,south,east,north'")
+    west, south, east, north = parts
+    if not (-180 <= west <= 180 and -180 <= east <= 180 and -90 <= south <= north <= 90):
+        raise ValueError("bbox coordinates out of range")
+    return west, south, east, north
+
+
+def parse_point(value: str) -> Tuple[float, float]:
+    """Parse 'lat,lng'. Raises ValueError on malformed or out-of-range input."""
+    parts = [float(p) for p in value.split(",")]
+    if len(parts) != 2:
+        raise ValueError("near must be 'lat,lng'")
+    lat, lng = parts
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        raise ValueError("near coordinates out of range")
+    return lat, lng
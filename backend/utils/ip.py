@@ -0,0 +1,24 @@
+import ipaddress
+from typing import Optional
+
+# Binary IP addresses for property_clicks.ip: 4 bytes for IPv4, 16 for IPv6, instead of up to
+# 39 characters of text. IPv4-mapped IPv6 addresses are stored as plain IPv4. Client hosts
+# that are not IP addresses (e.g. a unix socket path) are not stored.
+
+
+def pack_ip(address: Optional[str]) -> Optional[bytes]:
+    if not address:
+        return None
+    try:
+        ip = ipaddress.ip_address(address.split("%", 1)[0])  # Drop an IPv6 zone id
+    except ValueError:
+        return None
+    if ip.version == 6 and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return ip.packed
+
+
+def unpack_ip(packed: Optional[bytes]) -> Optional[str]:
+    if not packed:
+        return None
+    return str(ipaddress.ip_address(bytes(packed)))
@@ -0,0 +1,36 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from core.config import settings
+
+# Uploaded files are served by the /static mount from UPLOAD_DIR. Their public URL is
+# API_BASE_URL + /static/uploads/ + the path relative to UPLOAD_DIR; that relative path is
+# what the database stores to find an upload's derivatives.
+
+UPLOAD_URL_PREFIX = "/static/uploads/"
+
+
+def upload_url(path: str) -> str:
+    """Public URL of the file at `path` (relative to UPLOAD_DIR)."""
+    return f"{settings.API_BASE_URL}{UPLOAD_URL_PREFIX}{path}"
+
+
+def upload_path(url: Optional[str]) -> Optional[str]:
+    """Inverse of upload_url, ignoring the host; None for URLs that are not local uploads."""
+    if not url:
+        return None
+    path = urlsplit(str(url)).path
+    if not path.startswith(UPLOAD_URL_PREFIX):
+        return None
+    relative = path[len(UPLOAD_URL_PREFIX):]
+    if not relative or ".." in relative.split("/"):
+        return None
+    return relative
+
+
+def srcset(variants: Iterable[Tuple[str, int, str]]) -> Dict[str, str]:
+    """Group (content_type, width, path) triples into {content_type: "<url> 320w, <url> 640w, ..."}."""
+    grouped: Dict[str, List[str]] = {}
+    for content_type, width, path in sorted(variants, key=lambda v: v[1]):
+        grouped.setdefault(content_type, []).append(f"{upload_url(path)} {width}w")
+    return {content_type: ", ".join(entries) for content_type, entries in grouped.items()}
@@ -0,0 +1,25 @@
+import base64
+import json
+from typing import Any, List
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded."""
+
+
+def encode_cursor(values: List[Any]) -> str:
+    """Pack the keyset values of the last row on a page into an opaque token."""
+    raw = json.dumps(values, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> List[Any]:
+    """Inverse of encode_cursor. Raises InvalidCursor for tampered or truncated tokens."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, UnicodeError) as e:
+        raise InvalidCursor(f"Malformed cursor: {e}") from e
+    if not isinstance(values, list):
+        raise InvalidCursor("Malformed cursor: expected a list of keyset values")
+    return values
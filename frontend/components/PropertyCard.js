@@ -1,12 +1,22 @@
+import ResponsiveImage from './ResponsiveImage';
+
 // Placeholder for PropertyCard Component
 export default function PropertyCard({ property }) {
   // Basic structure, to be expanded
   return (
     <div className="border rounded shadow p-4">
-      {/* <Image src={property.image_url} alt={property.title} width={300} height={200} /> */}
+      {property?.image_url && (
+        <ResponsiveImage
+          src={property.image_url}
+          srcset={property.image_srcset}
+          sizes="300px"
+          alt={property.title}
+          className="w-[300px] h-[200px] object-cover mb-2"
+        />
+      )}
       <h3 className="text-lg font-semibold mb-1">{property?.title || 'Property Title'}</h3>
       <p className="text-sm text-gray-600">{property?.location || 'Property Location'}</p>
       <p className="text-primary font-bold">${property?.price || 'N/A'}</p>
     </div>
   );
-} 
\ No newline at end of file
+}
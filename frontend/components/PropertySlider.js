@@ -3,8 +3,11 @@ import { Swiper, SwiperSlide } from 'swiper/react';
 import { Navigation } from 'swiper/modules';
 import Image from 'next/image';
 import Link from 'next/link';
+import ResponsiveImage from './ResponsiveImage';
 
 const NEXT_PUBLIC_API_BASE_URL = process.env.NEXT_PUBLIC_API_BASE_URL;
+// Rendered width of a slide's image: half a slide, at 1.2 / 2.2 / 3.2 slides per view
+const SLIDE_IMAGE_SIZES = '(min-width: 1024px) 16vw, (min-width: 640px) 23vw, 42vw';
 
 export default function PropertySlider({ title, properties }) {
   const prevRef = useRef(null);
@@ -57,12 +60,22 @@ export default function PropertySlider({ title, properties }) {
                 <div className="flex h-48">
                   {/* Left half - image (takes 50%) */}
                   <div className="relative w-1/2">
-                    <Image
-                      src={imageUrl}
-                      alt={prop.title}
-                      fill
-                      className="object-cover group-hover:scale-105 transition-transform duration-300"
-                    />
+                    {prop.image_srcset && Object.keys(prop.image_srcset).length > 0 ? (
+                      <ResponsiveImage
+                        src={imageUrl}
+                        srcset={prop.image_srcset}
+                        sizes={SLIDE_IMAGE_SIZES}
+                        alt={prop.title}
+                        className="absolute inset-0 w-full h-full object-cover group-hover:scale-105 transition-transform duration-300"
+                      />
+                    ) : (
+                      <Image
+                        src={imageUrl}
+                        alt={prop.title}
+                        fill
+                        className="object-cover group-hover:scale-105 transition-transform duration-300"
+                      />
+                    )}
                   </div>
                   {/* Right half - details */}
                   <div className="w-1/2 p-3 flex flex-col justify-between">
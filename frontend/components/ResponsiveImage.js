@@ -0,0 +1,17 @@
+// Uploaded image with the resized copies the API lists for it (`srcset`: { content type: "url 320w, ..." }),
+// so the browser downloads the smallest file that covers `sizes`. Without copies it is a plain <img>.
+const FORMAT_PREFERENCE = ['image/avif', 'image/webp', 'image/jpeg', 'image/png'];
+
+export default function ResponsiveImage({ src, srcset, sizes, alt, className }) {
+  const types = FORMAT_PREFERENCE.filter((type) => srcset && srcset[type]);
+
+  return (
+    <picture>
+      {/* The browser uses the first source whose type it supports */}
+      {types.map((type) => (
+        <source key={type} type={type} srcSet={srcset[type]} sizes={sizes} />
+      ))}
+      <img src={src} alt={alt} className={className} loading="lazy" decoding="async" />
+    </picture>
+  );
+}
@@ -232,7 +232,7 @@ export default function AdminPropertiesPage() {
                     </p>
                   )}
                   <p className="text-gray-200 text-sm mt-1">By: {prop.created_by?.username || 'N/A'}</p>
-                  <p className="text-gray-200 text-sm mt-1">Clicks: {prop.clicks?.length ?? 0}</p>
+                  <p className="text-gray-200 text-sm mt-1">Clicks: {prop.click_count ?? 0}</p>
                   <button
                       onClick={(e) => { e.stopPropagation(); router.push(`/admin/properties/edit/${prop.id}`); }}
                       className="mt-4 text-blue-400 hover:text-blue-300 transition-colors py-1 px-3 rounded bg-gray-800 hover:bg-gray-700 text-sm"